@@ -0,0 +1,90 @@
+"""Simulate shelf fan-out against a stub Micro.blog with a capacity knee.
+
+The stub serves up to ``--knee`` concurrent requests at the base latency;
+beyond that latency grows with load, and past twice the knee it answers
+429. Fixed concurrency widths are compared with the adaptive limiter:
+
+    python benchmarks/aimd_knee.py --requests 400 --knee 8
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+
+from micro_mcp_server.limiter import AdaptiveLimiter
+from micro_mcp_server.server import MicroBooksClient
+
+
+class KneeServer:
+    def __init__(self, knee: int, base_latency: float) -> None:
+        self.knee = knee
+        self.base_latency = base_latency
+        self.inflight = 0
+        self.peak = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.inflight += 1
+        self.peak = max(self.peak, self.inflight)
+        try:
+            if self.inflight > 2 * self.knee:
+                await asyncio.sleep(self.base_latency / 5)
+                return httpx.Response(429)
+            await asyncio.sleep(self.base_latency * max(1.0, self.inflight / self.knee) ** 2)
+            return httpx.Response(200, json={"items": []})
+        finally:
+            self.inflight -= 1
+
+
+async def run(limiter: AdaptiveLimiter, args) -> dict:
+    server = KneeServer(args.knee, args.latency)
+    client = MicroBooksClient("token", limiter=limiter, transport=httpx.MockTransport(server.handle))
+    rejected = 0
+
+    async def fetch(bookshelf_id: int) -> None:
+        nonlocal rejected
+        while True:
+            try:
+                await client._fetch_bookshelf_books(bookshelf_id)
+                return
+            except httpx.HTTPStatusError:
+                rejected += 1
+                await asyncio.sleep(args.latency)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(fetch(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - started
+    await client.aclose()
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "req_per_s": round(args.requests / elapsed, 1),
+        "429s": rejected,
+        "server_peak": server.peak,
+        "final_limit": int(limiter.limit),
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--knee", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.02, help="Base upstream latency in seconds")
+    args = parser.parse_args()
+
+    rows = []
+    for width in (2, args.knee, args.knee * 4):
+        fixed = AdaptiveLimiter(initial_limit=width, min_limit=width, max_limit=width)
+        rows.append((f"fixed {width}", await run(fixed, args)))
+    rows.append(("adaptive", await run(AdaptiveLimiter(), args)))
+
+    print(f"{'mode':<12}{'elapsed_s':>10}{'req/s':>8}{'429s':>6}{'peak':>6}{'limit':>7}")
+    for name, r in rows:
+        print(
+            f"{name:<12}{r['elapsed_s']:>10}{r['req_per_s']:>8}{r['429s']:>6}"
+            f"{r['server_peak']:>6}{r['final_limit']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
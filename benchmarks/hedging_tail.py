@@ -0,0 +1,84 @@
+"""Compare read latency with and without hedging against a stub with a long tail.
+
+Most stub responses take ``--latency`` seconds, but ``--tail-rate`` of them
+stall for ``--tail-latency`` seconds, like a slow Micro.blog backend:
+
+    python benchmarks/hedging_tail.py --requests 2000 --tail-rate 0.02
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+from micro_mcp_server.hedging import Hedger
+from micro_mcp_server.limiter import AdaptiveLimiter
+from micro_mcp_server.server import MicroBooksClient
+
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def run(hedger, args) -> dict:
+    rng = random.Random(args.seed)
+    upstream_calls = 0
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        nonlocal upstream_calls
+        upstream_calls += 1
+        slow = rng.random() < args.tail_rate
+        await asyncio.sleep(args.tail_latency if slow else args.latency * rng.uniform(0.7, 1.3))
+        return httpx.Response(200, json={"items": []})
+
+    # A wide fixed limit keeps the limiter out of the comparison.
+    limiter = AdaptiveLimiter(initial_limit=256, min_limit=256, max_limit=256)
+    client = MicroBooksClient("token", limiter=limiter, transport=httpx.MockTransport(handle), hedger=hedger)
+    latencies = []
+
+    async def read(bookshelf_id: int) -> None:
+        started = time.perf_counter()
+        await client.get_bookshelf_books(bookshelf_id)
+        latencies.append(time.perf_counter() - started)
+
+    for batch in range(0, args.requests, args.concurrency):
+        await asyncio.gather(*(read(i) for i in range(batch, min(batch + args.concurrency, args.requests))))
+    await client.aclose()
+    return {
+        "p50": percentile(latencies, 0.5),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "max": max(latencies),
+        "extra_load": upstream_calls / args.requests - 1,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--tail-latency", type=float, default=0.5)
+    parser.add_argument("--tail-rate", type=float, default=0.02)
+    parser.add_argument("--percentile", type=float, default=95)
+    parser.add_argument("--budget", type=float, default=5, help="Hedge budget in percent")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rows = [
+        ("no hedging", await run(None, args)),
+        (f"hedge p{args.percentile:g}", await run(Hedger(args.percentile / 100, args.budget / 100), args)),
+    ]
+    print(f"{'mode':<14}{'p50 ms':>8}{'p95 ms':>8}{'p99 ms':>8}{'max ms':>8}{'extra load':>12}")
+    for name, r in rows:
+        print(
+            f"{name:<14}{r['p50'] * 1000:>8.1f}{r['p95'] * 1000:>8.1f}{r['p99'] * 1000:>8.1f}"
+            f"{r['max'] * 1000:>8.1f}{r['extra_load']:>11.1%}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
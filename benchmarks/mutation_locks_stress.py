@@ -0,0 +1,197 @@
+"""Stress concurrent mutations and check the cache ends up matching upstream.
+
+A stub Micro.blog applies each mutation at a random point while the
+request is in flight, so without locking, two mutations of the same book
+can be applied upstream in one order and patched into the shelf cache in
+the other. Random moves, removals, cover changes and renames over a small
+library are run concurrently in batches, and after each batch every
+cached shelf is compared with the stub's state:
+
+    python benchmarks/mutation_locks_stress.py --ops 2000 --books 40
+
+Each run is repeated with keyed locks (the default), with no locks and
+with one global lock, to show consistency and the throughput kept.
+"""
+
+import argparse
+import asyncio
+import random
+import re
+import time
+from contextlib import asynccontextmanager
+from urllib.parse import parse_qs
+
+import httpx
+
+from micro_mcp_server.cache import BOOKSHELVES_KEY, ShelfCache
+from micro_mcp_server.limiter import AdaptiveLimiter
+from micro_mcp_server.locks import KeyedLocks
+from micro_mcp_server.server import MicroBooksClient
+
+
+class StubLibrary:
+    def __init__(self, shelves: int, books: int, latency: float, seed: int) -> None:
+        self.rng = random.Random(seed)
+        self.latency = latency
+        self.names = {s: f"Shelf {s}" for s in range(1, shelves + 1)}
+        self.location = {b: self.rng.randint(1, shelves) for b in range(1, books + 1)}
+        self.covers = {b: "" for b in self.location}
+
+    def items(self, shelf: int) -> list:
+        return [
+            {"id": b, "title": f"Book {b}", "image": self.covers[b]}
+            for b, s in sorted(self.location.items())
+            if s == shelf
+        ]
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        path, method = request.url.path, request.method
+        form = {k: v[0] for k, v in parse_qs((await request.aread()).decode()).items()}
+        # Apply somewhere inside the request's lifetime, like a real server would.
+        await asyncio.sleep(self.rng.uniform(0, self.latency))
+        status = 200
+        if method == "GET" and path == "/books/bookshelves":
+            body = {"items": [{"id": s, "title": n} for s, n in self.names.items()]}
+        elif method == "GET":
+            body = {"items": self.items(int(path.rsplit("/", 1)[1]))}
+        elif m := re.fullmatch(r"/books/bookshelves/(\d+)/assign", path):
+            book = int(form["book_id"])
+            if book in self.location:
+                self.location[book] = int(m.group(1))
+            else:
+                status = 404
+            body = {}
+        elif m := re.fullmatch(r"/books/bookshelves/(\d+)/remove/(\d+)", path):
+            shelf, book = int(m.group(1)), int(m.group(2))
+            if self.location.get(book) == shelf:
+                del self.location[book]
+            body = {}
+        elif m := re.fullmatch(r"/books/bookshelves/(\d+)/cover/(\d+)", path):
+            shelf, book = int(m.group(1)), int(m.group(2))
+            if self.location.get(book) == shelf:
+                self.covers[book] = form["cover_url"]
+            body = {}
+        else:
+            self.names[int(path.rsplit("/", 1)[1])] = form["name"]
+            body = {}
+        await asyncio.sleep(self.rng.uniform(0, self.latency))
+        return httpx.Response(status, json=body)
+
+
+class GlobalLock(KeyedLocks):
+    """One lock for every mutation; re-entrant, since move_book locks twice."""
+
+    _owner = None
+
+    @asynccontextmanager
+    async def hold(self, *keys, shared=()):
+        if self._owner is asyncio.current_task():
+            yield
+            return
+        async with super().hold("all"):
+            self._owner = asyncio.current_task()
+            try:
+                yield
+            finally:
+                self._owner = None
+
+
+class NoLocks(KeyedLocks):
+    @asynccontextmanager
+    async def hold(self, *keys, shared=()):
+        yield
+
+
+def mismatches(stub: StubLibrary, cache: ShelfCache) -> int:
+    count = 0
+    for shelf in stub.names:
+        entry = cache.peek(shelf)
+        if entry is None:
+            continue
+        cached = {(i["id"], i.get("image", "")) for i in entry.payload["items"]}
+        count += cached != {(i["id"], i["image"]) for i in stub.items(shelf)}
+    listing = cache.peek(BOOKSHELVES_KEY)
+    if listing is not None:
+        count += {i["id"]: i["title"] for i in listing.payload["items"]} != stub.names
+    return count
+
+
+async def run(locks: KeyedLocks, args) -> dict:
+    stub = StubLibrary(args.shelves, args.books, args.latency, args.seed)
+    cache = ShelfCache(ttl=3600, reconcile_delay=3600, max_stale=3600)
+    client = MicroBooksClient(
+        "token",
+        cache=cache,
+        limiter=AdaptiveLimiter(initial_limit=256, min_limit=256, max_limit=256),
+        transport=httpx.MockTransport(stub.handle),
+    )
+    client.locks = locks
+    await client.get_bookshelves()
+    for shelf in stub.names:
+        await client.get_bookshelf_books(shelf)
+
+    rng = random.Random(args.seed + 1)
+    semaphore = asyncio.Semaphore(args.concurrency)
+    failed = 0
+
+    async def mutate(n: int) -> None:
+        nonlocal failed
+        book, shelf = rng.randint(1, args.books), rng.randint(1, args.shelves)
+        kind = rng.choices(["move", "cover", "rename", "remove"], [6, 3, 1, 0.2])[0]
+        async with semaphore:
+            try:
+                if kind == "move":
+                    await client.move_book(book, shelf)
+                elif kind == "cover":
+                    location = cache.book_location(book)
+                    await client.change_book_cover(location or shelf, book, f"https://covers/{n}.jpg")
+                elif kind == "rename":
+                    await client.rename_bookshelf(shelf, f"Shelf {shelf} #{n}")
+                else:
+                    await client.remove_book(cache.book_location(book) or shelf, book)
+            except httpx.HTTPStatusError:
+                failed += 1
+
+    # Compare after every batch; a final state alone can hide divergences
+    # that later mutations happened to overwrite.
+    inconsistent, elapsed = 0, 0.0
+    for batch in range(0, args.ops, args.batch):
+        started = time.perf_counter()
+        await asyncio.gather(*(mutate(n) for n in range(batch, min(args.ops, batch + args.batch))))
+        elapsed += time.perf_counter() - started
+        inconsistent += mismatches(stub, cache)
+    await client.aclose()
+    return {
+        "elapsed_s": round(elapsed, 2),
+        "ops_per_s": round(args.ops / elapsed, 1),
+        "failed": failed,
+        "inconsistent_shelves": inconsistent,
+        "contended": locks.contended,
+    }
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ops", type=int, default=2000)
+    parser.add_argument("--books", type=int, default=40)
+    parser.add_argument("--shelves", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--batch", type=int, default=200, help="Mutations between consistency checks")
+    parser.add_argument("--latency", type=float, default=0.01, help="Max stub delay before and after applying")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rows = [(name, await run(locks, args)) for name, locks in (
+        ("keyed locks", KeyedLocks()),
+        ("no locks", NoLocks()),
+        ("global lock", GlobalLock()),
+    )]
+    print(f"{'mode':<14}" + "".join(f"{k:>22}" for k in rows[0][1]))
+    for name, row in rows:
+        print(f"{name:<14}" + "".join(f"{v:>22}" for v in row.values()))
+    if rows[0][1]["inconsistent_shelves"]:
+        raise SystemExit("Cache diverged from upstream with keyed locks")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
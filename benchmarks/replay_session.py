@@ -0,0 +1,154 @@
+"""Replay a scripted tool session against a cassette and measure each call.
+
+Record a cassette once against Micro.blog (or any server at --base-url):
+
+    MICRO_BLOG_BEARER_TOKEN=... python benchmarks/replay_session.py --record session.ndjson
+
+then replay it offline against every build and compare with a previous run:
+
+    python benchmarks/replay_session.py --cassette session.ndjson --latency zero \\
+        --output after.json --compare before.json
+
+A session is a JSON list of {"tool": ..., "arguments": {...}} objects
+(--session); the default one below touches the main read paths. For each
+tool the run reports median wall time and CPU time over --repeat runs,
+and memory allocated during the call from one extra run under tracemalloc.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from fastmcp import Client
+
+from micro_mcp_server import server
+from micro_mcp_server.cassette import RecordingTransport, ReplayTransport
+
+DEFAULT_SESSION = [
+    {"tool": "get_bookshelves", "arguments": {}},
+    {"tool": "get_bookshelf_books", "arguments": {"bookshelf_id": 1}},
+    {"tool": "query_books", "arguments": {"where": "title ^= \"The\"", "limit": 20}},
+    {"tool": "find_duplicates", "arguments": {"limit": 10}},
+    {"tool": "get_reading_goals", "arguments": {}},
+    {"tool": "get_bookshelf_books", "arguments": {"bookshelf_id": 1}},
+]
+
+
+async def run_session(session: list, transport, allocations: bool) -> list:
+    with tempfile.TemporaryDirectory() as state_dir:
+        app = server.create_server(
+            os.environ.get("MICRO_BLOG_BEARER_TOKEN", "replay"),
+            state_dir=state_dir,
+            prefetch_concurrency=0,
+            transport=transport,
+        )
+        results = []
+        async with Client(app) as client:
+            for step in session:
+                if allocations:
+                    tracemalloc.start()
+                wall, cpu = time.perf_counter(), time.process_time()
+                result = await client.call_tool(step["tool"], step.get("arguments", {}), raise_on_error=False)
+                wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+                entry = {"tool": step["tool"], "wall_ms": wall * 1000, "cpu_ms": cpu * 1000, "error": result.is_error}
+                if allocations:
+                    current, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                    entry.update(alloc_kib=current / 1024, peak_kib=peak / 1024)
+                results.append(entry)
+        return results
+
+
+def summarize(runs: list, alloc_run: list) -> dict:
+    tools: dict = {}
+    for run in runs:
+        for i, entry in enumerate(run):
+            stats = tools.setdefault(f"{i:02d}:{entry['tool']}", {"wall_ms": [], "cpu_ms": [], "errors": 0})
+            stats["wall_ms"].append(entry["wall_ms"])
+            stats["cpu_ms"].append(entry["cpu_ms"])
+            stats["errors"] += entry["error"]
+    summary = {}
+    for i, (name, stats) in enumerate(tools.items()):
+        summary[name] = {
+            "wall_ms": round(statistics.median(stats["wall_ms"]), 3),
+            "cpu_ms": round(statistics.median(stats["cpu_ms"]), 3),
+            "alloc_kib": round(alloc_run[i]["alloc_kib"], 1),
+            "peak_kib": round(alloc_run[i]["peak_kib"], 1),
+            "errors": stats["errors"],
+        }
+    summary["total"] = {
+        key: round(sum(v[key] for v in summary.values()), 3) for key in ("wall_ms", "cpu_ms", "alloc_kib")
+    }
+    return summary
+
+
+def compare(current: dict, baseline: dict) -> None:
+    print(f"{'call':<28}" + " ".join(f"{label:>20}" for label in ("wall ms", "cpu ms", "alloc KiB")))
+    for name, now in current.items():
+        before = baseline.get(name)
+        cells = []
+        for key in ("wall_ms", "cpu_ms", "alloc_kib"):
+            if before is None or not before.get(key):
+                cells.append(f"{now[key]:>20.1f}")
+            else:
+                change = (now[key] - before[key]) / before[key] * 100
+                cells.append(f"{now[key]:>10.1f} ({change:+6.1f}%)".rjust(20))
+        print(f"{name:<28}" + " ".join(cells))
+
+
+async def record(args, session: list) -> None:
+    token = os.environ.get("MICRO_BLOG_BEARER_TOKEN")
+    if not token:
+        raise SystemExit("Set MICRO_BLOG_BEARER_TOKEN to record a cassette")
+    if args.base_url:
+        server.BASE_URL = args.base_url
+    transport = RecordingTransport(args.record)
+    await run_session(session, transport, allocations=False)
+    print(f"Recorded {transport.recorded} requests to {args.record}")
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cassette", help="Cassette to replay")
+    parser.add_argument("--record", help="Record a new cassette to this path instead of replaying")
+    parser.add_argument("--base-url", help="Server to record from (default: Micro.blog)")
+    parser.add_argument("--session", help="JSON file with the tool calls to run")
+    parser.add_argument("--latency", choices=["original", "zero"], default="zero")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Write the summary to this JSON file")
+    parser.add_argument("--compare", help="Previous --output file to compare against")
+    args = parser.parse_args()
+
+    session = DEFAULT_SESSION
+    if args.session:
+        with open(args.session) as f:
+            session = json.load(f)
+    if args.record:
+        await record(args, session)
+        return
+    if not args.cassette:
+        parser.error("--cassette or --record is required")
+
+    runs = []
+    for _ in range(args.repeat):
+        runs.append(await run_session(session, ReplayTransport(args.cassette, args.latency), allocations=False))
+    alloc_run = await run_session(session, ReplayTransport(args.cassette, args.latency), allocations=True)
+    summary = summarize(runs, alloc_run)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    compare(summary, baseline)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
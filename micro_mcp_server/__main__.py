@@ -1,10 +1,64 @@
 """Main entry point for the Micro.blog Books MCP Server."""
 
+import asyncio
+import json
 import sys
+from typing import Optional
 
 import click
 
-from .server import create_server
+from .cassette import RecordingTransport, ReplayTransport
+from .deadlines import parse_tool_deadlines
+from .export import EXPORT_FORMATS, export_library
+from .logging_setup import configure_logging, parse_sample_rates
+from .server import DEFAULT_STATE_DIR, MicroBooksClient, create_server
+
+
+def _cassette_transport(record: Optional[str], replay: Optional[str], replay_latency: str, record_append: bool):
+    if record and replay:
+        raise click.UsageError("--record and --replay cannot be combined")
+    if record:
+        return RecordingTransport(record, append=record_append)
+    if replay:
+        return ReplayTransport(replay, latency=replay_latency)
+    return None
+
+
+_cassette_options = [
+    click.option(
+        "--record",
+        envvar="MICRO_BOOKS_RECORD",
+        default=None,
+        help="Write every Micro.blog request and response (tokens redacted) to this cassette file",
+    ),
+    click.option(
+        "--record-append",
+        envvar="MICRO_BOOKS_RECORD_APPEND",
+        is_flag=True,
+        default=False,
+        help="Add to an existing --record cassette instead of replacing it",
+    ),
+    click.option(
+        "--replay",
+        envvar="MICRO_BOOKS_REPLAY",
+        default=None,
+        help="Serve Micro.blog responses from this cassette file instead of the network",
+    ),
+    click.option(
+        "--replay-latency",
+        envvar="MICRO_BOOKS_REPLAY_LATENCY",
+        type=click.Choice(["original", "zero"]),
+        default="original",
+        show_default=True,
+        help="Replay with the recorded response times or answer immediately",
+    ),
+]
+
+
+def cassette_options(command):
+    for option in reversed(_cassette_options):
+        command = option(command)
+    return command
 
 
 @click.command()
@@ -14,16 +68,286 @@ from .server import create_server
     required=True,
     help="Bearer token for Micro.blog API (can also be set via MICRO_BLOG_BEARER_TOKEN env var)",
 )
-def main(bearer_token: str) -> None:
+@click.option(
+    "--write-behind",
+    envvar="MICRO_BOOKS_WRITE_BEHIND",
+    is_flag=True,
+    help="Acknowledge mutations once journaled locally and flush them to Micro.blog in the background",
+)
+@click.option(
+    "--state-dir",
+    envvar="MICRO_BOOKS_STATE_DIR",
+    default=DEFAULT_STATE_DIR,
+    show_default=True,
+    help="Directory for local server state such as the write-behind journal",
+)
+@click.option(
+    "--cache-ttl",
+    envvar="MICRO_BOOKS_CACHE_TTL",
+    type=float,
+    default=60.0,
+    show_default=True,
+    help="Seconds to cache bookshelf reads (0 disables the cache)",
+)
+@click.option(
+    "--memory-budget-mb",
+    envvar="MICRO_BOOKS_MEMORY_BUDGET_MB",
+    type=float,
+    default=512.0,
+    show_default=True,
+    help="Memory shared by the shelf cache and the analytics indexes before they evict",
+)
+@click.option(
+    "--idempotency-window",
+    envvar="MICRO_BOOKS_IDEMPOTENCY_WINDOW",
+    type=float,
+    default=600.0,
+    show_default=True,
+    help="Seconds during which a repeated add_book or add_bookshelf call returns the first result (0 disables)",
+)
+@click.option(
+    "--shutdown-timeout",
+    envvar="MICRO_BOOKS_SHUTDOWN_TIMEOUT",
+    type=float,
+    default=10.0,
+    show_default=True,
+    help="Seconds running tool calls, and then the write-behind queue, get to finish on shutdown",
+)
+@click.option(
+    "--snapshot/--no-snapshot",
+    envvar="MICRO_BOOKS_SNAPSHOT",
+    default=True,
+    show_default=True,
+    help="Save cached shelves and the change feed under --state-dir on shutdown and load them on start",
+)
+@click.option(
+    "--job-workers",
+    envvar="MICRO_BOOKS_JOB_WORKERS",
+    type=int,
+    default=2,
+    show_default=True,
+    help="Background jobs (exports, audits, bulk moves) run at once; others wait in a queue",
+)
+@click.option(
+    "--prefetch-concurrency",
+    envvar="MICRO_BOOKS_PREFETCH_CONCURRENCY",
+    type=int,
+    default=2,
+    show_default=True,
+    help="Parallel shelf prefetches after get_bookshelves (0 disables prefetching)",
+)
+@click.option(
+    "--prefetch-budget",
+    envvar="MICRO_BOOKS_PREFETCH_BUDGET",
+    type=int,
+    default=1_000_000,
+    show_default=True,
+    help="Estimated bytes of shelf contents prefetched per listing",
+)
+@click.option(
+    "--resource-poll-interval",
+    envvar="MICRO_BOOKS_RESOURCE_POLL_INTERVAL",
+    type=float,
+    default=60.0,
+    show_default=True,
+    help="Seconds between upstream checks of subscribed resources",
+)
+@click.option(
+    "--hedge-percentile",
+    envvar="MICRO_BOOKS_HEDGE_PERCENTILE",
+    type=float,
+    default=0.0,
+    show_default=True,
+    help="Send a backup GET once a read is slower than this latency percentile, e.g. 95 (0 disables hedging)",
+)
+@click.option(
+    "--hedge-budget",
+    envvar="MICRO_BOOKS_HEDGE_BUDGET",
+    type=float,
+    default=5.0,
+    show_default=True,
+    help="Maximum backup requests as a percentage of reads",
+)
+@click.option(
+    "--tool-deadline",
+    envvar="MICRO_BOOKS_TOOL_DEADLINE",
+    type=float,
+    default=30.0,
+    show_default=True,
+    help="Seconds a tool call may take, including all its Micro.blog requests (0 disables)",
+)
+@click.option(
+    "--tool-deadlines",
+    envvar="MICRO_BOOKS_TOOL_DEADLINES",
+    default="",
+    help="Per-tool overrides as name=seconds pairs, e.g. export_library=900,query_books=60",
+)
+@click.option(
+    "--profile",
+    envvar="MICRO_BOOKS_PROFILE",
+    is_flag=True,
+    help="Profile tool calls with cProfile and save the results under --state-dir/profiles",
+)
+@click.option(
+    "--profile-tools",
+    envvar="MICRO_BOOKS_PROFILE_TOOLS",
+    default="",
+    help="Comma-separated tools to profile on every call (default: all tools, or --profile-sample-rate)",
+)
+@click.option(
+    "--profile-sample-rate",
+    envvar="MICRO_BOOKS_PROFILE_SAMPLE_RATE",
+    type=float,
+    default=0.0,
+    show_default=True,
+    help="Fraction of other tool calls to profile",
+)
+@click.option(
+    "--profile-min-ms",
+    envvar="MICRO_BOOKS_PROFILE_MIN_MS",
+    type=float,
+    default=0.0,
+    show_default=True,
+    help="Only keep profiles of calls at least this slow",
+)
+@click.option(
+    "--log-level",
+    envvar="MICRO_BOOKS_LOG_LEVEL",
+    default="INFO",
+    show_default=True,
+    help="Minimum level of log records written to stderr",
+)
+@click.option(
+    "--log-format",
+    envvar="MICRO_BOOKS_LOG_FORMAT",
+    type=click.Choice(["json", "text"]),
+    default="json",
+    show_default=True,
+    help="Write logs as JSON lines or as plain text",
+)
+@click.option(
+    "--log-sample-rate",
+    envvar="MICRO_BOOKS_LOG_SAMPLE_RATE",
+    type=float,
+    default=1.0,
+    show_default=True,
+    help="Fraction of successful tool calls whose logs are written (failures are always logged)",
+)
+@click.option(
+    "--log-sample-rates",
+    envvar="MICRO_BOOKS_LOG_SAMPLE_RATES",
+    default="",
+    help="Per-tool overrides as name=rate pairs, e.g. get_bookshelves=0.1",
+)
+@cassette_options
+def main(
+    bearer_token: str,
+    write_behind: bool,
+    state_dir: str,
+    cache_ttl: float,
+    memory_budget_mb: float,
+    idempotency_window: float,
+    shutdown_timeout: float,
+    snapshot: bool,
+    job_workers: int,
+    prefetch_concurrency: int,
+    prefetch_budget: int,
+    resource_poll_interval: float,
+    hedge_percentile: float,
+    hedge_budget: float,
+    tool_deadline: float,
+    tool_deadlines: str,
+    profile: bool,
+    profile_tools: str,
+    profile_sample_rate: float,
+    profile_min_ms: float,
+    log_level: str,
+    log_format: str,
+    log_sample_rate: float,
+    log_sample_rates: str,
+    record: Optional[str],
+    record_append: bool,
+    replay: Optional[str],
+    replay_latency: str,
+) -> None:
     """Run the Micro.blog Books MCP Server."""
     if not bearer_token:
         click.echo("Error: Bearer token is required", err=True)
         click.echo("Set MICRO_BLOG_BEARER_TOKEN environment variable or use --bearer-token option", err=True)
         sys.exit(1)
 
-    app = create_server(bearer_token)
+    configure_logging(log_level, log_format)
+    app = create_server(
+        bearer_token,
+        write_behind=write_behind,
+        state_dir=state_dir,
+        cache_ttl=cache_ttl,
+        memory_budget_mb=memory_budget_mb,
+        idempotency_window=idempotency_window,
+        shutdown_timeout=shutdown_timeout,
+        snapshot=snapshot,
+        job_workers=job_workers,
+        prefetch_concurrency=prefetch_concurrency,
+        prefetch_budget=prefetch_budget,
+        resource_poll_interval=resource_poll_interval,
+        hedge_percentile=hedge_percentile,
+        hedge_budget=hedge_budget,
+        tool_deadline=tool_deadline,
+        tool_deadlines=parse_tool_deadlines(tool_deadlines),
+        profile=profile,
+        profile_tools={t.strip() for t in profile_tools.split(",") if t.strip()},
+        profile_sample_rate=profile_sample_rate,
+        profile_min_ms=profile_min_ms,
+        log_sample_rate=log_sample_rate,
+        log_sample_rates=parse_sample_rates(log_sample_rates),
+        transport=_cassette_transport(record, replay, replay_latency, record_append),
+    )
     app.run()
 
 
+@click.command()
+@click.option(
+    "--bearer-token",
+    envvar="MICRO_BLOG_BEARER_TOKEN",
+    required=True,
+    help="Bearer token for Micro.blog API (can also be set via MICRO_BLOG_BEARER_TOKEN env var)",
+)
+@click.option("--format", "fmt", type=click.Choice(EXPORT_FORMATS), default="ndjson", show_default=True)
+@click.option("--incremental", is_flag=True, help="Only write books changed since the last export's manifest")
+@click.option("--manifest", "manifest_path", default=None, help="Manifest path (defaults to <path>.manifest.json)")
+@click.option(
+    "--concurrency",
+    default=16,
+    show_default=True,
+    help="Most bookshelves fetched in parallel; the adaptive limiter may use fewer",
+)
+@cassette_options
+@click.argument("path")
+def export(
+    bearer_token: str,
+    fmt: str,
+    incremental: bool,
+    manifest_path: str,
+    concurrency: int,
+    record: Optional[str],
+    record_append: bool,
+    replay: Optional[str],
+    replay_latency: str,
+    path: str,
+) -> None:
+    """Export the Micro.blog library to PATH."""
+    configure_logging()
+    client = MicroBooksClient(bearer_token, transport=_cassette_transport(record, replay, replay_latency, record_append))
+
+    async def run() -> dict:
+        try:
+            return await export_library(client, path, fmt, incremental, manifest_path, concurrency)
+        finally:
+            await client.aclose()
+
+    summary = asyncio.run(run())
+    click.echo(json.dumps(summary, indent=2))
+
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,273 @@
+"""Read-through cache for bookshelf payloads with optimistic write patching."""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+from . import deadlines
+from .memory import MemoryAccountant, estimate_size
+
+logger = logging.getLogger(__name__)
+
+BOOKSHELVES_KEY = "bookshelves"
+
+
+@dataclass
+class CacheEntry:
+    payload: dict
+    fetched_at: float
+    version: int = 0
+    patched_at: Optional[float] = None
+    patches: list = field(default_factory=list)
+
+
+class ShelfCache:
+    """Caches the bookshelf listing and per-shelf book lists.
+
+    Writes are applied as local patches to the cached payloads so a read
+    right after a write is served instantly. Every patch bumps the entry's
+    version and schedules a background refetch; a refetch only replaces the
+    entry if no newer patch landed while it was in flight. Patched entries
+    that could not be reconciled within ``max_stale`` seconds are treated
+    as misses.
+
+    With an ``accountant``, entries are charged to the shared memory budget
+    and may be evicted; patched entries are pinned until reconciled.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 60.0,
+        reconcile_delay: float = 2.0,
+        max_stale: float = 30.0,
+        accountant: Optional[MemoryAccountant] = None,
+        refetch_cost: float = 0.5,
+    ) -> None:
+        self.ttl = ttl
+        self.reconcile_delay = reconcile_delay
+        self.max_stale = max_stale
+        self.hits = 0
+        self.misses = 0
+        self._entries: dict = {}
+        self._fetchers: dict = {}
+        self._reconciles: dict = {}
+        self._listeners: list = []
+        self.refetch_cost = refetch_cost
+        self._memory = accountant.pool("shelf_cache", self._evict) if accountant is not None else None
+
+    def add_listener(self, listener: Callable[[object, dict], None]) -> None:
+        """Register ``listener(key, payload)``, called whenever an entry is stored or patched."""
+        self._listeners.append(listener)
+
+    def _notify(self, key, payload: dict) -> None:
+        for listener in self._listeners:
+            try:
+                listener(key, payload)
+            except Exception:
+                logger.exception("Shelf cache listener failed for %s", key)
+
+    def bind(self, key_type: str, fetch: Callable[..., Awaitable[dict]]) -> None:
+        """Register the upstream fetcher used to reconcile entries of a key type."""
+        self._fetchers[key_type] = fetch
+
+    def get(self, key) -> Optional[dict]:
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is None or now - entry.fetched_at > self.ttl:
+            self.misses += 1
+            return None
+        if entry.patched_at is not None and now - entry.patched_at > self.max_stale:
+            self.misses += 1
+            return None
+        self.hits += 1
+        if self._memory is not None:
+            self._memory.touch(key)
+        return entry.payload
+
+    def is_fresh(self, key) -> bool:
+        """Whether ``get`` would serve ``key`` from the cache, without counting a hit."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return False
+        now = time.monotonic()
+        if now - entry.fetched_at > self.ttl:
+            return False
+        return entry.patched_at is None or now - entry.patched_at <= self.max_stale
+
+    def peek(self, key) -> Optional[CacheEntry]:
+        return self._entries.get(key)
+
+    def put(self, key, payload: dict, version: Optional[int] = None) -> bool:
+        """Store an upstream payload. Returns False if a newer patch superseded it."""
+        entry = self._entries.get(key)
+        if version is not None and entry is not None and entry.version != version:
+            return False
+        next_version = entry.version + 1 if entry is not None else 0
+        self._entries[key] = CacheEntry(payload, time.monotonic(), next_version)
+        self._account(key, payload, pinned=False)
+        self._notify(key, payload)
+        return True
+
+    def offer(self, key, payload: dict) -> bool:
+        """Store a payload fetched outside the cache, unless local patches are awaiting reconcile.
+
+        The fetch may have started before the patch, so only the reconcile's
+        own refetch can be trusted to include it.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry.patched_at is not None:
+            return False
+        return self.put(key, payload)
+
+    def _account(self, key, payload: dict, pinned: bool) -> None:
+        if self._memory is not None:
+            self._memory.charge(key, estimate_size(payload), None if pinned else self.refetch_cost)
+
+    def _evict(self, key) -> None:
+        self._entries.pop(key, None)
+
+    def invalidate(self, key) -> None:
+        self._entries.pop(key, None)
+        if self._memory is not None:
+            self._memory.release(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        if self._memory is not None:
+            self._memory.clear()
+
+    def export(self) -> list:
+        """``(key, age_seconds, payload)`` for every entry that matches upstream (not patched)."""
+        now = time.monotonic()
+        return [
+            (key, now - entry.fetched_at, entry.payload)
+            for key, entry in self._entries.items()
+            if entry.patched_at is None
+        ]
+
+    def restore(self, key, payload: dict, age: float) -> None:
+        """Store an exported payload, ``age`` seconds old, unless a newer entry exists."""
+        if key in self._entries:
+            return
+        self._entries[key] = CacheEntry(payload, time.monotonic() - age)
+        self._account(key, payload, pinned=False)
+        self._notify(key, payload)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "patched": sum(1 for e in self._entries.values() if e.patched_at is not None),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    # Write patches -----------------------------------------------------
+
+    def _patch(self, key, description: str, update: Callable[[list], list]) -> None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return
+        items = update(list(entry.payload.get("items") or []))
+        entry.payload = {**entry.payload, "items": items}
+        entry.version += 1
+        entry.patches.append(description)
+        if entry.patched_at is None:
+            entry.patched_at = time.monotonic()
+        self._account(key, entry.payload, pinned=True)
+        self._notify(key, entry.payload)
+        self._schedule_reconcile(key)
+
+    def _find_book(self, book_id: int):
+        for key, entry in self._entries.items():
+            if key == BOOKSHELVES_KEY:
+                continue
+            for item in entry.payload.get("items") or []:
+                if item.get("id") == book_id:
+                    return key, item
+        return None, None
+
+    def book_location(self, book_id: int) -> Optional[int]:
+        """Return the cached bookshelf id holding ``book_id``, if known."""
+        key, _ = self._find_book(book_id)
+        return key
+
+    def patch_add_book(
+        self,
+        bookshelf_id: int,
+        title: str,
+        author: str,
+        isbn: Optional[str] = None,
+        cover_url: Optional[str] = None,
+    ) -> None:
+        # The API does not return the new book's id, so insert a provisional
+        # item that the reconcile refetch replaces.
+        item = {
+            "id": None,
+            "title": title,
+            "authors": [{"name": author}],
+            "image": cover_url or "",
+            "_microblog": {"isbn": isbn or "", "provisional": True},
+        }
+        self._patch(bookshelf_id, f"add_book:{title}", lambda items: [item] + items)
+
+    def patch_move_book(self, book_id: int, bookshelf_id: int) -> None:
+        source, item = self._find_book(book_id)
+        if source == bookshelf_id:
+            return
+        if source is not None:
+            self._patch(source, f"move_book:{book_id}:out", lambda items: [i for i in items if i.get("id") != book_id])
+        if item is not None:
+            self._patch(bookshelf_id, f"move_book:{book_id}:in", lambda items: [item] + items)
+        else:
+            self.invalidate(bookshelf_id)
+
+    def patch_remove_book(self, bookshelf_id: int, book_id: int) -> None:
+        self._patch(
+            bookshelf_id, f"remove_book:{book_id}", lambda items: [i for i in items if i.get("id") != book_id]
+        )
+
+    def patch_book_cover(self, bookshelf_id: int, book_id: int, cover_url: str) -> None:
+        def update(items: list) -> list:
+            return [{**i, "image": cover_url} if i.get("id") == book_id else i for i in items]
+
+        self._patch(bookshelf_id, f"change_book_cover:{book_id}", update)
+
+    def patch_rename_bookshelf(self, bookshelf_id: int, name: str) -> None:
+        def update(items: list) -> list:
+            return [{**i, "title": name} if i.get("id") == bookshelf_id else i for i in items]
+
+        self._patch(BOOKSHELVES_KEY, f"rename_bookshelf:{bookshelf_id}", update)
+
+    # Reconciliation ----------------------------------------------------
+
+    def _schedule_reconcile(self, key) -> None:
+        task = self._reconciles.get(key)
+        if task is not None and not task.done():
+            return
+        self._reconciles[key] = asyncio.create_task(self._reconcile(key))
+
+    async def _reconcile(self, key) -> None:
+        deadlines.clear()
+        key_type = BOOKSHELVES_KEY if key == BOOKSHELVES_KEY else "bookshelf"
+        fetch = self._fetchers.get(key_type)
+        if fetch is None:
+            self.invalidate(key)
+            return
+        try:
+            while key in self._entries:
+                await asyncio.sleep(self.reconcile_delay)
+                entry = self._entries.get(key)
+                if entry is None or entry.patched_at is None:
+                    return
+                version = entry.version
+                payload = await (fetch() if key == BOOKSHELVES_KEY else fetch(key))
+                if self.put(key, payload, version):
+                    return
+                logger.debug("Cache entry %s patched during reconcile, retrying", key)
+        except Exception:
+            logger.warning("Failed to reconcile cached %s, invalidating", key, exc_info=True)
+            self.invalidate(key)
+        finally:
+            self._reconciles.pop(key, None)
@@ -0,0 +1,188 @@
+"""Record Micro.blog traffic to cassette files and replay it offline.
+
+A cassette is an NDJSON file with one request/response pair per line,
+including how long the response took. Credentials are never written:
+authorization and cookie headers and token query parameters are replaced
+with a placeholder before the line is stored.
+
+Replaying the same cassette under different builds takes Micro.blog's
+variable latency out of performance comparisons (see
+``benchmarks/replay_session.py``).
+"""
+
+import asyncio
+import base64
+import json
+import logging
+import time
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+REDACTED = "<redacted>"
+_SECRET_HEADERS = {"authorization", "cookie", "set-cookie", "proxy-authorization"}
+_SECRET_PARAMS = {"token", "access_token", "app_token"}
+# The stored body is already decoded, so these no longer describe it.
+_DROPPED_RESPONSE_HEADERS = {"content-encoding", "content-length", "transfer-encoding"}
+
+
+def _sanitize_headers(headers: httpx.Headers, dropped: frozenset = frozenset()) -> dict:
+    clean = {}
+    for name, value in headers.multi_items():
+        name = name.lower()
+        if name in dropped:
+            continue
+        clean[name] = REDACTED if name in _SECRET_HEADERS else value
+    return clean
+
+
+def _sanitize_query(query: str) -> str:
+    pairs = parse_qsl(query, keep_blank_values=True)
+    return urlencode([(k, REDACTED if k.lower() in _SECRET_PARAMS else v) for k, v in pairs])
+
+
+def _target(url: httpx.URL) -> str:
+    query = url.query.decode()
+    return url.path + ("?" + _sanitize_query(query) if query else "")
+
+
+def _encode_body(content: bytes) -> dict:
+    try:
+        return {"body": content.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"body_base64": base64.b64encode(content).decode("ascii")}
+
+
+def _decode_body(entry: dict) -> bytes:
+    if "body_base64" in entry:
+        return base64.b64decode(entry["body_base64"])
+    return entry.get("body", "").encode("utf-8")
+
+
+def _request_body(content: bytes) -> str:
+    text = content.decode("utf-8", errors="replace")
+    if "=" in text and "\n" not in text:
+        return _sanitize_query(text)
+    return text
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """Passes requests to ``inner`` and writes each exchange to the cassette at ``path``.
+
+    An existing cassette is replaced, so it holds exactly one session,
+    unless ``append`` is set.
+    """
+
+    def __init__(
+        self, path: str, inner: Optional[httpx.AsyncBaseTransport] = None, append: bool = False
+    ) -> None:
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.inner = inner or httpx.AsyncHTTPTransport()
+        self.recorded = 0
+        self._file = open(self.path, "a" if append else "w", encoding="utf-8")
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = await request.aread()
+        started = time.perf_counter()
+        response = await self.inner.handle_async_request(request)
+        try:
+            content = await response.aread()
+        finally:
+            await response.aclose()
+        elapsed = time.perf_counter() - started
+
+        entry = {
+            "method": request.method,
+            "target": _target(request.url),
+            "request_headers": _sanitize_headers(request.headers),
+            "request_body": _request_body(body),
+            "status": response.status_code,
+            "headers": _sanitize_headers(response.headers, _DROPPED_RESPONSE_HEADERS),
+            **_encode_body(content),
+            "elapsed_ms": round(elapsed * 1000, 3),
+            "recorded_at": time.time(),
+        }
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.recorded += 1
+        return httpx.Response(
+            response.status_code,
+            headers=[(k, v) for k, v in response.headers.multi_items() if k.lower() not in _DROPPED_RESPONSE_HEADERS],
+            content=content,
+            request=request,
+            extensions={"http_version": response.extensions.get("http_version", b"HTTP/1.1")},
+        )
+
+    async def aclose(self) -> None:
+        self._file.close()
+        await self.inner.aclose()
+
+
+class CassetteMiss(LookupError):
+    """Raised in strict replay when a request has no recorded response."""
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """Serves recorded responses instead of contacting Micro.blog.
+
+    Requests are matched on method, path, query and body. Repeated requests
+    get the recorded responses in order; once those run out, the last one
+    is served again (or ``CassetteMiss`` is raised with ``strict``).
+    ``latency`` is "original" to wait as long as the recorded response
+    took (times ``speed``'s inverse) or "zero" to answer immediately.
+    """
+
+    def __init__(self, path: str, latency: str = "original", speed: float = 1.0, strict: bool = False) -> None:
+        if latency not in ("original", "zero"):
+            raise ValueError("latency must be 'original' or 'zero'")
+        self.path = Path(path).expanduser()
+        self.latency = latency
+        self.speed = speed
+        self.strict = strict
+        self.served = 0
+        self.misses = 0
+        self._entries: dict = {}
+        self._cursor: dict = {}
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    key = (entry["method"], entry["target"], entry.get("request_body", ""))
+                    self._entries.setdefault(key, []).append(entry)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = (request.method, _target(request.url), _request_body(await request.aread()))
+        entries = self._entries.get(key)
+        if not entries:
+            self.misses += 1
+            if self.strict:
+                raise CassetteMiss(f"No recorded response for {request.method} {key[1]}")
+            logger.warning("No recorded response for %s %s", request.method, key[1])
+            return httpx.Response(404, json={"error": "not in cassette"}, request=request)
+        position = self._cursor.get(key, 0)
+        if position >= len(entries) and self.strict:
+            raise CassetteMiss(f"Recorded responses for {request.method} {key[1]} are used up")
+        entry = entries[min(position, len(entries) - 1)]
+        self._cursor[key] = position + 1
+
+        if self.latency == "original" and entry.get("elapsed_ms"):
+            await asyncio.sleep(entry["elapsed_ms"] / 1000 / self.speed)
+        self.served += 1
+        return httpx.Response(
+            entry["status"],
+            headers=list(entry.get("headers", {}).items()),
+            content=_decode_body(entry),
+            request=request,
+        )
+
+    def rewind(self) -> None:
+        """Serve every request's recorded responses from the start again."""
+        self._cursor.clear()
@@ -0,0 +1,241 @@
+"""Change feed over the library computed from per-book content hashes."""
+
+import asyncio
+import base64
+import bisect
+import hashlib
+import logging
+import uuid
+from typing import Callable, Optional
+
+from .cache import BOOKSHELVES_KEY
+from .records import book_record, record_hash
+
+logger = logging.getLogger(__name__)
+
+
+def _root(book_hashes: dict) -> str:
+    """Summary hash of a shelf, independent of item order."""
+    digest = hashlib.sha1()
+    for book_id in sorted(book_hashes):
+        digest.update(f"{book_id}:{book_hashes[book_id]};".encode())
+    return digest.hexdigest()
+
+
+class ChangeFeed:
+    """Records added, removed, moved and changed books as a sequenced log.
+
+    Each shelf keeps a map of book id to content hash plus a root hash over
+    that map. A refetched shelf whose root is unchanged (or that answers a
+    conditional request with 304) is skipped without diffing. Changes get
+    increasing sequence numbers, so ``changes_since`` bisects the log and
+    costs O(changes) rather than O(library).
+
+    A book missing from one shelf is held as a pending removal until the
+    changes are read, so a move observed as "gone from A" followed by
+    "appeared on B" is reported once as ``moved``.
+    """
+
+    def __init__(
+        self,
+        max_log: int = 10_000,
+        on_payload: Optional[Callable[[object, dict], None]] = None,
+    ) -> None:
+        self.max_log = max_log
+        self.on_payload = on_payload
+        self.epoch = uuid.uuid4().hex[:12]
+        self.initialized = False
+        self._seq = 0
+        self._log: list = []
+        self._base_seq = 0
+        self._books: dict = {}
+        self._shelf_books: dict = {}
+        self._shelf_roots: dict = {}
+        self._validators: dict = {}
+        self._pending_removals: dict = {}
+
+    def estimated_bytes(self) -> int:
+        return len(self._books) * 400 + len(self._log) * 250
+
+    # Cursor handling ---------------------------------------------------
+
+    def cursor(self, seq: Optional[int] = None) -> str:
+        raw = f"{self.epoch}:{self._seq if seq is None else seq}"
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+    def _decode(self, cursor: str) -> Optional[int]:
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+            epoch, seq = raw.split(":")
+            return int(seq) if epoch == self.epoch else None
+        except (ValueError, UnicodeDecodeError):
+            return None
+
+    @property
+    def library_hash(self) -> str:
+        return _root(self._shelf_roots)
+
+    # Applying shelf payloads -------------------------------------------
+
+    def _emit(self, change: dict) -> None:
+        self._seq += 1
+        self._log.append((self._seq, change))
+        if len(self._log) > self.max_log:
+            drop = len(self._log) - self.max_log
+            self._base_seq = self._log[drop - 1][0]
+            del self._log[:drop]
+
+    def observe(self, key, payload: dict) -> None:
+        """Shelf cache listener."""
+        if key != BOOKSHELVES_KEY:
+            self.apply_shelf(key, payload)
+
+    def apply_shelf(self, bookshelf_id: int, payload: dict) -> bool:
+        """Diff a shelf payload against the last one seen. Returns True if it changed."""
+        records = {}
+        for item in payload.get("items") or []:
+            if item.get("id") is not None:
+                record = book_record(item, bookshelf_id)
+                records[record["id"]] = record
+        hashes = {book_id: record_hash(r) for book_id, r in records.items()}
+        root = _root(hashes)
+        if self._shelf_roots.get(bookshelf_id) == root:
+            return False
+
+        # Until the first full refresh there is no cursor to report against.
+        baseline = not self.initialized
+        previous = self._shelf_books.get(bookshelf_id, {})
+        for book_id, digest in hashes.items():
+            record = records[book_id]
+            known = self._books.get(book_id)
+            if baseline and known is None:
+                pass
+            elif known is None:
+                pending = self._pending_removals.pop(book_id, None)
+                if pending is not None and pending[0] != bookshelf_id:
+                    self._emit({"type": "moved", "book_id": book_id, "from_bookshelf_id": pending[0],
+                                "to_bookshelf_id": bookshelf_id, "title": record["title"]})
+                else:
+                    self._emit({"type": "added", "book_id": book_id, "bookshelf_id": bookshelf_id,
+                                "title": record["title"], "author": record["author"]})
+            elif known[0] != bookshelf_id:
+                self._emit({"type": "moved", "book_id": book_id, "from_bookshelf_id": known[0],
+                            "to_bookshelf_id": bookshelf_id, "title": record["title"]})
+                other = self._shelf_books.get(known[0])
+                if other is not None and other.pop(book_id, None) is not None:
+                    self._shelf_roots[known[0]] = _root(other)
+            elif known[1] != digest:
+                change_type = "cover_changed" if known[2] != record["cover_url"] else "updated"
+                self._emit({"type": change_type, "book_id": book_id, "bookshelf_id": bookshelf_id,
+                            "title": record["title"], "cover_url": record["cover_url"]})
+            self._books[book_id] = (bookshelf_id, digest, record["cover_url"])
+
+        for book_id in previous.keys() - hashes.keys():
+            known = self._books.get(book_id)
+            if known is not None and known[0] == bookshelf_id:
+                del self._books[book_id]
+                if not baseline:
+                    self._pending_removals[book_id] = (bookshelf_id,)
+
+        self._shelf_books[bookshelf_id] = hashes
+        self._shelf_roots[bookshelf_id] = root
+        return True
+
+    def drop_shelf(self, bookshelf_id: int) -> None:
+        self.apply_shelf(bookshelf_id, {"items": []})
+        self._shelf_books.pop(bookshelf_id, None)
+        self._shelf_roots.pop(bookshelf_id, None)
+        self._validators.pop(bookshelf_id, None)
+
+    def _settle(self) -> None:
+        for book_id, (bookshelf_id,) in self._pending_removals.items():
+            self._emit({"type": "removed", "book_id": book_id, "bookshelf_id": bookshelf_id})
+        self._pending_removals.clear()
+
+    # Snapshots ---------------------------------------------------------
+
+    def snapshot(self) -> dict:
+        """JSON-safe state, so cursors handed out before a restart stay valid after it."""
+        return {
+            "epoch": self.epoch,
+            "initialized": self.initialized,
+            "seq": self._seq,
+            "base_seq": self._base_seq,
+            "log": self._log,
+            "books": [[book_id, *known] for book_id, known in self._books.items()],
+            "shelves": [[shelf, list(hashes.items())] for shelf, hashes in self._shelf_books.items()],
+            "validators": [[shelf, *v] for shelf, v in self._validators.items()],
+            "pending_removals": [[book_id, shelf] for book_id, (shelf,) in self._pending_removals.items()],
+        }
+
+    def restore(self, state: dict) -> None:
+        """Load state from ``snapshot``; only valid before any payload is applied."""
+        self.epoch = state["epoch"]
+        self.initialized = state["initialized"]
+        self._seq = state["seq"]
+        self._base_seq = state["base_seq"]
+        self._log = [(seq, change) for seq, change in state["log"]]
+        self._books = {book_id: (shelf, digest, cover) for book_id, shelf, digest, cover in state["books"]}
+        self._shelf_books = {shelf: dict(hashes) for shelf, hashes in state["shelves"]}
+        self._shelf_roots = {shelf: _root(hashes) for shelf, hashes in self._shelf_books.items()}
+        self._validators = {shelf: (etag, last_modified) for shelf, etag, last_modified in state["validators"]}
+        self._pending_removals = {book_id: (shelf,) for book_id, shelf in state["pending_removals"]}
+
+    # Refresh and read ---------------------------------------------------
+
+    async def refresh(self, client, concurrency: int = 16) -> dict:
+        """Check every shelf upstream with conditional requests and apply changes."""
+        shelves = await client.get_bookshelves()
+        shelf_ids = [item["id"] for item in shelves.get("items") or []]
+        for bookshelf_id in set(self._shelf_roots) - set(shelf_ids):
+            self.drop_shelf(bookshelf_id)
+
+        stats = {"checked": 0, "not_modified": 0, "unchanged": 0, "changed": 0}
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def check(bookshelf_id: int) -> None:
+            etag, last_modified = self._validators.get(bookshelf_id, (None, None))
+            async with semaphore:
+                payload, etag, last_modified = await client.get_conditional(
+                    f"/books/bookshelves/{bookshelf_id}", etag, last_modified
+                )
+            self._validators[bookshelf_id] = (etag, last_modified)
+            stats["checked"] += 1
+            if payload is None:
+                stats["not_modified"] += 1
+                return
+            if self.apply_shelf(bookshelf_id, payload):
+                stats["changed"] += 1
+                if self.on_payload is not None:
+                    self.on_payload(bookshelf_id, payload)
+            else:
+                stats["unchanged"] += 1
+
+        await asyncio.gather(*(check(s) for s in shelf_ids))
+        self.initialized = True
+        self._settle()
+        return stats
+
+    def changes_since(self, cursor: Optional[str], limit: int = 500) -> dict:
+        """Changes after ``cursor``; a missing or expired cursor asks for a full reread."""
+        self._settle()
+        seq = self._decode(cursor) if cursor else None
+        if seq is None or seq < self._base_seq:
+            return {
+                "reset": True,
+                "reason": "no cursor" if not cursor else "cursor expired",
+                "cursor": self.cursor(),
+                "library_hash": self.library_hash,
+                "changes": [],
+            }
+
+        start = bisect.bisect_right(self._log, seq, key=lambda entry: entry[0])
+        entries = self._log[start:start + limit]
+        next_seq = entries[-1][0] if entries else seq
+        return {
+            "reset": False,
+            "cursor": self.cursor(next_seq),
+            "has_more": start + limit < len(self._log),
+            "library_hash": self.library_hash,
+            "changes": [change for _, change in entries],
+        }
@@ -0,0 +1,105 @@
+"""Per-tool deadlines, propagated to every upstream request a tool makes."""
+
+import asyncio
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from fastmcp.exceptions import ToolError
+from fastmcp.server.middleware import Middleware
+
+# Tools that fan out over the whole library get longer than the default.
+DEFAULT_TOOL_DEADLINES = {
+    "export_library": 600.0,
+    "query_books": 120.0,
+    "find_duplicates": 120.0,
+    "get_changes_since": 120.0,
+    "similar_books": 120.0,
+    "library_stats": 120.0,
+}
+
+_deadline: ContextVar[Optional[float]] = ContextVar("micro_books_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised instead of starting an upstream request once the tool's deadline has passed."""
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None if there is none."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def clear() -> None:
+    """Detach the current task from any deadline inherited from the tool that started it."""
+    _deadline.set(None)
+
+
+@contextmanager
+def deadline(seconds: float):
+    """Apply a deadline ``seconds`` from now, unless an earlier one is already set."""
+    current = _deadline.get()
+    token = _deadline.set(min(time.monotonic() + seconds, current or float("inf")))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def parse_tool_deadlines(spec: str) -> dict:
+    """Parse ``name=seconds,name=seconds`` into a dict."""
+    deadlines = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, sep, seconds = part.partition("=")
+        if not sep:
+            raise ValueError(f"Invalid tool deadline '{part}', expected name=seconds")
+        deadlines[name.strip()] = float(seconds)
+    return deadlines
+
+
+class DeadlineMiddleware(Middleware):
+    """Bounds each tool call by a deadline from config or the caller's ``_meta``.
+
+    A caller may pass ``{"_meta": {"deadline_seconds": 5}}`` with a tool call
+    to replace the configured budget. Upstream requests made by the tool
+    (including ones in tasks it spawns) read the deadline from a context
+    variable and use the remaining time as their httpx timeout. When the
+    deadline passes, or the client cancels the request, the tool's task is
+    cancelled, which aborts its in-flight requests and frees their
+    connections and limiter slots.
+    """
+
+    def __init__(self, default: float = 30.0, per_tool: Optional[dict] = None) -> None:
+        self.default = default
+        self.per_tool = {**DEFAULT_TOOL_DEADLINES, **(per_tool or {})}
+
+    def budget(self, name: str, meta) -> Optional[float]:
+        extra = getattr(meta, "model_extra", None) or {}
+        seconds = extra.get("deadline_seconds")
+        if seconds is None:
+            seconds = self.per_tool.get(name, self.default)
+        seconds = float(seconds)
+        return seconds if seconds > 0 else None
+
+    @staticmethod
+    def _meta(context):
+        meta = getattr(context.message, "meta", None)
+        if meta is None and context.fastmcp_context is not None:
+            try:
+                meta = context.fastmcp_context.request_context.meta
+            except (LookupError, ValueError):
+                meta = None
+        return meta
+
+    async def on_call_tool(self, context, call_next):
+        name = context.message.name
+        seconds = self.budget(name, self._meta(context))
+        if seconds is None:
+            return await call_next(context)
+        with deadline(seconds):
+            try:
+                return await asyncio.wait_for(call_next(context), seconds)
+            except asyncio.TimeoutError:
+                raise ToolError(f"{name} did not finish within its {seconds:g}s deadline") from None
@@ -0,0 +1,346 @@
+"""Duplicate detection across the whole library.
+
+Books are grouped in three ways, each close to linear in library size:
+
+- same ISBN;
+- same normalized key: the main title without subtitle, leading article,
+  accents or punctuation, plus the first author's surname. Only books
+  whose full titles (subtitle included) also agree are duplicates; a
+  different subtitle, such as another volume of a series, only makes a
+  ``main_title`` match for review;
+- similar titles: MinHash signatures over character shingles of the
+  normalized title, bucketed with LSH banding. Only books sharing a bucket
+  are compared, and candidates are confirmed with the exact Jaccard
+  similarity of their shingles, a compatible author and identical
+  numbering (so "Book 1" and "Book 2" of a series stay apart).
+
+Matching pairs are merged into clusters with union-find. Only books
+matched by ISBN or normalized key are suggested for removal; a match on
+a main or similar title alone is listed for review.
+"""
+
+import hashlib
+import re
+import time
+import unicodedata
+from typing import Optional
+
+from .memory import MemoryAccountant
+
+_SHINGLE_CACHE_SIZE = 200_000
+_ARTICLES = ("the ", "a ", "an ")
+_SUBTITLE = re.compile(r"\s*(?::|\s-\s|\s—\s|\(|\[).*$")
+_NON_WORD = re.compile(r"[^\w\s]+")
+_SPACES = re.compile(r"\s+")
+# Words that tell volumes of a series apart: numbers, roman numerals,
+# spelled-out numbers and the words that introduce them.
+_NUMBERING = re.compile(
+    r"\b(?:\d+|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|vol|volume|part|book|no"
+    r"|m{0,3}(?:cm|cd|d?c{0,3})(?:xc|xl|l?x{0,3})(?:ix|iv|v?i{0,3}))\b"
+)
+STRONG_REASONS = frozenset({"isbn", "normalized_key"})
+
+
+def _fold(text: str) -> str:
+    text = text or ""
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in text if not unicodedata.combining(c))
+    text = text.lower()
+    text = _NON_WORD.sub(" ", text.replace("&", " and "))
+    return _SPACES.sub(" ", text).strip()
+
+
+def _strip_article(folded: str) -> str:
+    for article in _ARTICLES:
+        if folded.startswith(article):
+            return folded[len(article):]
+    return folded
+
+
+def normalize_title(title: str) -> str:
+    """Main title folded to lowercase ASCII words, without subtitle or leading article."""
+    main = _SUBTITLE.sub("", title or "") or title or ""
+    return _strip_article(_fold(main))
+
+
+def full_title(title: str) -> str:
+    """Whole title, subtitle included, folded like ``normalize_title``."""
+    return _strip_article(_fold(title))
+
+
+def normalize_author(author: str) -> str:
+    """Surname of the first author, folded; handles both "First Last" and "Last, First"."""
+    first = (author or "").split(",")[0]
+    words = _fold(first).split()
+    return words[-1] if words else ""
+
+
+def normalize_isbn(isbn: str) -> str:
+    return re.sub(r"[^0-9X]", "", (isbn or "").upper())
+
+
+def numbering(title: str) -> tuple:
+    """Numbers, roman numerals and volume words of a normalized title, in order."""
+    return tuple(m.group() for m in _NUMBERING.finditer(title) if m.group())
+
+
+def shingles(text: str, size: int = 3) -> set:
+    padded = f" {text} "
+    if len(padded) <= size:
+        return {padded}
+    return {padded[i:i + size] for i in range(len(padded) - size + 1)}
+
+
+def jaccard(a: set, b: set) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class _UnionFind:
+    def __init__(self) -> None:
+        self.parent: dict = {}
+
+    def find(self, item):
+        root = self.parent.setdefault(item, item)
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while item != root:
+            item, self.parent[item] = self.parent[item], root
+        return root
+
+    def union(self, a, b) -> None:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[root_b] = root_a
+
+
+class DuplicateFinder:
+    """Finds likely duplicate books and suggests how to resolve them.
+
+    ``bands`` x ``rows`` MinHash values are kept per distinct normalized
+    title; with the defaults, title pairs at 0.6 Jaccard similarity share a
+    bucket about two times in three and pairs at 0.8 about 98% of the time.
+    Band keys are cached by title, so repeated calls only hash new titles.
+    With an ``accountant``, the caches are charged to the shared memory
+    budget and cleared if evicted.
+    """
+
+    def __init__(self, bands: int = 8, rows: int = 4, seed: int = 1, accountant: Optional[MemoryAccountant] = None) -> None:
+        self.bands = bands
+        self.rows = rows
+        if bands * rows > 32:
+            raise ValueError("bands * rows must be at most 32")
+        self._key = seed.to_bytes(8, "little")
+        self._shingle_cache: dict = {}
+        self._band_cache: dict = {}
+        self._memory = accountant.pool("find_duplicates", lambda _: self.clear()) if accountant is not None else None
+
+    def clear(self) -> None:
+        self._shingle_cache = {}
+        self._band_cache = {}
+
+    def _shingle_hashes(self, shingle: str):
+        hashes = self._shingle_cache.get(shingle)
+        if hashes is None:
+            if len(self._shingle_cache) >= _SHINGLE_CACHE_SIZE:
+                self._shingle_cache.clear()
+            digest = hashlib.blake2b(shingle.encode(), digest_size=2 * self.bands * self.rows, key=self._key)
+            hashes = self._shingle_cache[shingle] = tuple(memoryview(digest.digest()).cast("H"))
+        return hashes
+
+    def signature(self, title: str) -> tuple:
+        """MinHash signature: per position, the minimum over the title's shingles.
+
+        One keyed blake2b digest per distinct shingle (cached; titles share
+        most of theirs) supplies all the 16-bit hash values at once, and the
+        column minimums are taken by ``map(min, zip(...))`` rather than a
+        Python loop per permutation.
+        """
+        return tuple(map(min, zip(*map(self._shingle_hashes, shingles(title)))))
+
+    def _band_keys(self, title: str) -> tuple:
+        keys = self._band_cache.get(title)
+        if keys is None:
+            sig = self.signature(title)
+            rows = self.rows
+            keys = self._band_cache[title] = tuple((b, sig[b * rows:(b + 1) * rows]) for b in range(self.bands))
+        return keys
+
+    def find(
+        self,
+        records: list,
+        shelf_names: Optional[dict] = None,
+        threshold: float = 0.7,
+        limit: int = 50,
+    ) -> dict:
+        """Cluster ``records`` (index book records) and suggest actions per cluster."""
+        started = time.monotonic()
+        shelf_names = shelf_names or {}
+        records = [r for r in records if r.get("id") is not None]
+        titles_raw = {r["id"]: r["title"] for r in records}
+        titles = {r["id"]: normalize_title(r["title"]) for r in records}
+        authors = {r["id"]: normalize_author(r["author"]) for r in records}
+        reasons: dict = {}
+        uf = _UnionFind()
+
+        def link(a, b, reason: str, similarity: float = 1.0) -> None:
+            uf.union(a, b)
+            key = (min(a, b), max(a, b))
+            if key not in reasons or similarity > reasons[key][1]:
+                reasons[key] = (reason, round(similarity, 3))
+
+        def link_groups(groups: dict, reason: str) -> None:
+            for ids in groups.values():
+                for other in ids[1:]:
+                    link(ids[0], other, reason)
+
+        by_isbn: dict = {}
+        by_key: dict = {}
+        by_title: dict = {}
+        for r in records:
+            isbn = normalize_isbn(r["isbn"])
+            if isbn:
+                by_isbn.setdefault(isbn, []).append(r["id"])
+            title = titles[r["id"]]
+            if title:
+                by_key.setdefault((title, authors[r["id"]]), []).append(r["id"])
+                by_title.setdefault(title, []).append(r["id"])
+        link_groups(by_isbn, "isbn")
+        for ids in by_key.values():
+            # Same main title and author: a duplicate only if the subtitles agree too.
+            by_full: dict = {}
+            for book_id in ids:
+                by_full.setdefault(full_title(titles_raw[book_id]), []).append(book_id)
+            link_groups(by_full, "normalized_key")
+            variants = [group[0] for group in by_full.values()]
+            for other in variants[1:]:
+                link(variants[0], other, "main_title")
+
+        # LSH over distinct titles: identical titles are already grouped.
+        buckets: dict = {}
+        for title in by_title:
+            for key in self._band_keys(title):
+                buckets.setdefault(key, []).append(title)
+        compared = set()
+        shingle_sets: dict = {}
+        for candidates in buckets.values():
+            if len(candidates) < 2:
+                continue
+            for i, left in enumerate(candidates):
+                for right in candidates[i + 1:]:
+                    pair = (left, right) if left < right else (right, left)
+                    if pair in compared:
+                        continue
+                    compared.add(pair)
+                    for title in pair:
+                        if title not in shingle_sets:
+                            shingle_sets[title] = shingles(title)
+                    similarity = jaccard(shingle_sets[left], shingle_sets[right])
+                    if similarity < threshold or numbering(left) != numbering(right):
+                        continue
+                    for a in by_title[left]:
+                        for b in by_title[right]:
+                            if not authors[a] or not authors[b] or authors[a] == authors[b]:
+                                link(a, b, "similar_title", similarity)
+
+        if len(self._band_cache) > 2 * len(by_title) + 1000:
+            self._band_cache = {t: self._band_cache[t] for t in by_title if t in self._band_cache}
+
+        members: dict = {}
+        for r in records:
+            if r["id"] in uf.parent:
+                members.setdefault(uf.find(r["id"]), []).append(r)
+        matches: dict = {}
+        for pair, (reason, similarity) in sorted(reasons.items()):
+            matches.setdefault(uf.find(pair[0]), []).append(
+                {"book_ids": list(pair), "reason": reason, "similarity": similarity}
+            )
+        clusters = [
+            self._cluster(group, matches[root], shelf_names) for root, group in members.items() if len(group) > 1
+        ]
+        clusters.sort(key=lambda c: (-len(c["books"]), c["books"][0]["title"].lower()))
+
+        elapsed = time.monotonic() - started
+        if self._memory is not None:
+            size = len(self._band_cache) * 1200 + len(self._shingle_cache) * 400
+            self._memory.charge("signatures", size, max(elapsed, 0.001))
+        return {
+            "books_scanned": len(records),
+            "clusters_found": len(clusters),
+            "duplicate_books": sum(len(c["books"]) - 1 for c in clusters),
+            "candidate_pairs_compared": len(compared),
+            "elapsed_ms": round(elapsed * 1000, 1),
+            "clusters": clusters[: max(0, limit)],
+        }
+
+    @staticmethod
+    def _cluster(group: list, matches: list, shelf_names: dict) -> dict:
+        """Pick the entry to keep and the remove_book/move_book calls that resolve the rest.
+
+        Copies are only removed within a set of books matched by ISBN or
+        normalized key; books joined to the cluster by a main or similar
+        title alone are listed under ``review_book_ids`` instead. In each
+        set, the kept entry is the most complete one (ISBN, cover, author).
+        If a copy was added to a different shelf more recently, that shelf
+        is taken to be the book's current state and the kept entry is moved
+        there before the copies are removed.
+        """
+        def completeness(r: dict) -> tuple:
+            return (bool(r["isbn"]), bool(r["cover_url"]), bool(r["author"]), r["date_added"] or "")
+
+        keep = max(group, key=completeness)
+        strong = _UnionFind()
+        for match in matches:
+            if match["reason"] in STRONG_REASONS:
+                strong.union(*match["book_ids"])
+        copies: dict = {}
+        for r in group:
+            copies.setdefault(strong.find(r["id"]), []).append(r)
+
+        actions = []
+        review = []
+        for members in sorted(copies.values(), key=lambda members: keep not in members):
+            if len(members) == 1:
+                if members[0] is not keep:
+                    review.append(members[0]["id"])
+                continue
+            kept = keep if keep in members else max(members, key=completeness)
+            latest = max(members, key=lambda r: r["date_added"] or "")
+            newer = (latest["date_added"] or "") > (kept["date_added"] or "")
+            if latest["bookshelf_id"] != kept["bookshelf_id"] and newer:
+                shelf = shelf_names.get(latest["bookshelf_id"]) or latest["bookshelf_id"]
+                actions.append({
+                    "tool": "move_book",
+                    "arguments": {"book_id": kept["id"], "bookshelf_id": latest["bookshelf_id"]},
+                    "reason": f"most recent copy is on {shelf}",
+                })
+            for r in members:
+                if r is not kept:
+                    actions.append({
+                        "tool": "remove_book",
+                        "arguments": {"bookshelf_id": r["bookshelf_id"], "book_id": r["id"]},
+                        "reason": f"duplicate of book {kept['id']}",
+                    })
+
+        books = [
+            {
+                "id": r["id"],
+                "title": r["title"],
+                "author": r["author"],
+                "isbn": r["isbn"],
+                "bookshelf_id": r["bookshelf_id"],
+                "bookshelf_name": shelf_names.get(r["bookshelf_id"], ""),
+                "date_added": r["date_added"],
+            }
+            for r in sorted(group, key=lambda r: r["id"])
+        ]
+        return {
+            "keep": keep["id"],
+            "same_shelf": len({r["bookshelf_id"] for r in group}) == 1,
+            "books": books,
+            "matches": matches,
+            "suggested_actions": actions,
+            "review_book_ids": sorted(review),
+        }
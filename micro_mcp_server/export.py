@@ -0,0 +1,241 @@
+"""Streaming library export to NDJSON, CSV, Parquet or Arrow."""
+
+import asyncio
+import csv
+import json
+import logging
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import AsyncIterator, Callable, Optional
+
+from .records import RECORD_FIELDS, record_hash, shelf_records
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = ("ndjson", "csv", "parquet", "arrow")
+
+_DONE = object()
+
+
+class _NdjsonWriter:
+    def __init__(self, path: Path) -> None:
+        self._file = open(path, "w", encoding="utf-8")
+
+    def write_batch(self, records: list) -> None:
+        for record in records:
+            self._file.write(json.dumps(record, ensure_ascii=False))
+            self._file.write("\n")
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _CsvWriter:
+    def __init__(self, path: Path) -> None:
+        self._file = open(path, "w", encoding="utf-8", newline="")
+        self._writer = csv.DictWriter(self._file, fieldnames=RECORD_FIELDS)
+        self._writer.writeheader()
+
+    def write_batch(self, records: list) -> None:
+        self._writer.writerows(records)
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _ArrowWriter:
+    """Writes one record batch (row group) per bookshelf."""
+
+    def __init__(self, path: Path, fmt: str) -> None:
+        try:
+            import pyarrow as pa
+        except ImportError as e:
+            raise RuntimeError(
+                f"pyarrow is required for {fmt} export; install micro-mcp-server[parquet]"
+            ) from e
+
+        self._pa = pa
+        self._schema = pa.schema(
+            [
+                ("id", pa.int64()),
+                ("title", pa.string()),
+                ("author", pa.string()),
+                ("isbn", pa.string()),
+                ("cover_url", pa.string()),
+                ("bookshelf_id", pa.int64()),
+                ("bookshelf_name", pa.string()),
+                ("date_added", pa.string()),
+            ]
+        )
+        if fmt == "parquet":
+            import pyarrow.parquet as pq
+
+            self._writer = pq.ParquetWriter(str(path), self._schema)
+        else:
+            self._sink = pa.OSFile(str(path), "wb")
+            self._writer = pa.ipc.new_file(self._sink, self._schema)
+
+    def write_batch(self, records: list) -> None:
+        if records:
+            batch = self._pa.RecordBatch.from_pylist(records, schema=self._schema)
+            self._writer.write_batch(batch)
+
+    def close(self) -> None:
+        self._writer.close()
+        sink = getattr(self, "_sink", None)
+        if sink is not None:
+            sink.close()
+
+
+def _open_writer(path: Path, fmt: str):
+    if fmt == "ndjson":
+        return _NdjsonWriter(path)
+    if fmt == "csv":
+        return _CsvWriter(path)
+    if fmt in ("parquet", "arrow"):
+        return _ArrowWriter(path, fmt)
+    raise ValueError(f"Unsupported export format '{fmt}', expected one of {', '.join(EXPORT_FORMATS)}")
+
+
+async def iter_shelf_records(
+    client, concurrency: int = 16, progress: Optional[Callable[[int, int], None]] = None
+) -> AsyncIterator[tuple]:
+    """Fetch bookshelves concurrently, yielding ``(shelf, records)`` as each completes.
+
+    A bounded queue between the fetchers and the consumer keeps at most
+    ``2 * concurrency`` shelves in memory regardless of library size. The
+    client's adaptive limiter decides how many fetches actually run at once.
+    ``progress(done, total)`` is called as each shelf is consumed.
+    """
+    shelves = (await client.get_bookshelves()).get("items") or []
+    pending = list(reversed(shelves))
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    errors: list = []
+
+    async def worker() -> None:
+        try:
+            while pending:
+                shelf = pending.pop()
+                payload = await client.get_bookshelf_books(shelf["id"])
+                records = list(shelf_records(payload, shelf["id"], shelf.get("title") or ""))
+                await queue.put((shelf, records))
+        except Exception as e:
+            errors.append(e)
+            pending.clear()
+        await queue.put(_DONE)
+
+    workers = [asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, len(shelves))))]
+    try:
+        remaining = len(workers)
+        consumed = 0
+        while remaining:
+            item = await queue.get()
+            if item is _DONE:
+                remaining -= 1
+                continue
+            yield item
+            consumed += 1
+            if progress is not None:
+                progress(consumed, len(shelves))
+        if errors:
+            raise errors[0]
+    finally:
+        for task in workers:
+            task.cancel()
+
+
+def export_target(directory: str, name: Optional[str], fmt: str, incremental: bool = False) -> Path:
+    """Resolve an export file ``name`` inside ``directory``, refusing names that leave it.
+
+    Without a name, a timestamped one is generated so that an incremental
+    export never replaces an earlier full one.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{fmt}', expected one of {', '.join(EXPORT_FORMATS)}")
+    root = Path(directory).expanduser().resolve()
+    if not name:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        name = f"library-{'changes-' if incremental else ''}{stamp}.{fmt}"
+    target = (root / name).resolve()
+    if target == root or not target.is_relative_to(root):
+        raise ValueError(f"Export path must be a file name inside the exports directory, got {name!r}")
+    target.parent.mkdir(parents=True, exist_ok=True)
+    return target
+
+
+def _load_manifest(path: Path) -> dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f).get("books", {})
+    except FileNotFoundError:
+        return {}
+
+
+def _write_manifest(path: Path, fmt: str, books: dict) -> None:
+    manifest = {
+        "version": 1,
+        "exported_at": datetime.now(timezone.utc).isoformat(),
+        "format": fmt,
+        "books": books,
+    }
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, path)
+
+
+async def export_library(
+    client,
+    path: str,
+    fmt: str = "ndjson",
+    incremental: bool = False,
+    manifest_path: Optional[str] = None,
+    concurrency: int = 16,
+    progress: Optional[Callable[[int, int], None]] = None,
+) -> dict:
+    """Export every bookshelf to ``path`` and record a manifest of book hashes.
+
+    With ``incremental`` set, only books whose content changed since the
+    previous manifest are written; books that disappeared are reported in
+    the summary. ``progress(shelves_done, shelves_total)`` follows along.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format '{fmt}', expected one of {', '.join(EXPORT_FORMATS)}")
+
+    out_path = Path(path).expanduser()
+    manifest = Path(manifest_path).expanduser() if manifest_path else out_path.with_name(out_path.name + ".manifest.json")
+    previous = _load_manifest(manifest) if incremental else {}
+
+    hashes: dict = {}
+    shelves = 0
+    written = 0
+    writer = _open_writer(out_path, fmt)
+    try:
+        async for _shelf, records in iter_shelf_records(client, concurrency, progress):
+            shelves += 1
+            changed = []
+            for record in records:
+                key = str(record["id"])
+                digest = record_hash(record)
+                hashes[key] = digest
+                if previous.get(key) != digest:
+                    changed.append(record)
+            writer.write_batch(changed)
+            written += len(changed)
+    finally:
+        writer.close()
+
+    _write_manifest(manifest, fmt, hashes)
+    removed = sorted(set(previous) - set(hashes))
+    logger.info("Exported %d of %d books from %d bookshelves to %s", written, len(hashes), shelves, out_path)
+    return {
+        "path": str(out_path),
+        "format": fmt,
+        "incremental": incremental,
+        "bookshelves": shelves,
+        "books_seen": len(hashes),
+        "books_written": written,
+        "removed_book_ids": removed,
+        "manifest": str(manifest),
+    }
@@ -0,0 +1,193 @@
+"""Local history of reading-goal progress and pace forecasts.
+
+Every goal payload the client reads, and every update it sends, is
+snapshotted into SQLite. ``forecast`` answers "am I on track?" from those
+snapshots: the year-to-date pace, the pace over a recent window, the
+projected completion date under each, and the books per week still needed.
+"""
+
+import logging
+import re
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS goal_snapshots (
+    goal_id INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    year INTEGER,
+    target INTEGER,
+    progress INTEGER,
+    source TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS goal_snapshots_goal ON goal_snapshots (goal_id, ts);
+"""
+_YEAR = re.compile(r"\b(19|20)\d{2}\b")
+
+
+def _int(value) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_goal(item: dict) -> dict:
+    """Goal id, year, target and progress from a goal item or goal payload, where present."""
+    microblog = item.get("_microblog") or {}
+    year = _int(microblog.get("year", item.get("year")))
+    if year is None:
+        match = _YEAR.search(item.get("title") or "")
+        year = int(match.group(0)) if match else None
+    return {
+        "goal_id": _int(item.get("id")),
+        "year": year,
+        "target": _int(microblog.get("value", item.get("value"))),
+        "progress": _int(microblog.get("progress", item.get("progress"))),
+    }
+
+
+class GoalHistory:
+    """SQLite time series of goal snapshots.
+
+    A snapshot is only stored when the target or progress changed, or at
+    most once a day otherwise, so polling a goal does not grow the table.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.path), isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    def _last(self, goal_id: int) -> Optional[sqlite3.Row]:
+        return self._db.execute(
+            "SELECT * FROM goal_snapshots WHERE goal_id = ? ORDER BY ts DESC LIMIT 1", (goal_id,)
+        ).fetchone()
+
+    def record(
+        self,
+        goal_id: int,
+        target: Optional[int],
+        progress: Optional[int],
+        year: Optional[int] = None,
+        source: str = "read",
+        ts: Optional[float] = None,
+    ) -> bool:
+        """Store a snapshot; missing fields carry over from the previous one."""
+        ts = time.time() if ts is None else ts
+        last = self._last(goal_id)
+        if last is not None:
+            target = last["target"] if target is None else target
+            progress = last["progress"] if progress is None else progress
+            year = last["year"] if year is None else year
+            unchanged = (last["target"], last["progress"]) == (target, progress)
+            if unchanged and ts - last["ts"] < 86400:
+                return False
+        if target is None and progress is None:
+            return False
+        self._db.execute(
+            "INSERT INTO goal_snapshots (goal_id, ts, year, target, progress, source) VALUES (?, ?, ?, ?, ?, ?)",
+            (goal_id, ts, year, target, progress, source),
+        )
+        return True
+
+    def observe_goals(self, payload: dict) -> None:
+        """Snapshot every goal in a ``/books/goals`` payload."""
+        for item in payload.get("items") or []:
+            goal = parse_goal(item)
+            if goal["goal_id"] is not None:
+                self.record(goal["goal_id"], goal["target"], goal["progress"], goal["year"])
+
+    def observe_progress(self, goal_id: int, payload: dict) -> None:
+        """Snapshot a ``/books/goals/{id}`` payload; without a progress field, its books are counted."""
+        goal = parse_goal(payload)
+        progress = goal["progress"]
+        if progress is None and isinstance(payload.get("items"), list):
+            progress = len(payload["items"])
+        self.record(goal_id, goal["target"], progress, goal["year"])
+
+    def goal_ids(self) -> list:
+        return [row[0] for row in self._db.execute("SELECT DISTINCT goal_id FROM goal_snapshots ORDER BY goal_id")]
+
+    def history(self, goal_id: int) -> list:
+        return self._db.execute(
+            "SELECT ts, year, target, progress FROM goal_snapshots WHERE goal_id = ? ORDER BY ts", (goal_id,)
+        ).fetchall()
+
+    def forecast(self, goal_id: int, window_days: int = 28, today: Optional[date] = None) -> dict:
+        """Pace and projections for one goal from its stored snapshots."""
+        rows = [r for r in self.history(goal_id) if r["progress"] is not None]
+        if not rows:
+            return {"goal_id": goal_id, "snapshots": 0, "message": "No progress recorded for this goal yet"}
+        latest = rows[-1]
+        now = datetime.now() if today is None else datetime.combine(today, datetime.min.time())
+        today = now.date()
+        year = latest["year"] or today.year
+        start, end = date(year, 1, 1), date(year, 12, 31)
+        target, progress = latest["target"], latest["progress"]
+        elapsed_days = max(1, (min(today, end) - start).days + 1)
+        days_left = max(0, (end - today).days)
+        result = {
+            "goal_id": goal_id,
+            "year": year,
+            "target": target,
+            "progress": progress,
+            "remaining": max(0, target - progress) if target is not None else None,
+            "snapshots": len(rows),
+            "last_snapshot": datetime.fromtimestamp(latest["ts"]).isoformat(timespec="seconds"),
+            "days_left": days_left,
+        }
+
+        # Year to date: books so far over days elapsed since January 1.
+        ytd_per_day = progress / elapsed_days
+        result["year_to_date"] = self._projection(ytd_per_day, target, progress, today, end)
+        if target:
+            expected = target * elapsed_days / ((end - start).days + 1)
+            result["expected_progress_today"] = round(expected, 1)
+            result["ahead_by"] = round(progress - expected, 1)
+            weeks_left = days_left / 7
+            remaining = max(0, target - progress)
+            result["books_per_week_needed"] = round(remaining / weeks_left, 2) if weeks_left > 0 else None
+
+        # Rolling window: progress made since the last snapshot at or before
+        # the window start (or the oldest one, if history is shorter).
+        cutoff = now.timestamp() - window_days * 86400
+        base = next((r for r in reversed(rows) if r["ts"] <= cutoff), rows[0])
+        span_days = (now.timestamp() - base["ts"]) / 86400
+        if span_days >= 1 and base is not latest:
+            per_day = max(0, progress - base["progress"]) / span_days
+            window = self._projection(per_day, target, progress, today, end)
+            window["window_days"] = round(span_days, 1)
+            result["recent"] = window
+        else:
+            result["recent"] = {"window_days": round(max(0.0, span_days), 1), "message": "Not enough history yet"}
+        return result
+
+    @staticmethod
+    def _projection(per_day: float, target: Optional[int], progress: int, today: date, end: date) -> dict:
+        projection = {"books_per_week": round(per_day * 7, 2)}
+        if target is None:
+            return projection
+        if progress >= target:
+            projection["projected_completion"] = "done"
+            projection["on_track"] = True
+        elif per_day > 0:
+            finish = today + timedelta(days=(target - progress) / per_day)
+            projection["projected_completion"] = finish.isoformat()
+            projection["on_track"] = finish <= end
+            projection["projected_total_by_year_end"] = int(progress + per_day * max(0, (end - today).days))
+        else:
+            projection["projected_completion"] = None
+            projection["on_track"] = False
+        return projection
+
+    def close(self) -> None:
+        self._db.close()
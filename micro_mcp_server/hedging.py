@@ -0,0 +1,124 @@
+"""Hedged upstream reads: send a backup request when the first one runs long."""
+
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """Percentiles over a sliding window of recent latencies."""
+
+    def __init__(self, window: int = 500) -> None:
+        self._samples: deque = deque(maxlen=window)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, latency: float) -> None:
+        self._samples.append(latency)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        values = sorted(self._samples)
+        return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class Hedger:
+    """Runs idempotent requests with a hedge after the tracked ``percentile`` latency.
+
+    If the first attempt has not finished by then, a duplicate is sent and
+    whichever completes first wins; the other is cancelled. Every request
+    earns ``budget`` hedge tokens (capped at ``burst``) and each hedge
+    spends one, so hedges stay below ``budget`` of total traffic even when
+    upstream is slow across the board. No hedges are sent until
+    ``min_samples`` latencies have been seen.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        budget: float = 0.05,
+        min_samples: int = 20,
+        window: int = 500,
+        burst: float = 10.0,
+    ) -> None:
+        self.percentile = percentile
+        self.budget = budget
+        self.min_samples = min_samples
+        self.burst = burst
+        self.latencies = LatencyTracker(window)
+        self.requests = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.skipped_budget = 0
+        self._tokens = 0.0
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or None while there is too little data."""
+        if len(self.latencies) < self.min_samples:
+            return None
+        return self.latencies.percentile(self.percentile)
+
+    def _attempt(self, send: Callable[[], Awaitable]) -> asyncio.Task:
+        """Start one attempt; its latency counts only if it ran to completion."""
+        started = time.monotonic()
+        task = asyncio.create_task(send())
+
+        def record(done: asyncio.Task) -> None:
+            # A cancelled loser only shows how long it took to lose, not upstream latency.
+            if not done.cancelled():
+                self.latencies.add(time.monotonic() - started)
+
+        task.add_done_callback(record)
+        return task
+
+    async def run(self, send: Callable[[], Awaitable]):
+        self.requests += 1
+        self._tokens = min(self.burst, self._tokens + self.budget)
+        primary = self._attempt(send)
+        attempts = [primary]
+        try:
+            delay = self.delay()
+            if delay is None:
+                return await primary
+            done, _ = await asyncio.wait(attempts, timeout=delay)
+            if done:
+                return primary.result()
+            if self._tokens < 1:
+                self.skipped_budget += 1
+                return await primary
+            self._tokens -= 1
+            self.hedges += 1
+            attempts.append(self._attempt(send))
+
+            while True:
+                done, pending = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+                winner = done.pop()
+                if winner.exception() is None or not pending:
+                    if winner is not primary:
+                        self.hedge_wins += 1
+                    return winner.result()
+                # One attempt failed; let the other one finish.
+                attempts = list(pending)
+        finally:
+            for attempt in attempts:
+                if not attempt.done():
+                    attempt.cancel()
+                elif not attempt.cancelled():
+                    attempt.exception()  # mark a losing failure as retrieved
+
+    def stats(self) -> dict:
+        delay = self.delay()
+        return {
+            "requests": self.requests,
+            "hedges": self.hedges,
+            "hedge_rate": round(self.hedges / self.requests, 4) if self.requests else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "skipped_budget": self.skipped_budget,
+            "hedge_after_ms": round(delay * 1000, 1) if delay is not None else None,
+        }
@@ -0,0 +1,168 @@
+"""Duplicate suppression for retried mutations.
+
+A mutating tool called with an ``idempotency_key`` runs once; calls that
+repeat the key get the stored result instead of a second upstream
+request, for up to a day. ``add_book`` and ``add_bookshelf`` calls
+without a key get one derived from their normalized arguments, valid for
+a short window, so an agent that times out and retries the same call
+does not create a second book or shelf. Other mutations are not
+deduplicated without a key: moving a book back to where it was a minute
+ago is a real change, not a retry.
+
+Results are kept in a bounded SQLite table, so retries are recognized
+across restarts. Identical calls that arrive while the first is still
+running wait for its result.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Creating calls are the ones where a blind retry leaves a duplicate behind.
+DERIVED_KEY_TOOLS = frozenset({"add_book", "add_bookshelf"})
+EXPLICIT_KEY_TTL = 86400.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency (
+    key TEXT PRIMARY KEY,
+    tool TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    result TEXT NOT NULL,
+    created REAL NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idempotency_created ON idempotency (created);
+"""
+
+
+class IdempotencyConflict(ValueError):
+    """Raised when an idempotency key is reused with different arguments."""
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return " ".join(value.split()).casefold()
+    return value
+
+
+def fingerprint(tool: str, payload: dict) -> str:
+    """Hash of a tool call's arguments, ignoring case, extra whitespace and unset options."""
+    normalized = {k: _normalize(v) for k, v in sorted(payload.items()) if v is not None and v != ""}
+    encoded = json.dumps([tool, normalized], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """Stored results of recent mutations, keyed by idempotency key.
+
+    At most ``max_entries`` results are kept; derived keys expire after
+    ``window`` seconds and explicit keys after a day.
+    """
+
+    def __init__(self, path: str, window: float = 600.0, max_entries: int = 1000) -> None:
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.window = window
+        self.max_entries = max_entries
+        self.replayed = 0
+        self.joined = 0
+        self._inflight: dict = {}
+        self._db = sqlite3.connect(str(self.path), isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    def _lookup(self, key: str, now: float) -> Optional[tuple]:
+        return self._db.execute(
+            "SELECT fingerprint, result FROM idempotency WHERE key = ? AND expires > ?", (key, now)
+        ).fetchone()
+
+    def _store(self, key: str, tool: str, fp: str, result: dict, ttl: float) -> None:
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO idempotency (key, tool, fingerprint, result, created, expires)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (key, tool, fp, json.dumps(result), now, now + ttl),
+        )
+        self._db.execute("DELETE FROM idempotency WHERE expires <= ?", (now,))
+        self._db.execute(
+            "DELETE FROM idempotency WHERE key NOT IN"
+            " (SELECT key FROM idempotency ORDER BY created DESC LIMIT ?)",
+            (self.max_entries,),
+        )
+
+    async def run(
+        self,
+        tool: str,
+        payload: dict,
+        call: Callable[[], Awaitable[dict]],
+        key: Optional[str] = None,
+    ) -> dict:
+        """Run ``call`` unless this key (or, for creating tools, these arguments) already ran.
+
+        A replayed result carries ``"idempotent_replay": true``. Failed
+        calls are not stored, so they can be retried.
+        """
+        fp = fingerprint(tool, payload)
+        if key:
+            stored_key, ttl = f"{tool}:key:{key}", EXPLICIT_KEY_TTL
+        elif tool in DERIVED_KEY_TOOLS and self.window > 0:
+            stored_key, ttl = f"{tool}:args:{fp}", self.window
+        else:
+            return await call()
+
+        row = self._lookup(stored_key, time.time())
+        if row is not None:
+            if row[0] != fp:
+                raise IdempotencyConflict(f"Idempotency key {key!r} was already used with different arguments")
+            self.replayed += 1
+            logger.info("Replayed stored result for a repeated %s call", tool)
+            return {**json.loads(row[1]), "idempotent_replay": True}
+
+        pending = self._inflight.get(stored_key)
+        if pending is not None:
+            fp_pending, future = pending
+            if fp_pending != fp:
+                raise IdempotencyConflict(f"Idempotency key {key!r} is in use with different arguments")
+            self.joined += 1
+            try:
+                result = await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                return await self.run(tool, payload, call, key)  # The first call was cancelled; go ahead.
+            return {**result, "idempotent_replay": True}
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[stored_key] = (fp, future)
+        try:
+            result = await call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Waiters re-raise it; don't warn if there are none.
+            raise
+        else:
+            future.set_result(result)
+            try:
+                self._store(stored_key, tool, fp, result, ttl)
+            except sqlite3.Error:
+                logger.warning("Failed to store idempotency result for %s", tool, exc_info=True)
+            return result
+        finally:
+            del self._inflight[stored_key]
+
+    def stats(self) -> dict:
+        (stored,) = self._db.execute("SELECT COUNT(*) FROM idempotency").fetchone()
+        return {"stored": stored, "replayed": self.replayed, "joined_in_flight": self.joined}
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,409 @@
+"""Locally maintained, indexed copy of the library and a small query language."""
+
+import asyncio
+import bisect
+import logging
+import re
+import time
+from typing import Callable, Optional
+
+from .cache import BOOKSHELVES_KEY
+from .records import book_record
+
+logger = logging.getLogger(__name__)
+
+FIELDS = {
+    "id": "id",
+    "title": "title",
+    "author": "author",
+    "isbn": "isbn",
+    "cover_url": "cover_url",
+    "shelf": "bookshelf_id",
+    "bookshelf_id": "bookshelf_id",
+    "shelf_name": "bookshelf_name",
+    "date": "date_added",
+    "date_added": "date_added",
+}
+
+_TOKEN = re.compile(
+    r"""\s*(?:
+        (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+      | (?P<op>\^=|!=|>=|<=|=|>|<)
+      | (?P<punct>[(),])
+      | (?P<word>[A-Za-z_][A-Za-z0-9_\-.:]*|-?\d[\d\-.:T+Z]*)
+    )""",
+    re.VERBOSE,
+)
+
+
+# Sorts after any string that starts with the same prefix.
+_LAST_CHAR = "\U0010ffff"
+
+
+class QueryError(ValueError):
+    """Raised for malformed query_books expressions."""
+
+
+def _tokenize(text: str) -> list:
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        match = _TOKEN.match(text, pos)
+        if not match or match.end() == pos:
+            raise QueryError(f"Unexpected input at: {text[pos:pos + 20]!r}")
+        pos = match.end()
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "string":
+            value = re.sub(r"\\(.)", r"\1", value[1:-1])
+        tokens.append((kind, value))
+    return tokens
+
+
+_DATE = re.compile(r"\d{4}(?:-\d{2}(?:-\d{2}(?:T[\d:.+\-Z]*)?)?)?")
+
+
+def _integers(field: str, value):
+    try:
+        return [int(v) for v in value] if isinstance(value, list) else int(value)
+    except (TypeError, ValueError):
+        raise QueryError(f"{field} expects integer values, got {value!r}") from None
+
+
+def _dates(field: str, value):
+    """Validate date literals (a year, month or day; any time part is dropped)."""
+    for v in value if isinstance(value, list) else [value]:
+        if not _DATE.fullmatch(v):
+            raise QueryError(f"{field} expects dates like 2025, 2025-03 or 2025-03-01, got {v!r}")
+    return [v[:10] for v in value] if isinstance(value, list) else value[:10]
+
+
+def parse_where(text: str) -> list:
+    """Parse ``field op value [and ...]`` into ``(field, op, value)`` clauses.
+
+    Operators: ``=``, ``!=``, ``^=`` (prefix), ``in (..)``, ``not in (..)``
+    and ``>``, ``>=``, ``<``, ``<=`` for ranges. Dates are a year, month or
+    day and compare at that precision, so ``date > 2024`` starts in 2025.
+    Text comparisons are case-insensitive.
+    """
+    tokens = _tokenize(text)
+    clauses = []
+    i = 0
+
+    def take() -> tuple:
+        nonlocal i
+        if i >= len(tokens):
+            raise QueryError("Unexpected end of query")
+        i += 1
+        return tokens[i - 1]
+
+    while i < len(tokens):
+        kind, name = take()
+        field = FIELDS.get(name.lower()) if kind == "word" else None
+        if field is None:
+            raise QueryError(f"Unknown field {name!r}; expected one of {', '.join(sorted(FIELDS))}")
+
+        kind, op = take()
+        if kind == "word" and op.lower() == "not":
+            kind, op = take()
+            if op.lower() != "in":
+                raise QueryError("Expected 'in' after 'not'")
+            op = "not in"
+        elif kind == "word" and op.lower() == "in":
+            op = "in"
+        elif kind != "op":
+            raise QueryError(f"Expected an operator after {name!r}")
+
+        if op in ("in", "not in"):
+            if take() != ("punct", "("):
+                raise QueryError(f"Expected '(' after {op!r}")
+            values = []
+            while True:
+                kind, value = take()
+                if (kind, value) == ("punct", ")"):
+                    break
+                if (kind, value) == ("punct", ","):
+                    continue
+                values.append(value)
+            value = values
+        else:
+            kind, value = take()
+            if kind not in ("string", "word"):
+                raise QueryError(f"Expected a value after {op!r}")
+        # Literals stay strings, so "isbn = 9780451524935" compares as text.
+        if field in ("id", "bookshelf_id"):
+            value = _integers(field, value)
+        elif field == "date_added" and op != "^=":
+            value = _dates(field, value)
+        clauses.append((field, op, value))
+
+        if i < len(tokens):
+            kind, word = take()
+            if kind != "word" or word.lower() != "and":
+                raise QueryError(f"Expected 'and' between clauses, got {word!r}")
+    return clauses
+
+
+def _norm(value):
+    return value.lower() if isinstance(value, str) else value
+
+
+def _matches(record: dict, field: str, op: str, value) -> bool:
+    actual = record.get(field)
+    if field == "author" and op in ("=", "!=", "in", "not in", "^="):
+        names = [_norm(a) for a in _split_authors(actual)]
+        if op == "=":
+            return _norm(value) in names
+        if op == "!=":
+            return _norm(value) not in names
+        if op == "^=":
+            return any(n.startswith(_norm(value)) for n in names)
+        wanted = {_norm(v) for v in value}
+        return bool(wanted.intersection(names)) == (op == "in")
+
+    if field == "date_added":
+        actual = (actual or "")[:10]
+        if op in ("in", "not in"):
+            return any(actual.startswith(v) for v in value) == (op == "in")
+        if op != "^=":
+            # A year or month covers every day in it: compare at its precision.
+            actual = actual[:len(value)]
+    actual, value = _norm(actual), [_norm(v) for v in value] if isinstance(value, list) else _norm(value)
+
+    if op == "=":
+        return actual == value
+    if op == "!=":
+        return actual != value
+    if op == "^=":
+        return str(actual).startswith(str(value))
+    if op == "in":
+        return actual in value
+    if op == "not in":
+        return actual not in value
+    if actual in (None, ""):
+        return False
+    if op == ">":
+        return actual > value
+    if op == ">=":
+        return actual >= value
+    if op == "<":
+        return actual < value
+    return actual <= value
+
+
+def _split_authors(author: str) -> list:
+    return [a.strip() for a in (author or "").split(",") if a.strip()]
+
+
+class LibraryIndex:
+    """In-memory copy of every bookshelf with secondary indexes.
+
+    Records are keyed by book id. Secondary indexes map author and shelf to
+    book ids, and sorted ``(key, id)`` lists over date added and title
+    answer range and prefix queries with bisection. Shelves are replaced
+    wholesale whenever a fresh payload is seen, either from the shelf cache
+    (reads, write patches and reconciles) or from ``refresh``.
+    """
+
+    def __init__(self, max_age: float = 300.0) -> None:
+        self.max_age = max_age
+        self.records: dict = {}
+        self.shelf_names: dict = {}
+        self.by_shelf: dict = {}
+        self.by_author: dict = {}
+        self._by_date: list = []
+        self._by_title: list = []
+        self._shelf_loaded: dict = {}
+        self._listeners: list = []
+
+    def estimated_bytes(self) -> int:
+        """Rough size of the records and secondary indexes."""
+        return len(self.records) * 1200
+
+    def add_listener(self, listener) -> None:
+        """Register ``listener(bookshelf_id, added, removed)`` for shelf replacements."""
+        self._listeners.append(listener)
+
+    def observe(self, key, payload: dict) -> None:
+        """Shelf cache listener: index bookshelf listings and shelf payloads."""
+        if key == BOOKSHELVES_KEY:
+            self.shelf_names = {item["id"]: item.get("title") or "" for item in payload.get("items") or []}
+        else:
+            self.replace_shelf(key, payload)
+
+    def replace_shelf(self, bookshelf_id: int, payload: dict) -> None:
+        new = {}
+        for item in payload.get("items") or []:
+            if item.get("id") is None:
+                continue  # Provisional entries from optimistic cache patches.
+            record = book_record(item, bookshelf_id)
+            new[record["id"]] = record
+
+        removed = []
+        for book_id in list(self.by_shelf.get(bookshelf_id, ())):
+            record = self.records.get(book_id)
+            if record is None or record["bookshelf_id"] != bookshelf_id:
+                self.by_shelf[bookshelf_id].discard(book_id)
+            elif new.get(book_id) != record:
+                removed.append(record)
+        added = [r for i, r in new.items() if self.records.get(i) != r]
+
+        for record in removed:
+            self._unindex(record)
+        for record in added:
+            previous = self.records.get(record["id"])
+            if previous is not None:
+                # The book was last seen on another shelf that has not been refetched yet.
+                self._unindex(previous)
+            self._index(record)
+        self._shelf_loaded[bookshelf_id] = time.monotonic()
+        for listener in self._listeners:
+            listener(bookshelf_id, added, removed)
+
+    def mark_loaded(self, bookshelf_id: int, age: float) -> None:
+        """Record that a shelf's indexed copy is ``age`` seconds old, e.g. after a restore."""
+        if bookshelf_id in self._shelf_loaded:
+            self._shelf_loaded[bookshelf_id] = time.monotonic() - age
+
+    def drop_shelf(self, bookshelf_id: int) -> None:
+        self.replace_shelf(bookshelf_id, {"items": []})
+        self.by_shelf.pop(bookshelf_id, None)
+        self._shelf_loaded.pop(bookshelf_id, None)
+
+    def _index(self, record: dict) -> None:
+        book_id = record["id"]
+        self.records[book_id] = record
+        self.by_shelf.setdefault(record["bookshelf_id"], set()).add(book_id)
+        for author in _split_authors(record["author"]):
+            self.by_author.setdefault(author.lower(), set()).add(book_id)
+        bisect.insort(self._by_date, ((record["date_added"] or "")[:10], book_id))
+        bisect.insort(self._by_title, (record["title"].lower(), book_id))
+
+    def _unindex(self, record: dict) -> None:
+        book_id = record["id"]
+        if self.records.get(book_id) is record:
+            del self.records[book_id]
+        self.by_shelf.get(record["bookshelf_id"], set()).discard(book_id)
+        for author in _split_authors(record["author"]):
+            ids = self.by_author.get(author.lower())
+            if ids is not None:
+                ids.discard(book_id)
+                if not ids:
+                    del self.by_author[author.lower()]
+        self._remove_sorted(self._by_date, ((record["date_added"] or "")[:10], book_id))
+        self._remove_sorted(self._by_title, (record["title"].lower(), book_id))
+
+    @staticmethod
+    def _remove_sorted(entries: list, key: tuple) -> None:
+        pos = bisect.bisect_left(entries, key)
+        if pos < len(entries) and entries[pos] == key:
+            del entries[pos]
+
+    async def refresh(
+        self, client, concurrency: int = 16, progress: Optional[Callable[[int, int], None]] = None
+    ) -> None:
+        """Load shelves that are missing or older than ``max_age``, calling ``progress(done, total)``."""
+        shelves = await client.get_bookshelves()
+        self.observe(BOOKSHELVES_KEY, shelves)
+        for bookshelf_id in set(self.by_shelf) - set(self.shelf_names):
+            self.drop_shelf(bookshelf_id)
+
+        now = time.monotonic()
+        stale = [s for s in self.shelf_names if now - self._shelf_loaded.get(s, float("-inf")) > self.max_age]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        loaded = 0
+
+        async def load(bookshelf_id: int) -> None:
+            nonlocal loaded
+            async with semaphore:
+                payload = await client.get_bookshelf_books(bookshelf_id)
+            self.replace_shelf(bookshelf_id, payload)
+            loaded += 1
+            if progress is not None:
+                progress(loaded, len(stale))
+
+        await asyncio.gather(*(load(s) for s in stale))
+
+    # Querying ----------------------------------------------------------
+
+    def _range(self, entries: list, low: Optional[tuple], high: Optional[tuple]) -> set:
+        start = bisect.bisect_left(entries, low) if low else 0
+        end = bisect.bisect_left(entries, high) if high else len(entries)
+        return {book_id for _, book_id in entries[start:end]}
+
+    def _candidates(self, field: str, op: str, value) -> Optional[set]:
+        """Book ids that may satisfy a clause, from an index; None if not indexable."""
+        if field == "bookshelf_id" and op in ("=", "in"):
+            ids = set()
+            for shelf in value if op == "in" else [value]:
+                ids |= self.by_shelf.get(shelf, set())
+            return ids
+        if field == "author" and op in ("=", "in"):
+            ids = set()
+            for author in value if op == "in" else [value]:
+                ids |= self.by_author.get(str(author).lower(), set())
+            return ids
+        if field == "author" and op == "^=":
+            prefix = str(value).lower()
+            ids = set()
+            for author, author_ids in self.by_author.items():
+                if author.startswith(prefix):
+                    ids |= author_ids
+            return ids
+        if field == "title" and op == "^=":
+            prefix = str(value).lower()
+            return self._range(self._by_title, (prefix,), (prefix + _LAST_CHAR,))
+        if field == "date_added" and op in (">", ">=", "<", "<=", "="):
+            value = str(value)[:10]
+            if op == "=":
+                return self._range(self._by_date, (value,), (value + _LAST_CHAR,))
+            if op in (">", ">="):
+                low = (value + _LAST_CHAR,) if op == ">" else (value,)
+                return self._range(self._by_date, low, None)
+            # Books without a date sort first; the "0" bound skips them.
+            high = (value,) if op == "<" else (value + _LAST_CHAR,)
+            return self._range(self._by_date, ("0",), high)
+        if field == "id" and op in ("=", "in"):
+            return set(value) if op == "in" else {value}
+        return None
+
+    def query(self, where: str = "", sort: Optional[str] = None, limit: int = 50) -> dict:
+        """Run a query and return the matching records."""
+        clauses = parse_where(where) if where.strip() else []
+        candidate_sets = []
+        for clause in clauses:
+            ids = self._candidates(*clause)
+            if ids is not None:
+                candidate_sets.append(ids)
+
+        if candidate_sets:
+            candidate_sets.sort(key=len)
+            ids = set(candidate_sets[0])
+            for other in candidate_sets[1:]:
+                ids &= other
+            records = [self.records[i] for i in ids if i in self.records]
+        else:
+            records = list(self.records.values())
+        if any(field == "bookshelf_name" for field, _, _ in clauses):
+            records = [{**r, "bookshelf_name": self.shelf_names.get(r["bookshelf_id"], "")} for r in records]
+        matches = [r for r in records if all(_matches(r, *clause) for clause in clauses)]
+
+        if sort:
+            descending = sort.startswith("-") or sort.lower().endswith(" desc")
+            name = sort.lstrip("-+").split()[0].lower()
+            field = FIELDS.get(name)
+            if field is None:
+                raise QueryError(f"Unknown sort field {name!r}")
+            if field == "bookshelf_name":
+                key = lambda r: self.shelf_names.get(r["bookshelf_id"], "").lower()
+            else:
+                key = lambda r: _norm(r.get(field)) or ""
+            matches.sort(key=key, reverse=descending)
+
+        rows = [
+            {**r, "bookshelf_name": self.shelf_names.get(r["bookshelf_id"], "")}
+            for r in matches[: max(0, limit)]
+        ]
+        return {"count": len(matches), "returned": len(rows), "books": rows}
@@ -0,0 +1,293 @@
+"""Background jobs for library operations that outlast a single tool call.
+
+``start`` queues a job and returns its id at once; a small, fixed pool of
+worker tasks runs queued jobs in order. A job function receives its
+``Job`` and reports progress as ``(done, total, message)``; callers that
+``wait`` on a job see every change, which the server relays to the client
+as MCP progress notifications.
+
+Job state and results are kept in SQLite, so they can be read after a
+client reconnects or the server restarts. Jobs still queued or running
+when the server stops are marked ``interrupted`` and must be started again.
+"""
+
+import asyncio
+import contextvars
+import inspect
+import json
+import logging
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Awaitable, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+FINISHED = frozenset({"succeeded", "failed", "cancelled", "interrupted"})
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    arguments TEXT NOT NULL,
+    status TEXT NOT NULL,
+    done REAL NOT NULL DEFAULT 0,
+    total REAL,
+    message TEXT,
+    result TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_created ON jobs (created_at);
+"""
+
+
+class JobError(ValueError):
+    """Raised for unknown jobs, kinds or arguments, and when the queue is full."""
+
+
+def _iso(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat(timespec="seconds")
+
+
+class Job:
+    """A queued or running job; job functions call ``progress`` on it."""
+
+    def __init__(self, job_id: str, kind: str, arguments: dict) -> None:
+        self.id = job_id
+        self.kind = kind
+        self.arguments = arguments
+        self.status = "queued"
+        self.done = 0.0
+        self.total: Optional[float] = None
+        self.message: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.changed = asyncio.Event()
+        self.task: Optional[asyncio.Task] = None
+
+    def progress(self, done: float, total: Optional[float] = None, message: Optional[str] = None) -> None:
+        self.done = done
+        if total is not None:
+            self.total = total
+        if message is not None:
+            self.message = message
+        self.notify()
+
+    def notify(self) -> None:
+        # Waiters hold the previous event; a fresh one catches the next change.
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+
+class JobRunner:
+    """Runs registered job kinds on ``workers`` tasks and records them in SQLite.
+
+    At most ``max_queued`` jobs may wait for a worker, and the newest
+    ``keep`` finished jobs are kept.
+    """
+
+    def __init__(self, path: str, workers: int = 2, max_queued: int = 20, keep: int = 200) -> None:
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.keep = keep
+        self._kinds: dict = {}
+        self._live: dict = {}
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._tasks: list = []
+        self._db = sqlite3.connect(str(self.path), isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        interrupted = self._db.execute(
+            "UPDATE jobs SET status = 'interrupted', error = 'The server stopped before the job finished',"
+            " finished_at = ? WHERE status IN ('queued', 'running')",
+            (time.time(),),
+        ).rowcount
+        if interrupted:
+            logger.warning("Marked jobs left by the previous run as interrupted", extra={"jobs": interrupted})
+
+    def register(self, kind: str, run: Callable[..., Awaitable[dict]], description: str) -> None:
+        """Register ``run(job, **arguments) -> dict`` as job ``kind``."""
+        self._kinds[kind] = (run, description)
+
+    @property
+    def kinds(self) -> dict:
+        return {kind: description for kind, (_, description) in self._kinds.items()}
+
+    # Starting and running ----------------------------------------------
+
+    def start(self, kind: str, arguments: Optional[dict] = None) -> dict:
+        if kind not in self._kinds:
+            raise JobError(f"Unknown job kind {kind!r}; expected one of {', '.join(sorted(self._kinds))}")
+        arguments = arguments or {}
+        try:
+            inspect.signature(self._kinds[kind][0]).bind(None, **arguments)
+        except TypeError as e:
+            raise JobError(f"Invalid arguments for {kind} job: {e}") from None
+        if sum(1 for job in self._live.values() if job.status == "queued") >= self.max_queued:
+            raise JobError("Too many jobs are queued; wait for some to finish or cancel them")
+
+        job = Job(uuid.uuid4().hex[:12], kind, arguments)
+        self._db.execute(
+            "INSERT INTO jobs (id, kind, arguments, status, created_at) VALUES (?, ?, ?, ?, ?)",
+            (job.id, kind, json.dumps(arguments), job.status, job.created_at),
+        )
+        self._live[job.id] = job
+        self._queue.put_nowait(job)
+        self._ensure_workers()
+        logger.info("Job queued", extra={"job_id": job.id, "kind": kind})
+        return self.status(job.id)
+
+    def _ensure_workers(self) -> None:
+        self._tasks = [task for task in self._tasks if not task.done()]
+        while len(self._tasks) < self.workers:
+            # Workers outlive the tool call that starts them; run them in a
+            # fresh context so they don't inherit its deadline or log buffer.
+            self._tasks.append(contextvars.Context().run(asyncio.create_task, self._work()))
+
+    async def _work(self) -> None:
+        while True:
+            job = await self._queue.get()
+            if job.status == "queued":  # Otherwise cancelled while it waited.
+                await self._run(job)
+
+    async def _run(self, job: Job) -> None:
+        run, _ = self._kinds[job.kind]
+        job.status, job.started_at = "running", time.time()
+        self._db.execute(
+            "UPDATE jobs SET status = ?, started_at = ? WHERE id = ?", (job.status, job.started_at, job.id)
+        )
+        job.notify()
+        logger.info("Job started", extra={"job_id": job.id, "kind": job.kind})
+        job.task = asyncio.ensure_future(run(job, **job.arguments))
+        result = error = None
+        try:
+            await asyncio.wait({job.task})
+        except asyncio.CancelledError:
+            job.task.cancel()
+            self._finish(job, "interrupted", error="The server stopped before the job finished")
+            raise
+        if job.task.cancelled():
+            status = "cancelled"
+        elif job.task.exception() is not None:
+            status, e = "failed", job.task.exception()
+            error = f"{type(e).__name__}: {e}"
+            logger.error("Job failed", extra={"job_id": job.id, "kind": job.kind, "error": error})
+        else:
+            status, result = "succeeded", job.task.result()
+        self._finish(job, status, result, error)
+
+    def _finish(self, job: Job, status: str, result: Optional[dict] = None, error: Optional[str] = None) -> None:
+        job.status = status
+        self._db.execute(
+            "UPDATE jobs SET status = ?, done = ?, total = ?, message = ?, result = ?, error = ?, finished_at = ?"
+            " WHERE id = ?",
+            (status, job.done, job.total, job.message, None if result is None else json.dumps(result, default=str),
+             error, time.time(), job.id),
+        )
+        self._db.execute(
+            "DELETE FROM jobs WHERE status IN ('succeeded', 'failed', 'cancelled', 'interrupted') AND id NOT IN"
+            " (SELECT id FROM jobs ORDER BY created_at DESC LIMIT ?)",
+            (self.keep,),
+        )
+        self._live.pop(job.id, None)
+        job.notify()
+        logger.info("Job finished", extra={"job_id": job.id, "kind": job.kind, "status": status})
+
+    # Control and inspection --------------------------------------------
+
+    async def cancel(self, job_id: str, timeout: float = 5.0) -> dict:
+        """Cancel a queued or running job and wait up to ``timeout`` seconds for it to stop."""
+        job = self._live.get(job_id)
+        if job is None:
+            return self.status(job_id)
+        if job.status == "queued":
+            self._finish(job, "cancelled")
+        elif job.task is not None:
+            job.task.cancel()
+            await self.wait(job_id, timeout)
+        return self.status(job_id)
+
+    async def wait(
+        self,
+        job_id: str,
+        timeout: float,
+        on_change: Optional[Callable[[Job], Awaitable[None]]] = None,
+    ) -> dict:
+        """Wait up to ``timeout`` seconds for a job to finish, calling ``on_change`` on each update."""
+        deadline = time.monotonic() + timeout
+        job = self._live.get(job_id)
+        while job is not None and job.status not in FINISHED:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            try:
+                await asyncio.wait_for(job.changed.wait(), left)
+            except asyncio.TimeoutError:
+                break
+            if on_change is not None:
+                await on_change(job)
+        return self.status(job_id)
+
+    def status(self, job_id: str) -> dict:
+        row = self._db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            raise JobError(f"Unknown job {job_id!r}")
+        return self._describe(row)
+
+    def _describe(self, row: sqlite3.Row) -> dict:
+        job = self._live.get(row["id"])
+        status, done, total, message = (
+            (job.status, job.done, job.total, job.message)
+            if job is not None
+            else (row["status"], row["done"], row["total"], row["message"])
+        )
+        result = {
+            "job_id": row["id"],
+            "kind": row["kind"],
+            "arguments": json.loads(row["arguments"]),
+            "status": status,
+            "progress": {"done": done, "total": total, "message": message},
+            "created_at": _iso(row["created_at"]),
+            "started_at": _iso(job.started_at if job is not None else row["started_at"]),
+            "finished_at": _iso(row["finished_at"]),
+        }
+        if row["error"]:
+            result["error"] = row["error"]
+        return result
+
+    def result(self, job_id: str) -> dict:
+        described = self.status(job_id)
+        if described["status"] not in FINISHED:
+            raise JobError(f"Job {job_id} is still {described['status']}; check job_status")
+        (stored,) = self._db.execute("SELECT result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        described["result"] = None if stored is None else json.loads(stored)
+        return described
+
+    def recent(self, limit: int = 20) -> list:
+        rows = self._db.execute("SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)).fetchall()
+        return [self._describe(row) for row in rows]
+
+    def stats(self) -> dict:
+        counts = {status: 0 for status in ("queued", "running")}
+        for job in self._live.values():
+            counts[job.status] += 1
+        return {**counts, "workers": self.workers}
+
+    async def close(self) -> None:
+        """Stop the workers, marking jobs that did not finish as interrupted."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for job in list(self._live.values()):
+            self._finish(job, "interrupted", error="The server stopped before the job finished")
+        self._db.close()
@@ -0,0 +1,266 @@
+"""Durable write-behind journal for Micro.blog mutations."""
+
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+from . import deadlines
+
+logger = logging.getLogger(__name__)
+
+# Mutations that may be journaled, mapped to the resource key they touch.
+# Entries sharing a key are applied in order; a new entry only coalesces
+# with the most recent pending entry for its key, and only if that entry
+# is of the same kind, so "consecutive" is defined per resource.
+MUTATION_KEYS = {
+    "add_bookshelf": None,
+    "rename_bookshelf": lambda p: f"bookshelf:{p['bookshelf_id']}",
+    "add_book": None,
+    "move_book": lambda p: f"book:{p['book_id']}",
+    "remove_book": lambda p: f"book:{p['book_id']}",
+    "change_book_cover": lambda p: f"book:{p['book_id']}",
+    "update_reading_goal": lambda p: f"goal:{p['goal_id']}",
+}
+COALESCING_KINDS = {"move_book", "rename_bookshelf", "update_reading_goal"}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS mutations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    key TEXT,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    coalesced INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS mutations_status ON mutations (status, id);
+CREATE INDEX IF NOT EXISTS mutations_key ON mutations (key, status);
+"""
+
+
+class MutationJournal:
+    """Append-only SQLite journal of pending mutations."""
+
+    def __init__(self, path: str, keep_done: int = 1000) -> None:
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.keep_done = keep_done
+        self._db = sqlite3.connect(str(self.path), isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        # Entries that were being flushed when the process died are retried.
+        self._db.execute("UPDATE mutations SET status = 'pending' WHERE status = 'flushing'")
+
+    def append(self, kind: str, payload: dict) -> int:
+        """Durably record a mutation, coalescing it with a pending one if possible."""
+        if kind not in MUTATION_KEYS:
+            raise ValueError(f"Unsupported mutation '{kind}'")
+        key_fn = MUTATION_KEYS[kind]
+        key = key_fn(payload) if key_fn else None
+        now = time.time()
+        encoded = json.dumps(payload)
+
+        with self._db:
+            if key is not None and kind in COALESCING_KINDS:
+                last = self._db.execute(
+                    "SELECT id, kind, payload FROM mutations WHERE key = ? AND status = 'pending'"
+                    " ORDER BY id DESC LIMIT 1",
+                    (key,),
+                ).fetchone()
+                if last is not None and last["kind"] == kind:
+                    # Optional fields left out of the newer call keep their pending values.
+                    merged = {**json.loads(last["payload"]), **{k: v for k, v in payload.items() if v is not None}}
+                    self._db.execute(
+                        "UPDATE mutations SET payload = ?, coalesced = coalesced + 1, updated_at = ? WHERE id = ?",
+                        (json.dumps(merged), now, last["id"]),
+                    )
+                    return last["id"]
+            cursor = self._db.execute(
+                "INSERT INTO mutations (kind, key, payload, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (kind, key, encoded, now, now),
+            )
+            return cursor.lastrowid
+
+    def next_pending(self) -> Optional[sqlite3.Row]:
+        """Claim the oldest pending mutation for flushing."""
+        with self._db:
+            row = self._db.execute(
+                "SELECT * FROM mutations WHERE status = 'pending' ORDER BY id LIMIT 1"
+            ).fetchone()
+            if row is not None:
+                self._db.execute(
+                    "UPDATE mutations SET status = 'flushing', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (time.time(), row["id"]),
+                )
+            return row
+
+    def mark(self, mutation_id: int, status: str, error: Optional[str] = None) -> None:
+        """Record the outcome of a flush attempt."""
+        self._db.execute(
+            "UPDATE mutations SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+            (status, error, time.time(), mutation_id),
+        )
+        if status == "done":
+            self._db.execute(
+                "DELETE FROM mutations WHERE status = 'done' AND id <= ("
+                "SELECT id FROM mutations WHERE status = 'done' ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (self.keep_done,),
+            )
+
+    def pending_count(self) -> int:
+        return self._db.execute(
+            "SELECT COUNT(*) FROM mutations WHERE status IN ('pending', 'flushing')"
+        ).fetchone()[0]
+
+    def status(self, failed_limit: int = 20) -> dict:
+        """Summarize the journal for the status tool."""
+        counts = {
+            row["status"]: row["n"]
+            for row in self._db.execute("SELECT status, COUNT(*) AS n FROM mutations GROUP BY status")
+        }
+        oldest = self._db.execute(
+            "SELECT MIN(created_at) FROM mutations WHERE status IN ('pending', 'flushing')"
+        ).fetchone()[0]
+        failed = [
+            {
+                "id": row["id"],
+                "kind": row["kind"],
+                "payload": json.loads(row["payload"]),
+                "attempts": row["attempts"],
+                "error": row["error"],
+            }
+            for row in self._db.execute(
+                "SELECT * FROM mutations WHERE status = 'failed' ORDER BY id DESC LIMIT ?", (failed_limit,)
+            )
+        ]
+        coalesced = self._db.execute("SELECT COALESCE(SUM(coalesced), 0) FROM mutations").fetchone()[0]
+        return {
+            "counts": counts,
+            "coalesced": coalesced,
+            "oldest_pending_age_seconds": round(time.time() - oldest, 3) if oldest else None,
+            "failed": failed,
+        }
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, httpx.TransportError):
+        return True
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return False
+
+
+class WriteBehindQueue:
+    """Acknowledges mutations once journaled and flushes them in the background."""
+
+    def __init__(
+        self,
+        client,
+        journal: MutationJournal,
+        max_attempts: int = 5,
+        retry_delay: float = 1.0,
+    ) -> None:
+        self.client = client
+        self.journal = journal
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.last_error: Optional[str] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._idle: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _ensure_worker(self) -> None:
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._idle = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def enqueue(self, kind: str, payload: dict) -> dict:
+        """Journal a mutation and return an acknowledgement immediately."""
+        mutation_id = self.journal.append(kind, payload)
+        self._ensure_worker()
+        self._idle.clear()
+        self._wakeup.set()
+        return {
+            "success": True,
+            "queued": True,
+            "mutation_id": mutation_id,
+            "message": f"{kind} queued for write-behind",
+        }
+
+    def resume(self) -> None:
+        """Start flushing mutations left pending by a previous run."""
+        if self.journal.pending_count():
+            self._ensure_worker()
+            self._idle.clear()
+            self._wakeup.set()
+
+    async def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until the journal has no pending mutations. Returns False on timeout."""
+        if self.journal.pending_count() == 0:
+            return True
+        self._ensure_worker()
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def status(self) -> dict:
+        result = self.journal.status()
+        result["worker_running"] = self._task is not None and not self._task.done()
+        result["last_error"] = self.last_error
+        return result
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self.journal.close()
+
+    async def _run(self) -> None:
+        deadlines.clear()
+        while True:
+            row = self.journal.next_pending()
+            if row is None:
+                self._idle.set()
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            await self._apply(row)
+
+    async def _apply(self, row) -> None:
+        payload = json.loads(row["payload"])
+        attempt = row["attempts"] + 1
+        try:
+            await getattr(self.client, row["kind"])(**payload)
+        except Exception as e:
+            self.last_error = f"{row['kind']} #{row['id']}: {e}"
+            if _is_retryable(e) and attempt < self.max_attempts:
+                logger.warning("Write-behind %s failed, retrying: %s", row["kind"], e)
+                self.journal.mark(row["id"], "pending", str(e))
+                await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+            else:
+                logger.error("Write-behind %s #%d failed permanently: %s", row["kind"], row["id"], e)
+                self.journal.mark(row["id"], "failed", str(e))
+        else:
+            self.journal.mark(row["id"], "done")
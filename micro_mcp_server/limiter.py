@@ -0,0 +1,168 @@
+"""Adaptive (AIMD) concurrency limit for upstream Micro.blog requests."""
+
+import asyncio
+import time
+from collections import deque
+from typing import Optional
+
+from .metrics import register_gauge
+
+OK = "ok"
+THROTTLED = "throttled"
+ERROR = "error"
+DROPPED = "dropped"
+
+
+def classify(status_code: int) -> str:
+    """Map an upstream status code to a limiter outcome."""
+    if status_code in (429, 503):
+        return THROTTLED
+    if status_code >= 500:
+        return ERROR
+    return OK
+
+
+class AdaptiveLimiter:
+    """Caps in-flight upstream requests with an additive-increase, multiplicative-decrease limit.
+
+    Each healthy response while the limit is fully used grows it by
+    ``1 / limit``, about one slot per round of requests. A 429/503, a 5xx,
+    a transport error or a smoothed latency above ``latency_tolerance``
+    times the no-load baseline multiplies it by ``backoff``. Only responses
+    to requests started after the previous cut can cut again, so one burst
+    of errors costs a single decrease.
+
+    The baseline is the lowest latency seen, allowed to drift upwards by
+    ``baseline_drift`` per sample so it follows lasting changes upstream.
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 4,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        backoff: float = 0.5,
+        latency_tolerance: float = 2.0,
+        smoothing: float = 0.2,
+        baseline_drift: float = 0.001,
+        min_samples: int = 10,
+    ) -> None:
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+        self.baseline_drift = baseline_drift
+        self.min_samples = min_samples
+
+        self.inflight = 0
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.decreases = 0
+        self.peak_limit = self.limit
+        self._baseline: Optional[float] = None
+        self._latency: Optional[float] = None
+        self._samples = 0
+        self._last_decrease = float("-inf")
+        self._waiters: deque = deque()
+
+    async def acquire(self) -> float:
+        """Wait for a slot. Returns the start time to pass to ``release``."""
+        if not self._waiters and self.inflight < int(self.limit):
+            self.inflight += 1
+            return time.monotonic()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Granted a slot just as we were cancelled; hand it on.
+                self.inflight -= 1
+                self._wake()
+            else:
+                self._waiters.remove(waiter)
+            raise
+        return time.monotonic()
+
+    def release(self, started: float, outcome: str) -> None:
+        """Return a slot and adjust the limit from the request's outcome."""
+        was_full = self.inflight >= int(self.limit)
+        self.inflight -= 1
+        self.requests += 1
+        if outcome == OK:
+            self._observe(time.monotonic() - started)
+            if self._inflated():
+                self._decrease(started)
+            elif was_full:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                self.peak_limit = max(self.peak_limit, self.limit)
+        elif outcome == THROTTLED:
+            self.throttled += 1
+            self._decrease(started)
+        elif outcome == ERROR:
+            self.errors += 1
+            self._decrease(started)
+        self._wake()
+
+    def _observe(self, latency: float) -> None:
+        self._samples += 1
+        if self._baseline is None:
+            self._baseline = latency
+        else:
+            self._baseline = min(latency, self._baseline * (1 + self.baseline_drift))
+        if self._latency is None:
+            self._latency = latency
+        else:
+            self._latency += self.smoothing * (latency - self._latency)
+
+    def _inflated(self) -> bool:
+        if self._samples < self.min_samples or not self._baseline:
+            return False
+        return self._latency > self._baseline * self.latency_tolerance
+
+    def _decrease(self, started: float) -> None:
+        if started < self._last_decrease:
+            return
+        self.limit = max(float(self.min_limit), self.limit * self.backoff)
+        self._last_decrease = time.monotonic()
+        self._latency = None
+        self.decreases += 1
+
+    def _wake(self) -> None:
+        while self._waiters and self.inflight < int(self.limit):
+            waiter = self._waiters.popleft()
+            if waiter.done():
+                continue
+            self.inflight += 1
+            waiter.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "limit": int(self.limit),
+            "peak_limit": int(self.peak_limit),
+            "inflight": self.inflight,
+            "queued": len(self._waiters),
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "errors": self.errors,
+            "decreases": self.decreases,
+            "baseline_latency_ms": round(self._baseline * 1000, 1) if self._baseline else None,
+            "smoothed_latency_ms": round(self._latency * 1000, 1) if self._latency else None,
+        }
+
+
+_shared: Optional[AdaptiveLimiter] = None
+
+
+def shared_limiter() -> AdaptiveLimiter:
+    """The limiter shared by every client in this process."""
+    global _shared
+    if _shared is None:
+        _shared = AdaptiveLimiter()
+        register_gauge("upstream_concurrency_limit", lambda: int(_shared.limit))
+        register_gauge("upstream_inflight", lambda: _shared.inflight)
+        register_gauge("upstream_queued", lambda: len(_shared._waiters))
+    return _shared
@@ -0,0 +1,129 @@
+"""Keyed async locks that serialize conflicting mutations.
+
+Mutations lock the books and bookshelves they touch. A book is always
+locked exclusively, so two moves of the same book, or a cover change
+racing a removal, run one after the other. Bookshelves are locked shared
+by book mutations and exclusively by shelf mutations (renames), so moves
+into the same shelf still run in parallel while a rename waits for them.
+
+Keys are ``("book", id)`` and ``("shelf", id)`` tuples. ``hold`` always
+acquires its keys in sorted order, and callers that lock in two steps
+(a book first, then the shelves found while holding it) stay in that
+same global order because ``"book"`` sorts before ``"shelf"``. Since a
+holder only ever waits for keys above those it holds, no two can wait on
+each other.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Hashable, Iterable
+
+
+def book_key(book_id: int) -> tuple:
+    return ("book", book_id)
+
+
+def shelf_key(bookshelf_id: int) -> tuple:
+    return ("shelf", bookshelf_id)
+
+
+class _KeyState:
+    __slots__ = ("readers", "writer", "writers_waiting", "users", "waiters")
+
+    def __init__(self) -> None:
+        self.readers = 0
+        self.writer = False
+        self.writers_waiting = 0
+        self.users = 0
+        self.waiters: list = []
+
+    def free_for(self, shared: bool) -> bool:
+        if shared:
+            # Waiting writers go first, so a stream of readers cannot starve them.
+            return not self.writer and not self.writers_waiting
+        return not self.writer and not self.readers
+
+    def wake(self) -> None:
+        waiters, self.waiters = self.waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+
+class KeyedLocks:
+    """Shared/exclusive locks per key, created on first use and dropped when idle."""
+
+    def __init__(self) -> None:
+        self._keys: dict = {}
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_seconds = 0.0
+
+    @asynccontextmanager
+    async def hold(self, *keys: Hashable, shared: Iterable[Hashable] = ()):
+        """Hold ``keys`` exclusively and ``shared`` keys shared, in key order.
+
+        A key given both ways is held exclusively.
+        """
+        modes = {key: True for key in shared}
+        modes.update((key, False) for key in keys)
+        ordered = sorted(modes)
+        for key in ordered:
+            state = self._keys.get(key)
+            if state is None:
+                state = self._keys[key] = _KeyState()
+            state.users += 1
+        acquired = []
+        try:
+            for key in ordered:
+                await self._acquire(self._keys[key], modes[key])
+                acquired.append(key)
+            yield
+        finally:
+            for key in reversed(acquired):
+                self._release(self._keys[key], modes[key])
+            for key in ordered:
+                state = self._keys[key]
+                state.users -= 1
+                if not state.users:
+                    del self._keys[key]
+
+    async def _acquire(self, state: _KeyState, shared: bool) -> None:
+        self.acquisitions += 1
+        if not state.free_for(shared):
+            self.contended += 1
+            started = time.monotonic()
+            if not shared:
+                state.writers_waiting += 1
+            try:
+                while not state.free_for(shared):
+                    waiter = asyncio.get_running_loop().create_future()
+                    state.waiters.append(waiter)
+                    await waiter
+            finally:
+                if not shared:
+                    state.writers_waiting -= 1
+                    state.wake()  # Readers held back by this writer may go now.
+            self.wait_seconds += time.monotonic() - started
+        if shared:
+            state.readers += 1
+        else:
+            state.writer = True
+
+    @staticmethod
+    def _release(state: _KeyState, shared: bool) -> None:
+        if shared:
+            state.readers -= 1
+        else:
+            state.writer = False
+        state.wake()
+
+    def stats(self) -> dict:
+        return {
+            "active_keys": len(self._keys),
+            "held": sum(1 for s in self._keys.values() if s.writer or s.readers),
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
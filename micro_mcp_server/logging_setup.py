@@ -0,0 +1,204 @@
+"""Structured, non-blocking logging shared by the stdio, DXT and Modal servers.
+
+Log calls on the event loop only format the record and put it on a queue;
+a background thread does the (possibly slow) write to stderr. Each tool call
+gets a correlation id that is attached to every record logged while it runs,
+including the upstream request log lines, so a call can be followed through
+to the Micro.blog requests it made.
+
+Success logs can be sampled per tool. Records below WARNING from unsampled
+calls are held in a small per-call buffer and written only if the call fails,
+so errors are always logged with their full context.
+"""
+
+import asyncio
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Optional
+
+from fastmcp.server.middleware import Middleware
+
+logger = logging.getLogger("micro_books.calls")
+upstream_logger = logging.getLogger("micro_books.upstream")
+
+_call: ContextVar[Optional[dict]] = ContextVar("micro_books_call", default=None)
+_queue_handler: Optional[logging.handlers.QueueHandler] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+# Attributes every LogRecord has; anything else was passed through ``extra``.
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+_BUFFER_LIMIT = 200
+
+
+def parse_sample_rates(spec: str) -> dict:
+    """Parse ``name=rate,name=rate`` into a dict."""
+    rates = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, rate = part.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including ``extra`` fields and correlation ids."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _CorrelationFilter(logging.Filter):
+    """Stamps records with the current tool call and holds back unsampled ones."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        call = _call.get()
+        if call is None:
+            return True
+        record.call_id = call["id"]
+        record.tool = call["tool"]
+        if call["sampled"] or record.levelno >= logging.WARNING:
+            return True
+        if len(call["buffer"]) < _BUFFER_LIMIT:
+            call["buffer"].append(record)
+        return False
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None) -> None:
+    """Route all logging through a queue to stderr. Safe to call more than once.
+
+    ``level`` defaults to ``MICRO_BOOKS_LOG_LEVEL`` (INFO) and ``fmt`` ("json"
+    or "text") to ``MICRO_BOOKS_LOG_FORMAT`` (json).
+    """
+    global _queue_handler, _listener
+    if _listener is not None:
+        return
+    level = (level or os.environ.get("MICRO_BOOKS_LOG_LEVEL") or "INFO").upper()
+    fmt = (fmt or os.environ.get("MICRO_BOOKS_LOG_FORMAT") or "json").lower()
+
+    # QueueHandler formats on the calling thread (while the record's args are
+    # still current) and hands the writer thread a plain string.
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    _queue_handler = logging.handlers.QueueHandler(records)
+    if fmt == "json":
+        _queue_handler.setFormatter(JsonFormatter())
+    else:
+        text = "%(asctime)s %(levelname)s %(name)s [%(call_id)s] %(message)s"
+        _queue_handler.setFormatter(logging.Formatter(text, defaults={"call_id": "-"}))
+    _queue_handler.addFilter(_CorrelationFilter())
+
+    writer = logging.StreamHandler(sys.stderr)
+    writer.setFormatter(logging.Formatter("%(message)s"))
+    _listener = logging.handlers.QueueListener(records, writer)
+    _listener.start()
+    atexit.register(_listener.stop)
+
+    root = logging.getLogger()
+    root.handlers[:] = [_queue_handler]
+    root.setLevel(level)
+    # Upstream requests are logged by upstream_event_hooks with timings.
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def flush_logging() -> None:
+    """Write out queued records now, before a process exit that skips atexit hooks."""
+    if _listener is not None:
+        _listener.stop()
+        _listener.start()
+
+
+def _flush_buffer(call: dict) -> None:
+    call["sampled"] = True
+    for record in call["buffer"]:
+        if _queue_handler is not None:
+            _queue_handler.handle(record)
+    call["buffer"].clear()
+
+
+class ToolLoggingMiddleware(Middleware):
+    """Assigns correlation ids to tool calls and logs their outcome and duration.
+
+    ``sample_rate`` (default ``MICRO_BOOKS_LOG_SAMPLE_RATE``, 1.0) is the
+    fraction of successful calls whose logs are written; ``sample_rates``
+    (default ``MICRO_BOOKS_LOG_SAMPLE_RATES``, ``tool=rate,...``) overrides it
+    per tool. Failed calls are always logged in full.
+    """
+
+    def __init__(self, sample_rate: Optional[float] = None, sample_rates: Optional[dict] = None) -> None:
+        if sample_rate is None:
+            sample_rate = float(os.environ.get("MICRO_BOOKS_LOG_SAMPLE_RATE", "1.0"))
+        if sample_rates is None:
+            sample_rates = parse_sample_rates(os.environ.get("MICRO_BOOKS_LOG_SAMPLE_RATES", ""))
+        self.sample_rate = sample_rate
+        self.sample_rates = sample_rates
+
+    async def on_call_tool(self, context, call_next):
+        name = context.message.name
+        rate = self.sample_rates.get(name, self.sample_rate)
+        call = {"id": uuid.uuid4().hex[:16], "tool": name, "sampled": random.random() < rate, "buffer": []}
+        token = _call.set(call)
+        started = time.monotonic()
+        try:
+            result = await call_next(context)
+        except asyncio.CancelledError:
+            logger.warning("Tool call cancelled", extra={"duration_ms": _elapsed_ms(started)})
+            raise
+        except Exception as e:
+            _flush_buffer(call)
+            logger.error(
+                "Tool call failed",
+                extra={"duration_ms": _elapsed_ms(started), "error": f"{type(e).__name__}: {e}"},
+            )
+            raise
+        else:
+            logger.info("Tool call finished", extra={"duration_ms": _elapsed_ms(started)})
+            return result
+        finally:
+            _call.reset(token)
+
+
+def _elapsed_ms(started: float) -> float:
+    return round((time.monotonic() - started) * 1000, 1)
+
+
+async def _stamp_request(request) -> None:
+    request.extensions["log_started"] = time.monotonic()
+
+
+async def _log_response(response) -> None:
+    request = response.request
+    started = request.extensions.get("log_started")
+    upstream_logger.info(
+        "%s %s -> %s",
+        request.method,
+        request.url.path,
+        response.status_code,
+        extra={
+            "status": response.status_code,
+            "headers_ms": _elapsed_ms(started) if started is not None else None,
+        },
+    )
+
+
+def upstream_event_hooks() -> dict:
+    """httpx ``event_hooks`` that log each upstream request under the current call id."""
+    return {"request": [_stamp_request], "response": [_log_response]}
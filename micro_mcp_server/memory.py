@@ -0,0 +1,284 @@
+"""One memory budget shared by every in-process cache.
+
+Caches charge the estimated size of what they hold to the process-wide
+``MemoryAccountant``. Evictable entries (cached shelves, the similarity
+matrix, the statistics columns, duplicate-detection signatures) compete
+under Greedy-Dual-Size-Frequency: an entry's priority is
+``L + frequency * cost / size``, where ``cost`` is roughly the seconds it
+takes to rebuild or refetch it and ``L`` rises to the priority of each
+evicted entry, so large, rarely used, cheap-to-rebuild entries go first and
+entries that stop being used age out. Structures the server cannot work
+without (the library index, the change feed, request traces) are tracked
+by size only and count against the budget without being evicted.
+"""
+
+import heapq
+import itertools
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from .metrics import register_gauge, unregister_gauge
+
+logger = logging.getLogger(__name__)
+
+# Python objects take several times the size of their JSON encoding.
+_OBJECT_OVERHEAD = 4
+_PRESSURE_CHECK_INTERVAL = 5.0
+_CGROUP_FILES = [
+    ("/sys/fs/cgroup/memory.current", "/sys/fs/cgroup/memory.max"),
+    ("/sys/fs/cgroup/memory/memory.usage_in_bytes", "/sys/fs/cgroup/memory/memory.limit_in_bytes"),
+]
+
+
+def estimate_size(payload) -> int:
+    """Approximate in-memory bytes of a JSON-like payload."""
+    return len(json.dumps(payload, separators=(",", ":"), default=str)) * _OBJECT_OVERHEAD
+
+
+def cgroup_pressure() -> Optional[float]:
+    """Container memory use as a fraction of its limit, or None outside a limited cgroup."""
+    for current_path, limit_path in _CGROUP_FILES:
+        try:
+            current = int(Path(current_path).read_text().strip())
+            limit = Path(limit_path).read_text().strip()
+        except (OSError, ValueError):
+            continue
+        if limit == "max" or int(limit) >= 1 << 60:
+            return None
+        return current / int(limit)
+    return None
+
+
+class MemoryPool:
+    """A cache's handle on the accountant: charge, touch and release its entries."""
+
+    def __init__(self, accountant: "MemoryAccountant", name: str, evict: Callable[[object], None]) -> None:
+        self.accountant = accountant
+        self.name = name
+        self.evict = evict
+        self.bytes = 0
+        self.evictions = 0
+        self.entries: dict = {}
+
+    def charge(self, key, size: int, cost: Optional[float] = 1.0) -> None:
+        """Record ``key`` at ``size`` bytes, counting as a use. ``cost=None`` pins it."""
+        self.accountant._charge(self, key, max(1, int(size)), cost)
+
+    def touch(self, key) -> None:
+        self.accountant._touch(self, key)
+
+    def release(self, key) -> None:
+        """Forget ``key`` after the cache dropped it itself."""
+        self.accountant._release(self, key)
+
+    def clear(self) -> None:
+        for key in list(self.entries):
+            self.release(key)
+
+
+class MemoryAccountant:
+    """Tracks every cache's estimated size against ``budget`` bytes.
+
+    Whenever a charge takes the total over budget, evictable entries are
+    removed in GDSF priority order until it fits. Every few seconds a
+    charge also checks the container's cgroup memory use; above
+    ``pressure_threshold`` of its limit the caches are trimmed to half the
+    budget. ``trim`` does the same on demand.
+    """
+
+    def __init__(self, budget: int, pressure_threshold: float = 0.9) -> None:
+        self.budget = budget
+        self.pressure_threshold = pressure_threshold
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self.pressure_trims = 0
+        self.pools: dict = {}
+        self._tracked: dict = {}
+        self._inflation = 0.0
+        self._heap: list = []
+        self._counter = itertools.count()
+        self._last_pressure_check = 0.0
+        self._over_budget_warned = False
+
+    def pool(self, name: str, evict: Callable[[object], None]) -> MemoryPool:
+        """Register a cache whose entries can be evicted by calling ``evict(key)``."""
+        unique, n = name, 2
+        while unique in self.pools:
+            unique, n = f"{name}#{n}", n + 1
+        pool = self.pools[unique] = MemoryPool(self, unique, evict)
+        register_gauge(f"memory_bytes.{unique}", lambda: pool.bytes)
+        return pool
+
+    def track(self, name: str, size: Callable[[], int]) -> None:
+        """Count a structure that is never evicted, sized on demand by ``size()``."""
+        unique, n = name, 2
+        while unique in self._tracked or unique in self.pools:
+            unique, n = f"{name}#{n}", n + 1
+        self._tracked[unique] = size
+        register_gauge(f"memory_bytes.{unique}", size)
+
+    def names(self) -> set:
+        """Names of every registered pool and tracked structure."""
+        return set(self.pools) | set(self._tracked)
+
+    def remove(self, name: str) -> None:
+        """Deregister a pool or tracked structure, e.g. when its server shuts down.
+
+        A pool's entries are forgotten without calling its ``evict``.
+        """
+        pool = self.pools.pop(name, None)
+        if pool is not None:
+            pool.entries.clear()
+            pool.bytes = 0
+            self._heap = [item for item in self._heap if item[2] != name]
+            heapq.heapify(self._heap)
+        self._tracked.pop(name, None)
+        unregister_gauge(f"memory_bytes.{name}")
+
+    def _tracked_bytes(self) -> int:
+        total = 0
+        for name, size in self._tracked.items():
+            try:
+                total += int(size())
+            except Exception:
+                logger.debug("Failed to size %s", name, exc_info=True)
+        return total
+
+    @property
+    def total(self) -> int:
+        return sum(p.bytes for p in self.pools.values()) + self._tracked_bytes()
+
+    def _push(self, pool: MemoryPool, key, entry: dict) -> None:
+        if entry["cost"] is None:
+            return
+        entry["priority"] = self._inflation + entry["hits"] * entry["cost"] / entry["size"]
+        entry["version"] += 1
+        heapq.heappush(self._heap, (entry["priority"], next(self._counter), pool.name, key, entry["version"]))
+        if len(self._heap) > 4 * sum(len(p.entries) for p in self.pools.values()) + 1024:
+            # Drop heap items superseded by later touches.
+            self._heap = [
+                item for item in self._heap
+                if (e := self.pools[item[2]].entries.get(item[3])) is not None and e["version"] == item[4]
+            ]
+            heapq.heapify(self._heap)
+
+    def _charge(self, pool: MemoryPool, key, size: int, cost: Optional[float]) -> None:
+        entry = pool.entries.get(key)
+        if entry is None:
+            entry = pool.entries[key] = {"size": size, "cost": cost, "hits": 0, "version": 0}
+        else:
+            pool.bytes -= entry["size"]
+            entry.update(size=size, cost=cost)
+        pool.bytes += size
+        entry["hits"] += 1
+        self._push(pool, key, entry)
+        # The entry being charged is in use by its caller, so it is not a candidate.
+        self._enforce(keep=(pool.name, key))
+
+    def _touch(self, pool: MemoryPool, key) -> None:
+        entry = pool.entries.get(key)
+        if entry is not None:
+            entry["hits"] += 1
+            self._push(pool, key, entry)
+
+    def _release(self, pool: MemoryPool, key) -> None:
+        entry = pool.entries.pop(key, None)
+        if entry is not None:
+            pool.bytes -= entry["size"]
+
+    def _evict_until(self, target: int, keep: Optional[tuple] = None) -> int:
+        """Evict lowest-priority entries until the total is at most ``target``. Returns bytes freed."""
+        freed = 0
+        total = self.total
+        kept = []
+        while total > target and self._heap:
+            item = heapq.heappop(self._heap)
+            priority, _, pool_name, key, version = item
+            pool = self.pools.get(pool_name)
+            entry = pool.entries.get(key) if pool is not None else None
+            if entry is None or entry["version"] != version or entry["cost"] is None:
+                continue  # Superseded by a later touch, released, or pinned since.
+            if (pool_name, key) == keep:
+                kept.append(item)
+                continue
+            self._inflation = priority
+            self._release(pool, key)
+            try:
+                pool.evict(key)
+            except Exception:
+                logger.exception("Failed to evict %s from %s", key, pool_name)
+            pool.evictions += 1
+            self.evictions += 1
+            self.evicted_bytes += entry["size"]
+            freed += entry["size"]
+            total -= entry["size"]
+        for item in kept:
+            heapq.heappush(self._heap, item)
+        return freed
+
+    def _enforce(self, keep: Optional[tuple] = None) -> None:
+        now = time.monotonic()
+        if now - self._last_pressure_check >= _PRESSURE_CHECK_INTERVAL:
+            self._last_pressure_check = now
+            pressure = cgroup_pressure()
+            if pressure is not None and pressure >= self.pressure_threshold:
+                self.pressure_trims += 1
+                freed = self._evict_until(self.budget // 2, keep)
+                logger.warning(
+                    "Trimmed caches under memory pressure",
+                    extra={"cgroup_usage": round(pressure, 3), "freed_bytes": freed},
+                )
+                return
+        if self.total > self.budget:
+            self._evict_until(self.budget, keep)
+            if self.total > self.budget and not self._over_budget_warned:
+                self._over_budget_warned = True
+                logger.warning("Memory budget exceeded by structures that cannot be evicted")
+
+    def trim(self, target: Optional[int] = None) -> dict:
+        """Evict down to ``target`` bytes (default: half the budget), e.g. on memory pressure."""
+        before = self.total
+        freed = self._evict_until(self.budget // 2 if target is None else max(0, target))
+        return {"before_bytes": before, "freed_bytes": freed, "after_bytes": self.total}
+
+    def stats(self) -> dict:
+        tracked = {}
+        for name, size in self._tracked.items():
+            try:
+                tracked[name] = int(size())
+            except Exception:
+                tracked[name] = None
+        return {
+            "budget_bytes": self.budget,
+            "total_bytes": self.total,
+            "evictions": self.evictions,
+            "evicted_bytes": self.evicted_bytes,
+            "pressure_trims": self.pressure_trims,
+            "caches": {
+                name: {"bytes": p.bytes, "entries": len(p.entries), "evictions": p.evictions}
+                for name, p in self.pools.items()
+            },
+            "tracked": tracked,
+        }
+
+
+_shared: Optional[MemoryAccountant] = None
+
+
+def shared_accountant() -> MemoryAccountant:
+    """The accountant shared by every server in this process.
+
+    The budget defaults to ``MICRO_BOOKS_MEMORY_BUDGET_MB`` (512).
+    """
+    global _shared
+    if _shared is None:
+        budget_mb = float(os.environ.get("MICRO_BOOKS_MEMORY_BUDGET_MB", "512"))
+        _shared = MemoryAccountant(int(budget_mb * 1024 * 1024))
+        register_gauge("memory_budget_bytes", lambda: _shared.budget)
+        register_gauge("memory_total_bytes", lambda: _shared.total)
+        register_gauge("memory_evictions", lambda: _shared.evictions)
+    return _shared
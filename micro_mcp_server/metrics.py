@@ -0,0 +1,29 @@
+"""Process-wide gauges reported by the get_metrics tool."""
+
+import logging
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+_gauges: dict = {}
+
+
+def register_gauge(name: str, read: Callable[[], float]) -> None:
+    """Register ``read`` as the current value of gauge ``name``, replacing any previous one."""
+    _gauges[name] = read
+
+
+def unregister_gauge(name: str) -> None:
+    _gauges.pop(name, None)
+
+
+def snapshot() -> dict:
+    """Current value of every registered gauge."""
+    values = {}
+    for name, read in sorted(_gauges.items()):
+        try:
+            values[name] = read()
+        except Exception:
+            logger.debug("Failed to read gauge %s", name, exc_info=True)
+            values[name] = None
+    return values
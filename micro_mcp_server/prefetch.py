@@ -0,0 +1,196 @@
+"""Adaptive speculative prefetch of bookshelf contents."""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from . import deadlines
+from .cache import ShelfCache
+
+logger = logging.getLogger(__name__)
+
+
+class ShelfPrefetcher:
+    """Learns which shelves each session opens and warms them after a listing.
+
+    Every ``get_bookshelves`` decays a session's per-shelf scores and every
+    ``get_bookshelf_books`` adds one, so a score approximates how often a
+    shelf is opened per listing. After a listing, shelves scoring at least
+    ``min_score`` are fetched into the cache in the background, bounded by
+    ``concurrency`` and by ``byte_budget`` (estimated from each shelf's last
+    observed size).
+
+    A shelf opened while its prefetch is still in flight waits for that
+    prefetch (``wait_for``) rather than sending a second request.
+
+    A prefetch saves one upstream call when the shelf is opened before it
+    expires from the cache and wastes one otherwise, so prefetching only pays
+    off at a hit ratio of at least 0.5. Once ``warmup`` prefetches have
+    resolved below that ratio, the prefetcher drops to probing a single shelf
+    every ``probe_interval`` listings until the ratio recovers.
+    """
+
+    def __init__(
+        self,
+        client,
+        cache: ShelfCache,
+        concurrency: int = 2,
+        byte_budget: int = 1_000_000,
+        max_shelves: int = 4,
+        decay: float = 0.8,
+        min_score: float = 0.3,
+        warmup: int = 10,
+        probe_interval: int = 5,
+        default_shelf_bytes: int = 20_000,
+        max_sessions: int = 1000,
+    ) -> None:
+        self.client = client
+        self.cache = cache
+        self.concurrency = concurrency
+        self.byte_budget = byte_budget
+        self.max_shelves = max_shelves
+        self.decay = decay
+        self.min_score = min_score
+        self.warmup = warmup
+        self.probe_interval = probe_interval
+        self.default_shelf_bytes = default_shelf_bytes
+        self.max_sessions = max_sessions
+
+        self.issued = 0
+        self.hits = 0
+        self.wasted = 0
+        self.failed = 0
+        self.bytes_prefetched = 0
+        self._scores: OrderedDict = OrderedDict()
+        self._sizes: dict = {}
+        self._outstanding: dict = {}
+        self._inflight: dict = {}
+        self._listings = 0
+        self._tasks: set = set()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+
+    @property
+    def hit_ratio(self) -> Optional[float]:
+        resolved = self.hits + self.wasted
+        return self.hits / resolved if resolved else None
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        for key, issued_at in list(self._outstanding.items()):
+            if now - issued_at > self.cache.ttl:
+                del self._outstanding[key]
+                self.wasted += 1
+
+    def _budget_shelves(self) -> int:
+        ratio = self.hit_ratio
+        if self.hits + self.wasted < self.warmup or ratio is None or ratio >= 0.5:
+            return self.max_shelves
+        return 1 if self._listings % self.probe_interval == 0 else 0
+
+    def _session_scores(self, session: str) -> dict:
+        scores = self._scores.get(session)
+        if scores is None:
+            scores = self._scores[session] = {}
+            if len(self._scores) > self.max_sessions:
+                self._scores.popitem(last=False)
+        else:
+            self._scores.move_to_end(session)
+        return scores
+
+    def record_open(self, session: str, bookshelf_id: int, size: int, served_from_cache: bool) -> None:
+        """Record that a session opened a shelf, and how large its payload was."""
+        scores = self._session_scores(session)
+        scores[bookshelf_id] = scores.get(bookshelf_id, 0.0) + 1.0
+        self._sizes[bookshelf_id] = size
+        if self._outstanding.pop((session, bookshelf_id), None) is not None:
+            if served_from_cache:
+                self.hits += 1
+            else:
+                self.wasted += 1
+
+    def after_listing(self, session: str, shelves: dict) -> None:
+        """Decay scores and start background prefetches for likely shelves."""
+        self._listings += 1
+        self._expire()
+        scores = self._session_scores(session)
+        for bookshelf_id in list(scores):
+            scores[bookshelf_id] *= self.decay
+            if scores[bookshelf_id] < 0.01:
+                del scores[bookshelf_id]
+
+        known = {item.get("id") for item in shelves.get("items") or []}
+        candidates = sorted(
+            (s for s in scores if s in known and scores[s] >= self.min_score),
+            key=lambda s: scores[s],
+            reverse=True,
+        )
+        limit = self._budget_shelves()
+        budget = self.byte_budget
+        selected = []
+        for bookshelf_id in candidates:
+            if len(selected) >= limit:
+                break
+            if (
+                (session, bookshelf_id) in self._outstanding
+                or bookshelf_id in self._inflight
+                or self.cache.is_fresh(bookshelf_id)
+            ):
+                continue
+            size = self._sizes.get(bookshelf_id, self.default_shelf_bytes)
+            if size > budget:
+                continue
+            budget -= size
+            selected.append(bookshelf_id)
+
+        for bookshelf_id in selected:
+            self.issued += 1
+            self._outstanding[(session, bookshelf_id)] = time.monotonic()
+            task = asyncio.create_task(self._prefetch(session, bookshelf_id))
+            self._tasks.add(task)
+            self._inflight[bookshelf_id] = task
+            task.add_done_callback(lambda t, key=bookshelf_id: self._finished(key, t))
+
+    def _finished(self, bookshelf_id: int, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if self._inflight.get(bookshelf_id) is task:
+            del self._inflight[bookshelf_id]
+
+    async def wait_for(self, bookshelf_id: int) -> bool:
+        """Wait for an in-flight prefetch of ``bookshelf_id``. Returns True if it left the shelf cached."""
+        task = self._inflight.get(bookshelf_id)
+        if task is None:
+            return False
+        # Shielded: a caller giving up must not cancel the prefetch for others.
+        await asyncio.shield(task)
+        return self.cache.is_fresh(bookshelf_id)
+
+    async def _prefetch(self, session: str, bookshelf_id: int) -> None:
+        deadlines.clear()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            try:
+                await self.client.get_bookshelf_books(bookshelf_id)
+                self.bytes_prefetched += self._sizes.get(bookshelf_id, self.default_shelf_bytes)
+            except Exception:
+                logger.debug("Prefetch of bookshelf %s failed", bookshelf_id, exc_info=True)
+                self.failed += 1
+                self._outstanding.pop((session, bookshelf_id), None)
+
+    def stats(self) -> dict:
+        self._expire()
+        ratio = self.hit_ratio
+        return {
+            "issued": self.issued,
+            "hits": self.hits,
+            "wasted": self.wasted,
+            "failed": self.failed,
+            "outstanding": len(self._outstanding),
+            "hit_ratio": round(ratio, 3) if ratio is not None else None,
+            "upstream_calls_saved": self.hits - self.wasted - self.failed,
+            "estimated_bytes_prefetched": self.bytes_prefetched,
+            "shelves_per_listing": self._budget_shelves(),
+            "sessions": len(self._scores),
+        }
@@ -0,0 +1,121 @@
+"""Opt-in cProfile capture of individual tool calls."""
+
+import cProfile
+import logging
+import os
+import pstats
+import random
+import re
+import time
+from typing import Optional
+
+from fastmcp.server.middleware import Middleware
+
+logger = logging.getLogger(__name__)
+
+_FILENAME = re.compile(r"^(\d+)-(\w+)-(\d+)ms\.pstats$")
+
+
+class ToolProfiler(Middleware):
+    """Profiles selected tool calls with cProfile and keeps the slowest evidence on disk.
+
+    A call is selected if its tool is listed in ``tools`` or it wins a
+    ``sample_rate`` draw; with neither configured every call is a candidate.
+    Profiles of calls faster than ``min_duration`` seconds are discarded,
+    so a threshold alone captures only slow calls. Only the newest
+    ``max_files`` pstats files are kept in ``directory``.
+
+    cProfile follows the thread rather than the task, so other requests
+    running on the event loop during a profiled call show up in its
+    profile. Only one call is profiled at a time.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        tools: Optional[set] = None,
+        sample_rate: float = 0.0,
+        min_duration: float = 0.0,
+        max_files: int = 50,
+    ) -> None:
+        self.directory = os.path.expanduser(directory)
+        self.tools = set(tools or ())
+        self.sample_rate = sample_rate
+        self.min_duration = min_duration
+        self.max_files = max_files
+        self.profiled = 0
+        self.kept = 0
+        self._active = False
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _selected(self, name: str) -> bool:
+        if name in self.tools:
+            return True
+        if self.sample_rate > 0:
+            return random.random() < self.sample_rate
+        return not self.tools
+
+    async def on_call_tool(self, context, call_next):
+        name = context.message.name
+        if self._active or not self._selected(name):
+            return await call_next(context)
+
+        self._active = True
+        profile = cProfile.Profile()
+        started = time.monotonic()
+        profile.enable()
+        try:
+            return await call_next(context)
+        finally:
+            profile.disable()
+            self._active = False
+            self.profiled += 1
+            elapsed = time.monotonic() - started
+            if elapsed >= self.min_duration:
+                self._save(profile, name, elapsed)
+
+    def _save(self, profile: cProfile.Profile, name: str, elapsed: float) -> None:
+        path = os.path.join(self.directory, f"{int(time.time() * 1000)}-{name}-{int(elapsed * 1000)}ms.pstats")
+        try:
+            profile.dump_stats(path)
+            self.kept += 1
+            for old in self.files()[self.max_files:]:
+                os.remove(os.path.join(self.directory, old))
+        except OSError:
+            logger.warning("Failed to write profile %s", path, exc_info=True)
+
+    def files(self, tool: Optional[str] = None) -> list:
+        """Profile file names, newest first, optionally for one tool."""
+        names = []
+        for entry in os.listdir(self.directory):
+            match = _FILENAME.match(entry)
+            if match and (tool is None or match.group(2) == tool):
+                names.append(entry)
+        return sorted(names, reverse=True)
+
+    def summary(self, tool: Optional[str] = None, top: int = 15) -> dict:
+        """Hottest functions by own time, aggregated over the saved profiles."""
+        names = self.files(tool)
+        result = {
+            "directory": self.directory,
+            "profiled": self.profiled,
+            "kept": self.kept,
+            "profiles": [
+                {"file": n, "tool": _FILENAME.match(n).group(2), "duration_ms": int(_FILENAME.match(n).group(3))}
+                for n in names
+            ],
+            "hot_frames": [],
+        }
+        if not names:
+            return result
+
+        stats = pstats.Stats(*(os.path.join(self.directory, n) for n in names))
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:top]
+        for (filename, line, function), (_, calls, own, cumulative, _) in rows:
+            result["hot_frames"].append({
+                "function": f"{function} ({os.path.basename(filename)}:{line})",
+                "calls": calls,
+                "own_ms": round(own * 1000, 2),
+                "cumulative_ms": round(cumulative * 1000, 2),
+            })
+        return result
@@ -0,0 +1,44 @@
+"""Flat book records derived from Micro.blog bookshelf payloads."""
+
+import hashlib
+import json
+from typing import Iterator
+
+RECORD_FIELDS = (
+    "id",
+    "title",
+    "author",
+    "isbn",
+    "cover_url",
+    "bookshelf_id",
+    "bookshelf_name",
+    "date_added",
+)
+
+
+def book_record(item: dict, bookshelf_id: int, bookshelf_name: str = "") -> dict:
+    """Flatten a JSON Feed book item into a record with stable fields."""
+    microblog = item.get("_microblog") or {}
+    authors = item.get("authors") or []
+    return {
+        "id": item.get("id"),
+        "title": item.get("title") or "",
+        "author": ", ".join(a["name"] for a in authors if a.get("name")),
+        "isbn": microblog.get("isbn") or "",
+        "cover_url": item.get("image") or "",
+        "bookshelf_id": bookshelf_id,
+        "bookshelf_name": bookshelf_name,
+        "date_added": item.get("date_published") or microblog.get("date_added") or "",
+    }
+
+
+def shelf_records(payload: dict, bookshelf_id: int, bookshelf_name: str = "") -> Iterator[dict]:
+    """Yield records for every book in a bookshelf payload."""
+    for item in payload.get("items") or []:
+        yield book_record(item, bookshelf_id, bookshelf_name)
+
+
+def record_hash(record: dict) -> str:
+    """Content hash of a record, stable across runs."""
+    encoded = json.dumps(record, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.sha1(encoded).hexdigest()
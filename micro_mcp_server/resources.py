@@ -0,0 +1,129 @@
+"""Subscribable MCP resources for bookshelves and reading goals."""
+
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import weakref
+from typing import Callable, Optional
+
+from . import deadlines
+
+logger = logging.getLogger(__name__)
+
+BOOKSHELVES_URI = "books://bookshelves"
+BOOKSHELF_URI = "books://bookshelf/{bookshelf_id}"
+GOAL_URI = "books://goals/{goal_id}"
+
+_URI_PATHS = (
+    (re.compile(r"^books://bookshelves$"), "/books/bookshelves"),
+    (re.compile(r"^books://bookshelf/(\d+)$"), "/books/bookshelves/{}"),
+    (re.compile(r"^books://goals/(\d+)$"), "/books/goals/{}"),
+)
+
+
+def upstream_path(uri: str) -> str:
+    """Map a resource URI to the Micro.blog API path backing it."""
+    for pattern, path in _URI_PATHS:
+        match = pattern.match(uri)
+        if match:
+            return path.format(*match.groups())
+    raise ValueError(f"Unknown resource '{uri}'")
+
+
+def content_hash(data) -> str:
+    """Stable hash of a JSON payload, independent of key order."""
+    encoded = json.dumps(data, sort_keys=True, separators=(",", ":")).encode()
+    return "sha256:" + hashlib.sha256(encoded).hexdigest()
+
+
+class ResourcePublisher:
+    """Tracks resource subscriptions and notifies sessions when content changes.
+
+    Subscribed resources are polled every ``poll_interval`` seconds with
+    conditional requests (ETag / Last-Modified), so unchanged resources
+    usually cost a 304. A ``resources/updated`` notification is only sent
+    when the content hash differs from the last one published.
+    """
+
+    def __init__(
+        self,
+        client,
+        poll_interval: float = 60.0,
+        on_change: Optional[Callable[[str, dict], None]] = None,
+    ) -> None:
+        self.client = client
+        self.poll_interval = poll_interval
+        self.on_change = on_change
+        self.polls = 0
+        self.not_modified = 0
+        self.notifications = 0
+        self._subscribers: dict = {}
+        self._hashes: dict = {}
+        self._validators: dict = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def render(self, uri: str, data) -> str:
+        """Wrap resource data in an envelope carrying its content hash."""
+        digest = content_hash(data)
+        self._hashes[uri] = digest
+        return json.dumps({"uri": uri, "content_hash": digest, "data": data}, indent=2)
+
+    def subscribe(self, uri: str, session) -> None:
+        upstream_path(uri)
+        self._subscribers.setdefault(uri, weakref.WeakSet()).add(session)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._poll_forever())
+
+    def unsubscribe(self, uri: str, session) -> None:
+        sessions = self._subscribers.get(uri)
+        if sessions is not None:
+            sessions.discard(session)
+            if not sessions:
+                del self._subscribers[uri]
+
+    def stats(self) -> dict:
+        return {
+            "subscriptions": {uri: len(sessions) for uri, sessions in self._subscribers.items()},
+            "polls": self.polls,
+            "not_modified": self.not_modified,
+            "notifications": self.notifications,
+        }
+
+    async def _poll_forever(self) -> None:
+        deadlines.clear()
+        while self._subscribers:
+            await asyncio.sleep(self.poll_interval)
+            for uri in list(self._subscribers):
+                try:
+                    await self.poll(uri)
+                except Exception:
+                    logger.warning("Failed to poll resource %s", uri, exc_info=True)
+
+    async def poll(self, uri: str) -> bool:
+        """Check one resource upstream and notify subscribers if it changed."""
+        self.polls += 1
+        etag, last_modified = self._validators.get(uri, (None, None))
+        data, etag, last_modified = await self.client.get_conditional(upstream_path(uri), etag, last_modified)
+        self._validators[uri] = (etag, last_modified)
+        if data is None:
+            self.not_modified += 1
+            return False
+
+        digest = content_hash(data)
+        previous = self._hashes.get(uri)
+        self._hashes[uri] = digest
+        if previous is None or previous == digest:
+            return False
+
+        if self.on_change is not None:
+            self.on_change(uri, data)
+        for session in list(self._subscribers.get(uri, ())):
+            try:
+                await session.send_resource_updated(uri)
+                self.notifications += 1
+            except Exception:
+                logger.debug("Dropping subscriber for %s", uri, exc_info=True)
+                self.unsubscribe(uri, session)
+        return True
@@ -1,70 +1,187 @@
 """Micro.blog Books API MCP Server using FastMCP."""
 
+import asyncio
 import json
 import logging
-from typing import Optional
-from urllib.parse import urljoin
+import os
+from typing import Awaitable, Callable, Optional
 
 import httpx
-from fastmcp import FastMCP
+from fastmcp import Context, FastMCP
+
+from . import deadlines
+from .cache import BOOKSHELVES_KEY, ShelfCache
+from .changes import ChangeFeed
+from .duplicates import DuplicateFinder
+from .export import export_library as run_export
+from .export import export_target
+from .goals import GoalHistory
+from .hedging import Hedger
+from .idempotency import IdempotencyStore
+from .index import LibraryIndex
+from .jobs import JobRunner
+from .journal import MutationJournal, WriteBehindQueue
+from .limiter import DROPPED, ERROR, AdaptiveLimiter, classify, shared_limiter
+from .locks import KeyedLocks, book_key, shelf_key
+from .logging_setup import ToolLoggingMiddleware, upstream_event_hooks
+from .memory import shared_accountant
+from .metrics import snapshot as metrics_snapshot
+from .prefetch import ShelfPrefetcher
+from .profiling import ToolProfiler
+from .resources import BOOKSHELF_URI, BOOKSHELVES_URI, GOAL_URI, ResourcePublisher
+from .shutdown import DrainMiddleware, graceful_lifespan
+from .similarity import SimilarityIndex
+from .snapshot import account_id, load_snapshot, save_snapshot
+from .stats import LibraryColumns
+from .tracing import RequestTrace, TraceRecorder
 
 logger = logging.getLogger(__name__)
 
 BASE_URL = "https://micro.blog"
+DEFAULT_STATE_DIR = "~/.micro-mcp-server"
+BULK_MOVE_CONCURRENCY = 4
 
 
 class MicroBooksClient:
-    """HTTP client for Micro.blog Books API."""
+    """HTTP client for Micro.blog Books API.
+
+    Requests reuse one connection pool per client and pass through the
+    process-wide adaptive concurrency limiter. Phase timings for recent
+    requests are kept in ``traces``. With a ``hedger``, slow GETs are
+    raced against a duplicate request. With ``goals``, reading-goal
+    payloads and updates are snapshotted into its history.
 
-    def __init__(self, bearer_token: str) -> None:
+    Mutations hold the locks of the books and bookshelves they touch in
+    ``locks`` from the request until the cache is patched, so conflicting
+    calls apply in the order they started and unrelated ones still run
+    concurrently.
+    """
+
+    def __init__(
+        self,
+        bearer_token: str,
+        cache: Optional[ShelfCache] = None,
+        limiter: Optional[AdaptiveLimiter] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        hedger: Optional[Hedger] = None,
+        goals: Optional[GoalHistory] = None,
+    ) -> None:
         self.bearer_token = bearer_token
         self.headers = {
             "Authorization": f"Bearer {bearer_token}",
             "User-Agent": "Micro Books MCP Server",
             "Content-Type": "application/x-www-form-urlencoded",
         }
+        self.cache = cache
+        self.limiter = limiter or shared_limiter()
+        self.transport = transport
+        self.hedger = hedger
+        self.goals = goals
+        self.traces = TraceRecorder()
+        self.locks = KeyedLocks()
+        self._http: Optional[httpx.AsyncClient] = None
+        if cache is not None:
+            cache.bind(BOOKSHELVES_KEY, self._fetch_bookshelves)
+            cache.bind("bookshelf", self._fetch_bookshelf_books)
+
+    async def _request(self, method: str, path: str, **kwargs) -> httpx.Response:
+        if method == "GET" and self.hedger is not None:
+            return await self.hedger.run(lambda: self._send(method, path, **kwargs))
+        return await self._send(method, path, **kwargs)
+
+    async def _send(self, method: str, path: str, headers: Optional[dict] = None, **kwargs) -> httpx.Response:
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                base_url=BASE_URL, transport=self.transport, event_hooks=upstream_event_hooks()
+            )
+        left = deadlines.remaining()
+        if left is not None:
+            if left <= 0:
+                raise deadlines.DeadlineExceeded(f"Deadline passed before {method} {path}")
+            kwargs["timeout"] = left
+        trace = RequestTrace(method, path)
+        started = await self.limiter.acquire()
+        trace.slot_acquired()
+        outcome = DROPPED
+        try:
+            response = await self._http.request(
+                method, path, headers=headers or self.headers, extensions={"trace": trace.on_event}, **kwargs
+            )
+        except httpx.TransportError as e:
+            # A timeout taken from the caller's deadline says nothing about
+            # upstream health, so it must not cut the limit.
+            expired = isinstance(e, httpx.TimeoutException) and left is not None and deadlines.remaining() <= 0
+            outcome = DROPPED if expired else ERROR
+            trace.finish(error=type(e).__name__)
+            raise
+        else:
+            outcome = classify(response.status_code)
+            trace.finish(response.status_code, response.num_bytes_downloaded)
+            return response
+        finally:
+            self.limiter.release(started, outcome)
+            if trace.total is not None:
+                self.traces.record(trace)
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
 
     async def get_bookshelves(self) -> dict:
         """Get all bookshelves."""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                urljoin(BASE_URL, "/books/bookshelves"),
-                headers=self.headers,
-            )
-            response.raise_for_status()
-            return response.json()
+        if self.cache is not None:
+            cached = self.cache.get(BOOKSHELVES_KEY)
+            if cached is not None:
+                return cached
+        return await self._fetch_into_cache(BOOKSHELVES_KEY, self._fetch_bookshelves)
 
     async def get_bookshelf_books(self, bookshelf_id: int) -> dict:
         """Get books in a specific bookshelf."""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                urljoin(BASE_URL, f"/books/bookshelves/{bookshelf_id}"),
-                headers=self.headers,
-            )
-            response.raise_for_status()
-            return response.json()
+        if self.cache is not None:
+            cached = self.cache.get(bookshelf_id)
+            if cached is not None:
+                return cached
+        return await self._fetch_into_cache(bookshelf_id, lambda: self._fetch_bookshelf_books(bookshelf_id))
+
+    async def _fetch_into_cache(self, key, fetch: Callable[[], Awaitable[dict]]) -> dict:
+        if self.cache is None:
+            return await fetch()
+        entry = self.cache.peek(key)
+        version = entry.version if entry is not None else None
+        result = await fetch()
+        if not self.cache.put(key, result, version):
+            # A write patched the entry while the fetch was in flight; the
+            # fetch may predate it, so keep the patched copy for the reconcile.
+            return self.cache.peek(key).payload
+        return result
+
+    async def _fetch_bookshelves(self) -> dict:
+        response = await self._request("GET", "/books/bookshelves")
+        response.raise_for_status()
+        return response.json()
+
+    async def _fetch_bookshelf_books(self, bookshelf_id: int) -> dict:
+        response = await self._request("GET", f"/books/bookshelves/{bookshelf_id}")
+        response.raise_for_status()
+        return response.json()
 
     async def add_bookshelf(self, name: str) -> dict:
         """Add a new bookshelf."""
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                urljoin(BASE_URL, "/books/bookshelves"),
-                headers=self.headers,
-                data={"name": name},
-            )
-            response.raise_for_status()
-            return {"success": True, "message": f"Bookshelf '{name}' created successfully"}
+        response = await self._request("POST", "/books/bookshelves", data={"name": name})
+        response.raise_for_status()
+        if self.cache is not None:
+            self.cache.invalidate(BOOKSHELVES_KEY)
+        return {"success": True, "message": f"Bookshelf '{name}' created successfully"}
 
     async def rename_bookshelf(self, bookshelf_id: int, name: str) -> dict:
         """Rename a bookshelf."""
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                urljoin(BASE_URL, f"/books/bookshelves/{bookshelf_id}"),
-                headers=self.headers,
-                data={"name": name},
-            )
+        async with self.locks.hold(shelf_key(bookshelf_id)):
+            response = await self._request("POST", f"/books/bookshelves/{bookshelf_id}", data={"name": name})
             response.raise_for_status()
-            return {"success": True, "message": f"Bookshelf renamed to '{name}' successfully"}
+            if self.cache is not None:
+                self.cache.patch_rename_bookshelf(bookshelf_id, name)
+        return {"success": True, "message": f"Bookshelf renamed to '{name}' successfully"}
 
     async def add_book(
         self,
@@ -85,66 +202,91 @@ class MicroBooksClient:
         if cover_url:
             data["cover_url"] = cover_url
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                urljoin(BASE_URL, "/books"),
-                headers=self.headers,
-                data=data,
-            )
-            response.raise_for_status()
-            return {"success": True, "message": f"Book '{title}' by {author} added successfully"}
+        response = await self._request("POST", "/books", data=data)
+        response.raise_for_status()
+        if self.cache is not None:
+            self.cache.patch_add_book(bookshelf_id, title, author, isbn, cover_url)
+        return {"success": True, "message": f"Book '{title}' by {author} added successfully"}
 
     async def move_book(self, book_id: int, bookshelf_id: int) -> dict:
         """Move a book to a different bookshelf."""
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                urljoin(BASE_URL, f"/books/bookshelves/{bookshelf_id}/assign"),
-                headers=self.headers,
-                data={"book_id": str(book_id)},
-            )
-            response.raise_for_status()
-            return {"success": True, "message": f"Book moved to bookshelf {bookshelf_id} successfully"}
+        # The book is locked first so its source shelf cannot change before
+        # the shelves are locked; book keys sort before shelf keys, so this
+        # keeps the global acquisition order.
+        async with self.locks.hold(book_key(book_id)):
+            source = self.cache.book_location(book_id) if self.cache is not None else None
+            shelves = [shelf_key(bookshelf_id)] + ([shelf_key(source)] if source is not None else [])
+            async with self.locks.hold(shared=shelves):
+                response = await self._request(
+                    "POST", f"/books/bookshelves/{bookshelf_id}/assign", data={"book_id": str(book_id)}
+                )
+                response.raise_for_status()
+                if self.cache is not None:
+                    self.cache.patch_move_book(book_id, bookshelf_id)
+        return {"success": True, "message": f"Book moved to bookshelf {bookshelf_id} successfully"}
 
     async def remove_book(self, bookshelf_id: int, book_id: int) -> dict:
         """Remove a book from a bookshelf."""
-        async with httpx.AsyncClient() as client:
-            response = await client.delete(
-                urljoin(BASE_URL, f"/books/bookshelves/{bookshelf_id}/remove/{book_id}"),
-                headers=self.headers,
-            )
+        async with self.locks.hold(book_key(book_id), shared=[shelf_key(bookshelf_id)]):
+            response = await self._request("DELETE", f"/books/bookshelves/{bookshelf_id}/remove/{book_id}")
             response.raise_for_status()
-            return {"success": True, "message": "Book removed from bookshelf successfully"}
+            if self.cache is not None:
+                self.cache.patch_remove_book(bookshelf_id, book_id)
+        return {"success": True, "message": "Book removed from bookshelf successfully"}
 
     async def change_book_cover(self, bookshelf_id: int, book_id: int, cover_url: str) -> dict:
         """Change the cover for a book."""
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                urljoin(BASE_URL, f"/books/bookshelves/{bookshelf_id}/cover/{book_id}"),
-                headers=self.headers,
-                data={"cover_url": cover_url},
+        async with self.locks.hold(book_key(book_id), shared=[shelf_key(bookshelf_id)]):
+            response = await self._request(
+                "POST", f"/books/bookshelves/{bookshelf_id}/cover/{book_id}", data={"cover_url": cover_url}
             )
             response.raise_for_status()
-            return {"success": True, "message": "Book cover updated successfully"}
+            if self.cache is not None:
+                self.cache.patch_book_cover(bookshelf_id, book_id, cover_url)
+        return {"success": True, "message": "Book cover updated successfully"}
+
+    async def get_conditional(
+        self,
+        path: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> tuple:
+        """GET a path with validators. Returns ``(None, etag, last_modified)`` if unchanged."""
+        headers = dict(self.headers)
+        if etag:
+            headers["If-None-Match"] = etag
+        if last_modified:
+            headers["If-Modified-Since"] = last_modified
+
+        response = await self._request("GET", path, headers=headers)
+        if response.status_code == 304:
+            return None, etag, last_modified
+        response.raise_for_status()
+        return response.json(), response.headers.get("ETag"), response.headers.get("Last-Modified")
+
+    def _snapshot_goal(self, record) -> None:
+        if self.goals is None:
+            return
+        try:
+            record()
+        except Exception:
+            logger.warning("Failed to snapshot reading goal", exc_info=True)
 
     async def get_reading_goals(self) -> dict:
         """Get reading goals."""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                urljoin(BASE_URL, "/books/goals"),
-                headers=self.headers,
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await self._request("GET", "/books/goals")
+        response.raise_for_status()
+        result = response.json()
+        self._snapshot_goal(lambda: self.goals.observe_goals(result))
+        return result
 
     async def get_goal_progress(self, goal_id: int) -> dict:
         """Get books list progress toward a goal."""
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                urljoin(BASE_URL, f"/books/goals/{goal_id}"),
-                headers=self.headers,
-            )
-            response.raise_for_status()
-            return response.json()
+        response = await self._request("GET", f"/books/goals/{goal_id}")
+        response.raise_for_status()
+        result = response.json()
+        self._snapshot_goal(lambda: self.goals.observe_progress(goal_id, result))
+        return result
 
     async def update_reading_goal(self, goal_id: int, value: int, progress: Optional[int] = None) -> dict:
         """Update reading goal."""
@@ -152,69 +294,360 @@ class MicroBooksClient:
         if progress is not None:
             data["progress"] = str(progress)
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                urljoin(BASE_URL, f"/books/goals/{goal_id}"),
-                headers=self.headers,
-                data=data,
-            )
-            response.raise_for_status()
-            return {"success": True, "message": "Reading goal updated successfully"}
+        response = await self._request("POST", f"/books/goals/{goal_id}", data=data)
+        response.raise_for_status()
+        self._snapshot_goal(lambda: self.goals.record(goal_id, value, progress, source="update"))
+        return {"success": True, "message": "Reading goal updated successfully"}
+
+
+def create_server(
+    bearer_token: str,
+    write_behind: bool = False,
+    state_dir: str = DEFAULT_STATE_DIR,
+    cache_ttl: float = 60.0,
+    prefetch_concurrency: int = 2,
+    prefetch_budget: int = 1_000_000,
+    resource_poll_interval: float = 60.0,
+    hedge_percentile: float = 0.0,
+    hedge_budget: float = 5.0,
+    tool_deadline: float = 30.0,
+    tool_deadlines: Optional[dict] = None,
+    profile: bool = False,
+    profile_tools: Optional[set] = None,
+    profile_sample_rate: float = 0.0,
+    profile_min_ms: float = 0.0,
+    log_sample_rate: Optional[float] = None,
+    log_sample_rates: Optional[dict] = None,
+    transport: Optional[httpx.AsyncBaseTransport] = None,
+    memory_budget_mb: Optional[float] = None,
+    idempotency_window: float = 600.0,
+    shutdown_timeout: float = 10.0,
+    snapshot: bool = True,
+    job_workers: int = 2,
+) -> FastMCP:
+    """Create the FastMCP server.
+
+    With ``write_behind`` enabled, mutating tools append to a durable journal
+    under ``state_dir`` and return before the Micro.blog round-trip. Bookshelf
+    reads are cached for ``cache_ttl`` seconds (0 disables the cache), and
+    shelves a session tends to open are prefetched after each listing using up
+    to ``prefetch_concurrency`` parallel requests and ``prefetch_budget`` bytes.
+    Subscribed resources are polled every ``resource_poll_interval`` seconds.
+    A ``hedge_percentile`` between 0 and 100 enables hedged reads: a GET still
+    running at that latency percentile is duplicated, with duplicates capped
+    at ``hedge_budget`` percent of requests. Each tool call must finish within
+    ``tool_deadline`` seconds, or the per-tool override in ``tool_deadlines``.
+    With ``profile`` enabled, tool calls selected by name or sample rate are
+    run under cProfile and kept under ``state_dir`` if slower than
+    ``profile_min_ms``. Logs of successful tool calls are sampled at
+    ``log_sample_rate``, overridden per tool by ``log_sample_rates``. A
+    ``transport`` (such as a cassette recorder or replayer) replaces the
+    network transport for Micro.blog requests. Caches share one process-wide
+    memory budget of ``memory_budget_mb`` (default 512). Repeated
+    ``add_book`` and ``add_bookshelf`` calls within ``idempotency_window``
+    seconds, and mutations that repeat an idempotency key, return the stored
+    result without a second request. On shutdown, new tool calls are refused,
+    running ones get ``shutdown_timeout`` seconds to finish and the write
+    queue as long again to flush; with ``snapshot`` enabled, cached shelves
+    and the change feed are then saved under ``state_dir`` and loaded by the
+    next start. Exports, audits and bulk moves can run as background jobs on
+    ``job_workers`` workers, with their state and results kept under
+    ``state_dir``.
+    """
+    drain = DrainMiddleware()
+
+    async def on_startup() -> None:
+        if queue is not None:
+            # Mutations acknowledged by a previous run that never reached Micro.blog.
+            queue.resume()
+
+    async def on_shutdown() -> None:
+        await jobs.close()
+        if queue is not None:
+            if not await queue.flush(shutdown_timeout):
+                logger.warning(
+                    "Write queue not flushed at shutdown; pending mutations are sent when the server next starts",
+                    extra={"pending": queue.journal.pending_count()},
+                )
+            await queue.close()
+        if snapshot:
+            try:
+                state = {"shelves": cache.export() if cache is not None else [], "feed": feed.snapshot()}
+                size = save_snapshot(snapshot_path, account, state)
+                logger.info("Saved snapshot", extra={"shelves": len(state["shelves"]), "bytes": size})
+            except Exception:
+                logger.exception("Failed to save snapshot")
+        await client.aclose()
+        idempotency.close()
+        goals.close()
+        for name in memory_names:
+            accountant.remove(name)
+
+    mcp = FastMCP(
+        "Micro Books API",
+        middleware=[
+            drain,
+            ToolLoggingMiddleware(log_sample_rate, log_sample_rates),
+            deadlines.DeadlineMiddleware(tool_deadline, tool_deadlines),
+        ],
+        lifespan=graceful_lifespan(drain, on_shutdown, shutdown_timeout, on_startup=on_startup),
+    )
+    accountant = shared_accountant()
+    if memory_budget_mb is not None:
+        accountant.budget = int(memory_budget_mb * 1024 * 1024)
+    registered = accountant.names()
+    cache = ShelfCache(ttl=cache_ttl, accountant=accountant) if cache_ttl > 0 else None
+    hedger = Hedger(hedge_percentile / 100, hedge_budget / 100) if 0 < hedge_percentile < 100 else None
+    goals = GoalHistory(os.path.join(os.path.expanduser(state_dir), "goals.sqlite3"))
+    idempotency = IdempotencyStore(
+        os.path.join(os.path.expanduser(state_dir), "idempotency.sqlite3"), window=idempotency_window
+    )
+    client = MicroBooksClient(bearer_token, cache=cache, transport=transport, hedger=hedger, goals=goals)
+    jobs = JobRunner(os.path.join(os.path.expanduser(state_dir), "jobs.sqlite3"), workers=job_workers)
+    index = LibraryIndex(max_age=max(cache_ttl, 300.0))
+    duplicates = DuplicateFinder(accountant=accountant)
+    similarity = SimilarityIndex(accountant=accountant)
+    index.add_listener(similarity.on_shelf_change)
+    columns = LibraryColumns(accountant=accountant)
+    index.add_listener(columns.on_shelf_change)
+    feed = ChangeFeed(on_payload=cache.offer if cache is not None else None)
+    accountant.track("library_index", index.estimated_bytes)
+    accountant.track("change_feed", feed.estimated_bytes)
+    accountant.track("request_traces", client.traces.estimated_bytes)
+    # The accountant outlives this server; its caches leave the budget when it stops.
+    memory_names = accountant.names() - registered
+    if cache is not None:
+        cache.add_listener(index.observe)
+        cache.add_listener(feed.observe)
+    snapshot_path = os.path.join(os.path.expanduser(state_dir), "snapshot.json.gz")
+    exports_dir = os.path.join(os.path.expanduser(state_dir), "exports")
+    export_manifest = os.path.join(exports_dir, "manifest.json")
+    account = account_id(bearer_token)
+    saved = load_snapshot(snapshot_path, account) if snapshot else None
+    if saved is not None:
+        # The feed goes first, so replaying shelves into the cache (and
+        # through its listeners into the index) emits no changes.
+        feed.restore(saved["feed"])
+        if cache is not None:
+            for key, age, payload in saved["shelves"]:
+                cache.restore(key, payload, age + saved["age"])
+                index.mark_loaded(key, age + saved["age"])
+        logger.info("Loaded snapshot", extra={"shelves": len(saved["shelves"]), "age_seconds": round(saved["age"])})
+    profiler: Optional[ToolProfiler] = None
+    if profile:
+        profiler = ToolProfiler(
+            os.path.join(state_dir, "profiles"), profile_tools, profile_sample_rate, profile_min_ms / 1000
+        )
+        mcp.add_middleware(profiler)
+    prefetcher: Optional[ShelfPrefetcher] = None
+    if cache is not None and prefetch_concurrency > 0:
+        prefetcher = ShelfPrefetcher(client, cache, prefetch_concurrency, prefetch_budget)
+    queue: Optional[WriteBehindQueue] = None
+    if write_behind:
+        journal = MutationJournal(os.path.join(os.path.expanduser(state_dir), "journal.sqlite3"))
+        queue = WriteBehindQueue(client, journal)
+
+    def refresh_cached(uri: str, data: dict) -> None:
+        # Make sure subscribers re-reading after a notification see the new content.
+        if cache is None:
+            return
+        if uri == BOOKSHELVES_URI:
+            cache.offer(BOOKSHELVES_KEY, data)
+        elif uri.startswith("books://bookshelf/"):
+            cache.offer(int(uri.rsplit("/", 1)[1]), data)
+
+    publisher = ResourcePublisher(client, resource_poll_interval, on_change=refresh_cached)
+    low_level = mcp._mcp_server
+
+    @low_level.subscribe_resource()
+    async def subscribe_resource(uri) -> None:
+        publisher.subscribe(str(uri), low_level.request_context.session)
+
+    @low_level.unsubscribe_resource()
+    async def unsubscribe_resource(uri) -> None:
+        publisher.unsubscribe(str(uri), low_level.request_context.session)
+
+    # The low-level server always advertises subscribe=False; we handle it.
+    get_capabilities = low_level.get_capabilities
+
+    def get_capabilities_with_subscribe(*args, **kwargs):
+        capabilities = get_capabilities(*args, **kwargs)
+        if capabilities.resources is not None:
+            capabilities.resources.subscribe = True
+        return capabilities
+
+    low_level.get_capabilities = get_capabilities_with_subscribe
+
+    async def mutate(kind: str, idempotency_key: Optional[str] = None, **payload) -> dict:
+        async def apply() -> dict:
+            if queue is not None:
+                return await queue.enqueue(kind, payload)
+            return await getattr(client, kind)(**payload)
+
+        return await idempotency.run(kind, payload, apply, idempotency_key)
+
+    async def export(path: Optional[str], format: str, incremental: bool, progress=None) -> dict:
+        # Exports stay under state_dir, next to one manifest shared by every
+        # export, so an incremental run compares against the previous one
+        # whatever file it writes.
+        target = export_target(exports_dir, path, format, incremental)
+        return await run_export(client, str(target), format, incremental, export_manifest, progress=progress)
+
+    async def export_job(job, path: Optional[str] = None, format: str = "ndjson", incremental: bool = False) -> dict:
+        def progress(done: int, total: int) -> None:
+            job.progress(done, total, "bookshelves exported")
+
+        return await export(path, format, incremental, progress)
+
+    async def audit_job(job, threshold: float = 0.7, limit: int = 50) -> dict:
+        def progress(done: int, total: int) -> None:
+            job.progress(done, total, "bookshelves loaded")
+
+        await index.refresh(client, progress=progress)
+        records = list(index.records.values())
+        missing_isbn = sorted(r["id"] for r in records if not r["isbn"])
+        missing_cover = sorted(r["id"] for r in records if not r["cover_url"])
+        return {
+            "books": len(records),
+            "bookshelves": len(index.shelf_names),
+            "duplicates": duplicates.find(records, index.shelf_names, threshold, limit),
+            "missing_isbn": {"count": len(missing_isbn), "book_ids": missing_isbn[:limit]},
+            "missing_cover": {"count": len(missing_cover), "book_ids": missing_cover[:limit]},
+        }
+
+    async def bulk_move_job(job, where: str, bookshelf_id: int, dry_run: bool = False) -> dict:
+        if not where.strip():
+            raise ValueError("bulk_move needs a where clause; it would otherwise move the whole library")
+        await index.refresh(client)
+        if bookshelf_id not in index.shelf_names:
+            raise ValueError(f"Unknown bookshelf {bookshelf_id}")
+        matches = index.query(where, limit=len(index.records))["books"]
+        pending = [book["id"] for book in matches if book["bookshelf_id"] != bookshelf_id]
+        result = {"matched": len(matches), "already_on_shelf": len(matches) - len(pending)}
+        if dry_run:
+            return {**result, "would_move": pending}
+
+        moved, failed = [], {}
+        semaphore = asyncio.Semaphore(BULK_MOVE_CONCURRENCY)
+        job.progress(0, len(pending), "books moved")
 
+        async def move(book_id: int) -> None:
+            async with semaphore:
+                try:
+                    await mutate("move_book", book_id=book_id, bookshelf_id=bookshelf_id)
+                    moved.append(book_id)
+                except Exception as e:
+                    failed[str(book_id)] = f"{type(e).__name__}: {e}"
+            job.progress(len(moved) + len(failed), len(pending), "books moved")
 
-def create_server(bearer_token: str) -> FastMCP:
-    """Create the FastMCP server."""
-    mcp = FastMCP("Micro Books API")
-    client = MicroBooksClient(bearer_token)
+        await asyncio.gather(*(move(book_id) for book_id in pending))
+        return {**result, "moved": sorted(moved), "failed": failed}
+
+    jobs.register(
+        "export", export_job, "Export the library to a file in the exports directory (path, format, incremental)"
+    )
+    jobs.register("audit", audit_job, "Find duplicates and books missing an ISBN or cover (threshold, limit)")
+    jobs.register("bulk_move", bulk_move_job, "Move books matching a query to a shelf (where, bookshelf_id, dry_run)")
+
+    async def wait_for_job(job_id: str, wait_seconds: float, ctx: Context) -> dict:
+        # Return before the tool's own deadline cuts the wait short.
+        remaining = deadlines.remaining()
+        if remaining is not None:
+            wait_seconds = min(wait_seconds, max(0.0, remaining - 1.0))
+
+        async def report(job) -> None:
+            await ctx.report_progress(job.done, job.total, job.message)
+
+        return await jobs.wait(job_id, wait_seconds, report)
+
+    @mcp.resource(BOOKSHELVES_URI, mime_type="application/json")
+    async def bookshelves_resource() -> str:
+        """All bookshelves, with a content hash for change detection."""
+        try:
+            result = await client.get_bookshelves()
+            return publisher.render(BOOKSHELVES_URI, result)
+        except Exception:
+            logger.exception("Failed to read bookshelves resource")
+            raise
+
+    @mcp.resource(BOOKSHELF_URI, mime_type="application/json")
+    async def bookshelf_resource(bookshelf_id: int) -> str:
+        """Books in a bookshelf, with a content hash for change detection."""
+        try:
+            result = await client.get_bookshelf_books(bookshelf_id)
+            return publisher.render(BOOKSHELF_URI.format(bookshelf_id=bookshelf_id), result)
+        except Exception:
+            logger.exception("Failed to read bookshelf resource")
+            raise
+
+    @mcp.resource(GOAL_URI, mime_type="application/json")
+    async def goal_resource(goal_id: int) -> str:
+        """Progress toward a reading goal, with a content hash for change detection."""
+        try:
+            result = await client.get_goal_progress(goal_id)
+            return publisher.render(GOAL_URI.format(goal_id=goal_id), result)
+        except Exception:
+            logger.exception("Failed to read goal resource")
+            raise
 
     @mcp.tool()
-    async def get_bookshelves() -> str:
+    async def get_bookshelves(ctx: Context) -> str:
         """Get all bookshelves from Micro.blog."""
         try:
             result = await client.get_bookshelves()
+            if prefetcher is not None:
+                prefetcher.after_listing(ctx.session_id, result)
             return json.dumps(result, indent=2)
         except Exception:
             logger.exception("Failed to get bookshelves")
             raise
 
     @mcp.tool()
-    async def get_bookshelf_books(bookshelf_id: int) -> str:
+    async def get_bookshelf_books(bookshelf_id: int, ctx: Context) -> str:
         """Get books in a specific bookshelf.
         
         Args:
             bookshelf_id: The ID of the bookshelf to get books from
         """
         try:
+            warm = cache is not None and cache.is_fresh(bookshelf_id)
+            if not warm and prefetcher is not None:
+                warm = await prefetcher.wait_for(bookshelf_id)
             result = await client.get_bookshelf_books(bookshelf_id)
-            return json.dumps(result, indent=2)
+            text = json.dumps(result, indent=2)
+            if prefetcher is not None:
+                prefetcher.record_open(ctx.session_id, bookshelf_id, len(text), warm)
+            return text
         except Exception:
             logger.exception("Failed to get bookshelf books")
             raise
 
     @mcp.tool()
-    async def add_bookshelf(name: str) -> str:
+    async def add_bookshelf(name: str, idempotency_key: Optional[str] = None) -> str:
         """Add a new bookshelf.
         
         Args:
             name: The name of the new bookshelf
+            idempotency_key: Send the same key when retrying so the change is applied only once (optional)
         """
         try:
-            result = await client.add_bookshelf(name)
+            result = await mutate("add_bookshelf", idempotency_key, name=name)
             return json.dumps(result, indent=2)
         except Exception:
             logger.exception("Failed to add bookshelf")
             raise
 
     @mcp.tool()
-    async def rename_bookshelf(bookshelf_id: int, name: str) -> str:
+    async def rename_bookshelf(bookshelf_id: int, name: str, idempotency_key: Optional[str] = None) -> str:
         """Rename a bookshelf.
         
         Args:
             bookshelf_id: The ID of the bookshelf to rename
             name: The new name for the bookshelf
+            idempotency_key: Send the same key when retrying so the change is applied only once (optional)
         """
         try:
-            result = await client.rename_bookshelf(bookshelf_id, name)
+            result = await mutate("rename_bookshelf", idempotency_key, bookshelf_id=bookshelf_id, name=name)
             return json.dumps(result, indent=2)
         except Exception:
             logger.exception("Failed to rename bookshelf")
@@ -227,6 +660,7 @@ def create_server(bearer_token: str) -> FastMCP:
         bookshelf_id: int,
         isbn: Optional[str] = None,
         cover_url: Optional[str] = None,
+        idempotency_key: Optional[str] = None,
     ) -> str:
         """Add a new book.
         
@@ -236,55 +670,71 @@ def create_server(bearer_token: str) -> FastMCP:
             bookshelf_id: The ID of the bookshelf to add the book to
             isbn: The ISBN of the book (optional)
             cover_url: URL to the book cover image (optional)
+            idempotency_key: Send the same key when retrying so the change is applied only once (optional)
         """
         try:
-            result = await client.add_book(title, author, bookshelf_id, isbn, cover_url)
+            result = await mutate(
+                "add_book",
+                idempotency_key,
+                title=title,
+                author=author,
+                bookshelf_id=bookshelf_id,
+                isbn=isbn,
+                cover_url=cover_url,
+            )
             return json.dumps(result, indent=2)
         except Exception:
             logger.exception("Failed to add book")
             raise
 
     @mcp.tool()
-    async def move_book(book_id: int, bookshelf_id: int) -> str:
+    async def move_book(book_id: int, bookshelf_id: int, idempotency_key: Optional[str] = None) -> str:
         """Move a book to a different bookshelf.
         
         Args:
             book_id: The ID of the book to move
             bookshelf_id: The ID of the target bookshelf
+            idempotency_key: Send the same key when retrying so the change is applied only once (optional)
         """
         try:
-            result = await client.move_book(book_id, bookshelf_id)
+            result = await mutate("move_book", idempotency_key, book_id=book_id, bookshelf_id=bookshelf_id)
             return json.dumps(result, indent=2)
         except Exception:
             logger.exception("Failed to move book")
             raise
 
     @mcp.tool()
-    async def remove_book(bookshelf_id: int, book_id: int) -> str:
+    async def remove_book(bookshelf_id: int, book_id: int, idempotency_key: Optional[str] = None) -> str:
         """Remove a book from a bookshelf.
         
         Args:
             bookshelf_id: The ID of the bookshelf
             book_id: The ID of the book to remove
+            idempotency_key: Send the same key when retrying so the change is applied only once (optional)
         """
         try:
-            result = await client.remove_book(bookshelf_id, book_id)
+            result = await mutate("remove_book", idempotency_key, bookshelf_id=bookshelf_id, book_id=book_id)
             return json.dumps(result, indent=2)
         except Exception:
             logger.exception("Failed to remove book")
             raise
 
     @mcp.tool()
-    async def change_book_cover(bookshelf_id: int, book_id: int, cover_url: str) -> str:
+    async def change_book_cover(
+        bookshelf_id: int, book_id: int, cover_url: str, idempotency_key: Optional[str] = None
+    ) -> str:
         """Change the cover for a book.
         
         Args:
             bookshelf_id: The ID of the bookshelf
             book_id: The ID of the book
             cover_url: URL to the new cover image
+            idempotency_key: Send the same key when retrying so the change is applied only once (optional)
         """
         try:
-            result = await client.change_book_cover(bookshelf_id, book_id, cover_url)
+            result = await mutate(
+                "change_book_cover", idempotency_key, bookshelf_id=bookshelf_id, book_id=book_id, cover_url=cover_url
+            )
             return json.dumps(result, indent=2)
         except Exception:
             logger.exception("Failed to change book cover")
@@ -315,19 +765,363 @@ def create_server(bearer_token: str) -> FastMCP:
             raise
 
     @mcp.tool()
-    async def update_reading_goal(goal_id: int, value: int, progress: Optional[int] = None) -> str:
+    async def update_reading_goal(
+        goal_id: int, value: int, progress: Optional[int] = None, idempotency_key: Optional[str] = None
+    ) -> str:
         """Update reading goal.
         
         Args:
             goal_id: The ID of the reading goal
             value: The target number of books for the goal
             progress: The current progress (number of books read, optional)
+            idempotency_key: Send the same key when retrying so the change is applied only once (optional)
         """
         try:
-            result = await client.update_reading_goal(goal_id, value, progress)
+            result = await mutate(
+                "update_reading_goal", idempotency_key, goal_id=goal_id, value=value, progress=progress
+            )
             return json.dumps(result, indent=2)
         except Exception:
             logger.exception("Failed to update reading goal")
             raise
 
-    return mcp
\ No newline at end of file
+    @mcp.tool()
+    async def goal_forecast(goal_id: Optional[int] = None, window_days: int = 28) -> str:
+        """Check whether reading goals are on track, from locally recorded progress.
+        
+        Progress is recorded whenever goals are read or updated. Returns the
+        year-to-date pace and the pace over the recent window, the projected
+        completion date under each, and the books per week still needed.
+        
+        Args:
+            goal_id: The ID of the reading goal; omit for every goal seen so far
+            window_days: Length of the recent window for the rolling pace
+        """
+        try:
+            refreshed = False
+            if not goals.goal_ids():
+                # Nothing recorded yet: one read seeds the history.
+                await client.get_reading_goals()
+                refreshed = True
+            ids = [goal_id] if goal_id is not None else goals.goal_ids()
+            result = {"goals": [goals.forecast(i, window_days) for i in ids], "refreshed": refreshed}
+            return json.dumps(result, indent=2)
+        except Exception:
+            logger.exception("Failed to forecast reading goals")
+            raise
+
+    @mcp.tool()
+    async def export_library(path: Optional[str] = None, format: str = "ndjson", incremental: bool = False) -> str:
+        """Export the whole library to a file in the server's exports directory for backup or analysis.
+        
+        Args:
+            path: File name inside the exports directory (default: a new timestamped name)
+            format: One of ndjson, csv, parquet or arrow
+            incremental: Only write books changed since the previous export
+        """
+        try:
+            result = await export(path, format, incremental)
+            return json.dumps(result, indent=2)
+        except Exception:
+            logger.exception("Failed to export library")
+            raise
+
+    @mcp.tool()
+    async def query_books(where: str = "", sort: Optional[str] = None, limit: int = 50) -> str:
+        """Search the whole library and return only matching books.
+        
+        Runs against a locally indexed copy of every bookshelf, so one call
+        replaces fetching shelves and filtering them by hand.
+        
+        Args:
+            where: Clauses joined by 'and', e.g. author = "Ursula K. Le Guin" and shelf != 3,
+                title ^= "The", shelf in (1, 2), date >= 2025-01-01. Fields: id, title, author,
+                isbn, shelf, shelf_name, date. Operators: =, !=, ^= (prefix), in (...),
+                not in (...), >, >=, <, <=. Text matching is case-insensitive.
+            sort: Field to sort by; prefix with '-' for descending (e.g. -date)
+            limit: Maximum number of books to return
+        """
+        try:
+            await index.refresh(client)
+            result = index.query(where, sort, limit)
+            return json.dumps(result, indent=2)
+        except Exception:
+            logger.exception("Failed to query books")
+            raise
+
+    @mcp.tool()
+    async def find_duplicates(threshold: float = 0.7, limit: int = 50) -> str:
+        """Find books entered more than once, on the same shelf or across shelves.
+        
+        Matches books by ISBN, by normalized title and author, and by similar
+        titles. Each cluster names the entry to keep and the remove_book and
+        move_book calls that would resolve it; books matched only by their
+        main title (the subtitle differs) or a similar title are listed for
+        review instead. Nothing is changed.
+        
+        Args:
+            threshold: Minimum title similarity (0-1) for books whose titles differ
+            limit: Maximum number of clusters to return, largest first
+        """
+        try:
+            await index.refresh(client)
+            result = duplicates.find(list(index.records.values()), index.shelf_names, threshold, limit)
+            return json.dumps(result, indent=2)
+        except Exception:
+            logger.exception("Failed to find duplicates")
+            raise
+
+    @mcp.tool()
+    async def similar_books(book_id: int, limit: int = 10, refresh: bool = True) -> str:
+        """Find the books in your library most similar to one book.
+        
+        Ranks every other book by shared title words, authors and shelf using
+        a local index, kept current as shelves are reloaded.
+        
+        Args:
+            book_id: ID of the book to compare against
+            limit: Maximum number of similar books to return
+            refresh: Reload shelves last read from Micro.blog more than a few minutes ago first
+        """
+        try:
+            if refresh or not similarity.loaded or book_id not in similarity.records:
+                # Books the refresh adds, moves or removes reach a loaded matrix through the index listener.
+                await index.refresh(client)
+            if not similarity.loaded:
+                similarity.load(index.records.values())
+            result = similarity.similar(book_id, limit, index.shelf_names)
+            return json.dumps(result, indent=2)
+        except Exception:
+            logger.exception("Failed to find similar books")
+            raise
+
+    @mcp.tool()
+    async def library_stats(
+        group_by: str = "summary", top: int = 20, bookshelf_id: Optional[int] = None, refresh: bool = True
+    ) -> str:
+        """Get counts and distributions over the whole library instead of raw book lists.
+        
+        Args:
+            group_by: summary (shelf sizes, top authors, books added per year), author (top
+                authors by book count), shelf, year or month (books added per period), or
+                shelf_month (each shelf's size over time, from when its books were added)
+            top: Number of authors to return for group_by=author
+            bookshelf_id: Only count books on this shelf
+            refresh: Reload shelves last read from Micro.blog more than a few minutes ago first
+        """
+        try:
+            if refresh or not columns.loaded:
+                # Books the refresh adds, moves or removes reach loaded columns through the index listener.
+                await index.refresh(client)
+            if not columns.loaded:
+                columns.load(index.records.values())
+            result = columns.stats(group_by, top, bookshelf_id, index.shelf_names)
+            return json.dumps(result, indent=2)
+        except Exception:
+            logger.exception("Failed to get library stats")
+            raise
+
+    @mcp.tool()
+    async def get_changes_since(cursor: Optional[str] = None, refresh: bool = True, limit: int = 500) -> str:
+        """Get books added, removed, moved or changed since a previous call.
+        
+        Pass the returned cursor to the next call to receive only newer changes.
+        A response with reset=true means the cursor is missing or too old and the
+        library should be reread in full.
+        
+        Args:
+            cursor: Cursor returned by the previous call; omit on the first call
+            refresh: Check Micro.blog for changes before answering
+            limit: Maximum number of changes to return (has_more is set if there are more)
+        """
+        try:
+            checked = await feed.refresh(client) if refresh or not feed.initialized else None
+            result = feed.changes_since(cursor, limit)
+            if checked is not None:
+                result["refresh"] = checked
+            return json.dumps(result, indent=2)
+        except Exception:
+            logger.exception("Failed to get changes")
+            raise
+
+    @mcp.tool()
+    async def start_job(
+        kind: str, ctx: Context, arguments: Optional[dict] = None, wait_seconds: float = 0
+    ) -> str:
+        """Start a whole-library operation in the background and return its job id.
+        
+        Use for work that may not finish within one tool call. Kinds:
+        export (path, format, incremental), audit (threshold, limit) and
+        bulk_move (where, bookshelf_id, dry_run), where 'where' is a
+        query_books expression. Follow up with job_status and job_result.
+        
+        Args:
+            kind: export, audit or bulk_move
+            arguments: Arguments for the job kind, e.g. {"where": "author = \"Ann Leckie\"", "bookshelf_id": 3}
+            wait_seconds: Wait up to this long for the job to finish, reporting progress meanwhile
+        """
+        try:
+            result = jobs.start(kind, arguments)
+            if wait_seconds > 0:
+                result = await wait_for_job(result["job_id"], wait_seconds, ctx)
+            return json.dumps(result, indent=2)
+        except Exception:
+            logger.exception("Failed to start job")
+            raise
+
+    @mcp.tool()
+    async def job_status(ctx: Context, job_id: Optional[str] = None, wait_seconds: float = 0) -> str:
+        """Get the status and progress of a background job, or list recent jobs.
+        
+        Args:
+            job_id: Job to check; omit to list recent jobs
+            wait_seconds: Wait up to this long for the job to finish, reporting progress meanwhile
+        """
+        try:
+            if job_id is None:
+                result = {"jobs": jobs.recent(), "kinds": jobs.kinds, **jobs.stats()}
+            elif wait_seconds > 0:
+                result = await wait_for_job(job_id, wait_seconds, ctx)
+            else:
+                result = jobs.status(job_id)
+            return json.dumps(result, indent=2)
+        except Exception:
+            logger.exception("Failed to get job status")
+            raise
+
+    @mcp.tool()
+    async def cancel_job(job_id: str) -> str:
+        """Cancel a queued or running background job.
+        
+        Changes a bulk_move already made are kept.
+        
+        Args:
+            job_id: Job to cancel
+        """
+        try:
+            result = await jobs.cancel(job_id)
+            return json.dumps(result, indent=2)
+        except Exception:
+            logger.exception("Failed to cancel job")
+            raise
+
+    @mcp.tool()
+    async def job_result(job_id: str) -> str:
+        """Get the result of a finished background job.
+        
+        Args:
+            job_id: Job whose result to return
+        """
+        try:
+            result = jobs.result(job_id)
+            return json.dumps(result, indent=2)
+        except Exception:
+            logger.exception("Failed to get job result")
+            raise
+
+    @mcp.tool()
+    async def get_write_queue_status(wait_seconds: float = 0) -> str:
+        """Get the flush state of queued write-behind mutations, including failures.
+        
+        Args:
+            wait_seconds: Wait up to this long for pending mutations to flush first
+        """
+        try:
+            if queue is None:
+                return json.dumps({"enabled": False}, indent=2)
+            queue.resume()
+            flushed = await queue.flush(wait_seconds) if wait_seconds > 0 else None
+            result = {"enabled": True, "flushed": flushed, **queue.status()}
+            return json.dumps(result, indent=2)
+        except Exception:
+            logger.exception("Failed to get write queue status")
+            raise
+
+    @mcp.tool()
+    async def get_prefetch_stats() -> str:
+        """Get shelf prefetch effectiveness: hit ratio, wasted prefetches and upstream calls saved."""
+        try:
+            if prefetcher is None:
+                return json.dumps({"enabled": False}, indent=2)
+            result = {"enabled": True, **prefetcher.stats()}
+            return json.dumps(result, indent=2)
+        except Exception:
+            logger.exception("Failed to get prefetch stats")
+            raise
+
+    @mcp.tool()
+    async def get_metrics() -> str:
+        """Get server gauges such as the current upstream concurrency limit."""
+        try:
+            result = {
+                "gauges": metrics_snapshot(),
+                "upstream_limiter": client.limiter.stats(),
+                "memory": accountant.stats(),
+                "mutation_locks": client.locks.stats(),
+                "idempotency": idempotency.stats(),
+                "jobs": jobs.stats(),
+            }
+            if hedger is not None:
+                result["hedging"] = hedger.stats()
+            return json.dumps(result, indent=2)
+        except Exception:
+            logger.exception("Failed to get metrics")
+            raise
+
+    @mcp.tool()
+    async def trim_memory(target_mb: Optional[float] = None) -> str:
+        """Evict cached shelves and analytics indexes to free memory now.
+        
+        Entries are evicted in the same order as when the memory budget is
+        exceeded; anything evicted is refetched or rebuilt when next used.
+        
+        Args:
+            target_mb: Trim until the estimated total is at most this many MB (default: half the budget)
+        """
+        try:
+            result = accountant.trim(int(target_mb * 1024 * 1024) if target_mb is not None else None)
+            result["evictions"] = accountant.evictions
+            return json.dumps(result, indent=2)
+        except Exception:
+            logger.exception("Failed to trim memory")
+            raise
+
+    @mcp.tool()
+    async def diagnostics(limit: int = 20, dump: bool = False) -> str:
+        """Get timing breakdowns of recent Micro.blog requests to see where slow calls spend time.
+        
+        Reports p50/p95 per phase (queue for a concurrency slot, connection pool,
+        connect including DNS, TLS, send, server wait, body receive), connection
+        reuse and response sizes.
+        
+        Args:
+            limit: Number of most recent requests to include
+            dump: Also write every buffered trace to a new JSON file in the server's state directory
+        """
+        try:
+            result = {"summary": client.traces.summary(), "recent": client.traces.recent(limit)}
+            if dump:
+                result["dumped_to"] = client.traces.dump(os.path.join(os.path.expanduser(state_dir), "traces"))
+            return json.dumps(result, indent=2)
+        except Exception:
+            logger.exception("Failed to get diagnostics")
+            raise
+
+    @mcp.tool()
+    async def get_profiles(tool: Optional[str] = None, top: int = 15) -> str:
+        """Get the hottest functions from saved tool-call profiles (requires --profile).
+        
+        Args:
+            tool: Only include profiles of this tool
+            top: Number of functions to list, ranked by time spent in the function itself
+        """
+        try:
+            if profiler is None:
+                return json.dumps({"enabled": False}, indent=2)
+            result = {"enabled": True, **profiler.summary(tool, top)}
+            return json.dumps(result, indent=2)
+        except Exception:
+            logger.exception("Failed to get profiles")
+            raise
+
+    return mcp
@@ -0,0 +1,151 @@
+"""Graceful shutdown: refuse new tool calls, drain running ones, then clean up.
+
+``graceful_lifespan`` is passed to FastMCP as its lifespan. On SIGTERM
+(sent by Claude Desktop when it restarts the server, or by the platform
+when a container is scaled down) the ``DrainMiddleware`` starts refusing
+tool calls, the ones already running get up to ``drain_timeout`` seconds
+to finish, and the server is then stopped. ``on_startup`` runs once the
+event loop is up, e.g. to resume work left by the previous run. When the
+server stops for any reason (including stdin closing) the ``on_shutdown``
+callback runs, e.g. to flush write queues and save a snapshot of warm state.
+
+Over HTTP, FastMCP enters its lifespan once per client session, so
+``http_app_with_lifespan`` runs one around the whole ASGI app instead.
+
+After a signal, the process then exits by re-raising it: the stdio
+transport reads stdin on a thread that cannot be interrupted, so waiting
+for a normal return would hang until the client closes the pipe.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import time
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Optional
+
+import anyio
+from fastmcp.exceptions import ToolError
+from fastmcp.server.middleware import Middleware
+
+from .logging_setup import flush_logging
+
+logger = logging.getLogger(__name__)
+
+# A drained call's result is written out after the middleware returns; give
+# the last responses this long to reach the client before stopping.
+RESPONSE_GRACE = 0.25
+
+
+class DrainMiddleware(Middleware):
+    """Counts running tool calls and refuses new ones once draining."""
+
+    def __init__(self) -> None:
+        self.draining = False
+        self.inflight = 0
+        self.refused = 0
+        self._idle: Optional[asyncio.Event] = None
+
+    async def on_call_tool(self, context, call_next):
+        if self.draining:
+            self.refused += 1
+            raise ToolError("The server is shutting down; retry the call once it has restarted")
+        self.inflight += 1
+        try:
+            return await call_next(context)
+        finally:
+            self.inflight -= 1
+            if not self.inflight and self._idle is not None:
+                self._idle.set()
+
+    async def drain(self, timeout: float) -> int:
+        """Stop accepting calls and wait up to ``timeout`` seconds for running ones. Returns those left."""
+        self.draining = True
+        deadline = time.monotonic() + timeout
+        while self.inflight:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                break
+            self._idle = asyncio.Event()
+            try:
+                await asyncio.wait_for(self._idle.wait(), left)
+            except asyncio.TimeoutError:
+                break
+        return self.inflight
+
+
+def graceful_lifespan(
+    drain: DrainMiddleware,
+    on_shutdown: Optional[Callable[[], Awaitable[None]]] = None,
+    drain_timeout: float = 10.0,
+    signals: tuple = (signal.SIGTERM,),
+    on_startup: Optional[Callable[[], Awaitable[None]]] = None,
+):
+    """A FastMCP lifespan that runs ``on_startup``, drains tool calls on ``signals`` and ``on_shutdown`` on exit."""
+
+    @asynccontextmanager
+    async def lifespan(server):
+        loop = asyncio.get_running_loop()
+        main = asyncio.current_task()
+        stopping: list = []
+
+        async def stop(name: str) -> None:
+            logger.info("Received %s, draining tool calls", name)
+            left = await drain.drain(drain_timeout)
+            if left:
+                logger.warning("Stopping with tool calls still running", extra={"inflight": left})
+            await asyncio.sleep(RESPONSE_GRACE)
+            main.cancel()
+
+        def on_signal(sig: signal.Signals) -> None:
+            if not stopping:
+                stopping.append(sig)
+                asyncio.ensure_future(stop(sig.name))
+
+        installed = []
+        for sig in signals:
+            try:
+                loop.add_signal_handler(sig, on_signal, sig)
+                installed.append(sig)
+            except (NotImplementedError, RuntimeError, ValueError):
+                pass  # Windows, or not the main thread: fall back to the default handler.
+        try:
+            if on_startup is not None:
+                await on_startup()
+            yield {}
+        finally:
+            for sig in installed:
+                loop.remove_signal_handler(sig)
+            # A transport that stops the server by cancelling its task group
+            # would otherwise cancel every await below.
+            with anyio.CancelScope(shield=True):
+                await drain.drain(drain_timeout)
+                if on_shutdown is not None:
+                    try:
+                        await on_shutdown()
+                    except Exception:
+                        logger.exception("Failed to shut down cleanly")
+            if stopping:
+                logger.info("Shutdown complete")
+                flush_logging()
+                signal.signal(stopping[0], signal.SIG_DFL)
+                os.kill(os.getpid(), stopping[0])
+
+    return lifespan
+
+
+def http_app_with_lifespan(server, lifespan, **kwargs):
+    """``server.http_app(**kwargs)`` with ``lifespan`` run once around the app rather than per session."""
+    app = server.http_app(**kwargs)
+    serve = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def combined(asgi_app):
+        # Drain inside the session manager, so running calls can still finish.
+        async with serve(asgi_app):
+            async with lifespan(server):
+                yield
+
+    app.router.lifespan_context = combined
+    return app
@@ -0,0 +1,69 @@
+"""Compact on-disk snapshot of warm state, saved at shutdown and loaded at start.
+
+The snapshot holds the shelf cache's payloads with their age and the
+change feed's state (book hashes, sequence log and conditional-request
+validators). Restoring them rebuilds the library index through the cache's
+listeners, keeps change cursors handed out before the restart valid, and
+lets the first refresh answer most shelves with 304 Not Modified.
+
+The file is gzipped JSON written atomically. It is only loaded for the
+same account, and it is deleted once loaded: after a crash there is no
+snapshot newer than the state the last run handed out, so the next start
+warms from scratch rather than from stale history.
+"""
+
+import gzip
+import hashlib
+import json
+import logging
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+MAX_SNAPSHOT_AGE = 7 * 86400.0
+
+
+def account_id(bearer_token: str) -> str:
+    """A stable, non-reversible id for the account a snapshot belongs to."""
+    return hashlib.sha256(bearer_token.encode("utf-8")).hexdigest()[:16]
+
+
+def save_snapshot(path: str, account: str, state: dict) -> int:
+    """Write ``state`` for ``account`` to ``path``. Returns the compressed size in bytes."""
+    target = Path(path).expanduser()
+    target.parent.mkdir(parents=True, exist_ok=True)
+    document = {"version": SNAPSHOT_VERSION, "account": account, "saved_at": time.time(), **state}
+    encoded = json.dumps(document, separators=(",", ":"), default=str).encode("utf-8")
+    temporary = target.with_name(target.name + ".tmp")
+    with gzip.open(temporary, "wb", compresslevel=6) as f:
+        f.write(encoded)
+    os.replace(temporary, target)
+    return target.stat().st_size
+
+
+def load_snapshot(path: str, account: str, max_age: float = MAX_SNAPSHOT_AGE) -> Optional[dict]:
+    """Read and delete the snapshot at ``path``, or return None if it is missing or unusable.
+
+    The returned dict has ``age``, the seconds since it was saved.
+    """
+    source = Path(path).expanduser()
+    if not source.exists():
+        return None
+    try:
+        with gzip.open(source, "rb") as f:
+            document = json.loads(f.read())
+    except (OSError, ValueError):
+        logger.warning("Ignoring unreadable snapshot %s", source, exc_info=True)
+        document = None
+    finally:
+        source.unlink(missing_ok=True)
+    if document is None or document.get("version") != SNAPSHOT_VERSION or document.get("account") != account:
+        return None
+    document["age"] = max(0.0, time.time() - document.get("saved_at", 0))
+    if document["age"] > max_age:
+        return None
+    return document
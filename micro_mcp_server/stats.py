@@ -0,0 +1,236 @@
+"""Library statistics from a columnar copy of the library.
+
+Books are stored as rows of NumPy column arrays (shelf, month added and
+dictionary-encoded authors), kept current from the LibraryIndex. Group-by
+counts, histograms and top-k lists are computed with ``bincount`` and
+``argpartition`` over those arrays and returned as compact summaries.
+
+Requires numpy (``pip install micro-mcp-server[analytics]``).
+"""
+
+import time
+from typing import Iterable, Optional
+
+from .memory import MemoryAccountant
+
+GROUP_BYS = ("summary", "author", "shelf", "year", "month", "shelf_month")
+MAX_AUTHORS = 4  # Authors beyond the fourth credited on a book are not counted.
+
+
+def _month_code(date_added: str) -> int:
+    """``year * 12 + month - 1`` for an ISO date, or -1 if there is none."""
+    try:
+        return int(date_added[:4]) * 12 + int(date_added[5:7]) - 1
+    except (TypeError, ValueError):
+        return -1
+
+
+def _month_label(code: int) -> str:
+    return f"{code // 12:04d}-{code % 12 + 1:02d}"
+
+
+class LibraryColumns:
+    """Column arrays over every book, updated as shelves change.
+
+    Removed books leave a free row that is reused by the next addition.
+    Like ``SimilarityIndex``, the columns are empty until ``load`` is called
+    and are unloaded if evicted by the ``accountant``.
+    """
+
+    def __init__(self, accountant: Optional[MemoryAccountant] = None) -> None:
+        self.loaded = False
+        self.authors: list = []
+        self._np = None
+        self._author_codes: dict = {}
+        self._rows: dict = {}
+        self._free: list = []
+        self._size = 0
+        self._load_seconds = 0.0
+        self._memory = accountant.pool("library_stats", lambda _: self.unload()) if accountant is not None else None
+
+    def _numpy(self):
+        if self._np is None:
+            try:
+                import numpy as np
+            except ImportError as e:
+                raise RuntimeError(
+                    "numpy is required for library_stats; install micro-mcp-server[analytics]"
+                ) from e
+            self._np = np
+        return self._np
+
+    def load(self, records: Iterable[dict]) -> None:
+        np = self._numpy()
+        started = time.monotonic()
+        records = [r for r in records if r.get("id") is not None]
+        capacity = max(1024, len(records))
+        self._valid = np.zeros(capacity, dtype=bool)
+        self._shelf = np.zeros(capacity, dtype=np.int64)
+        self._month = np.full(capacity, -1, dtype=np.int32)
+        self._author = np.full((capacity, MAX_AUTHORS), -1, dtype=np.int32)
+        self._rows, self._free, self._size = {}, [], 0
+        for record in records:
+            self.upsert(record)
+        self.loaded = True
+        self._load_seconds = time.monotonic() - started
+        self._charge()
+
+    def unload(self) -> None:
+        self.loaded = False
+        self._valid = self._shelf = self._month = self._author = None
+        self._rows, self._free, self._size = {}, [], 0
+        self.authors, self._author_codes = [], {}
+        if self._memory is not None:
+            self._memory.release("columns")
+
+    def _charge(self) -> None:
+        if self._memory is not None:
+            size = sum(a.nbytes for a in (self._valid, self._shelf, self._month, self._author))
+            size += len(self._rows) * 100 + len(self.authors) * 120
+            self._memory.charge("columns", size, max(self._load_seconds, 0.001))
+
+    def _grow(self) -> None:
+        np = self._numpy()
+        extra = len(self._valid)
+        self._valid = np.concatenate([self._valid, np.zeros(extra, dtype=bool)])
+        self._shelf = np.concatenate([self._shelf, np.zeros(extra, dtype=np.int64)])
+        self._month = np.concatenate([self._month, np.full(extra, -1, dtype=np.int32)])
+        self._author = np.concatenate([self._author, np.full((extra, MAX_AUTHORS), -1, dtype=np.int32)])
+
+    def _code(self, author: str) -> int:
+        code = self._author_codes.get(author.lower())
+        if code is None:
+            code = self._author_codes[author.lower()] = len(self.authors)
+            self.authors.append(author)
+        return code
+
+    def upsert(self, record: dict) -> None:
+        row = self._rows.get(record["id"])
+        if row is None:
+            if self._free:
+                row = self._free.pop()
+            else:
+                if self._size == len(self._valid):
+                    self._grow()
+                row = self._size
+                self._size += 1
+            self._rows[record["id"]] = row
+        authors = [a.strip() for a in (record.get("author") or "").split(",") if a.strip()][:MAX_AUTHORS]
+        self._valid[row] = True
+        self._shelf[row] = record["bookshelf_id"]
+        self._month[row] = _month_code(record.get("date_added") or "")
+        self._author[row] = [self._code(a) for a in authors] + [-1] * (MAX_AUTHORS - len(authors))
+
+    def remove(self, book_id: int) -> None:
+        row = self._rows.pop(book_id, None)
+        if row is not None:
+            self._valid[row] = False
+            self._free.append(row)
+
+    def on_shelf_change(self, bookshelf_id: int, added: list, removed: list) -> None:
+        """LibraryIndex listener: apply added, removed and moved books."""
+        if not self.loaded:
+            return
+        added_ids = {r["id"] for r in added}
+        for record in removed:
+            row = self._rows.get(record["id"])
+            if record["id"] not in added_ids and row is not None and self._shelf[row] == record["bookshelf_id"]:
+                self.remove(record["id"])
+        for record in added:
+            self.upsert(record)
+
+    def _top(self, counts, top: int) -> list:
+        """Indexes of the ``top`` largest non-zero counts, largest first."""
+        np = self._numpy()
+        nonzero = np.flatnonzero(counts)
+        if len(nonzero) > top > 0:
+            nonzero = nonzero[np.argpartition(-counts[nonzero], top - 1)[:top]]
+        order = np.lexsort((nonzero, -counts[nonzero]))
+        return [int(i) for i in nonzero[order][: max(0, top)]]
+
+    def _histogram(self, months, per_year: bool) -> dict:
+        np = self._numpy()
+        known = months[months >= 0]
+        if not len(known):
+            return {}
+        keys = known // 12 if per_year else known
+        base = int(keys.min())
+        counts = np.bincount(keys - base)
+        return {
+            (str(base + i) if per_year else _month_label(base + i)): int(c)
+            for i, c in enumerate(counts)
+            if c
+        }
+
+    def stats(
+        self,
+        group_by: str = "summary",
+        top: int = 20,
+        bookshelf_id: Optional[int] = None,
+        shelf_names: Optional[dict] = None,
+    ) -> dict:
+        np = self._numpy()
+        if group_by not in GROUP_BYS:
+            raise ValueError(f"Unknown group_by {group_by!r}; expected one of {', '.join(GROUP_BYS)}")
+        started = time.monotonic()
+        self._charge()
+        shelf_names = shelf_names or {}
+        mask = self._valid[: self._size]
+        if bookshelf_id is not None:
+            mask = mask & (self._shelf[: self._size] == bookshelf_id)
+        shelves = self._shelf[: self._size][mask]
+        months = self._month[: self._size][mask]
+        authors = self._author[: self._size][mask]
+        credited = authors[authors >= 0]
+        result: dict = {"books": int(mask.sum()), "group_by": group_by}
+        if bookshelf_id is not None:
+            result["bookshelf_id"] = bookshelf_id
+
+        def shelf_counts() -> list:
+            ids, counts = np.unique(shelves, return_counts=True)
+            order = np.argsort(-counts, kind="stable")
+            return [
+                {"bookshelf_id": int(ids[i]), "bookshelf_name": shelf_names.get(int(ids[i]), ""), "books": int(counts[i])}
+                for i in order
+            ]
+
+        def author_counts(limit: int) -> dict:
+            counts = np.bincount(credited, minlength=len(self.authors))
+            rows = [{"author": self.authors[i], "books": int(counts[i])} for i in self._top(counts, limit)]
+            distinct = int(np.count_nonzero(counts))
+            return {"distinct_authors": distinct, "top_authors": rows}
+
+        if group_by == "summary":
+            known = months[months >= 0]
+            result["shelves"] = shelf_counts()
+            result.update(author_counts(min(top, 10)))
+            result["books_without_author"] = int((authors[:, 0] < 0).sum())
+            result["books_without_date"] = int(len(months) - len(known))
+            if len(known):
+                result["first_added"] = _month_label(int(known.min()))
+                result["last_added"] = _month_label(int(known.max()))
+            result["added_per_year"] = self._histogram(months, per_year=True)
+        elif group_by == "author":
+            result.update(author_counts(top))
+        elif group_by == "shelf":
+            result["shelves"] = shelf_counts()
+        elif group_by in ("year", "month"):
+            result["added"] = self._histogram(months, per_year=group_by == "year")
+        else:
+            # Shelf sizes over time, from the dates books currently on each
+            # shelf were added; removals and moves are not in the history.
+            dated = months >= 0
+            result["shelf_sizes"] = {}
+            if dated.any():
+                base = int(months[dated].min())
+                span = int(months[dated].max()) - base + 1
+                ids, shelf_index = np.unique(shelves[dated], return_inverse=True)
+                grid = np.zeros((len(ids), span), dtype=np.int64)
+                np.add.at(grid, (shelf_index, months[dated] - base), 1)
+                sizes = grid.cumsum(axis=1)
+                for i, shelf in enumerate(ids):
+                    changed = np.flatnonzero(grid[i])
+                    name = shelf_names.get(int(shelf)) or str(int(shelf))
+                    result["shelf_sizes"][name] = {_month_label(base + int(m)): int(sizes[i, m]) for m in changed}
+        result["elapsed_ms"] = round((time.monotonic() - started) * 1000, 2)
+        return result
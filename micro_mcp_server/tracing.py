@@ -0,0 +1,157 @@
+"""Per-request phase timings for upstream HTTP calls."""
+
+import itertools
+import json
+import os
+import time
+from collections import deque
+from typing import Optional
+
+# httpcore trace events (minus the http11./http2. prefix) that end each phase.
+_PHASES = {
+    "connection.connect_tcp": "connect",
+    "connection.start_tls": "tls",
+    "send_request_headers": "send",
+    "send_request_body": "send",
+    "receive_response_headers": "wait",
+    "receive_response_body": "receive",
+}
+PHASES = ("queue", "pool", "connect", "tls", "send", "wait", "receive")
+
+
+class RequestTrace:
+    """Timings for one upstream request, filled in from httpcore trace events.
+
+    ``queue`` is time waiting for a concurrency slot, ``pool`` time until
+    httpcore started working on a connection, ``connect`` covers DNS and
+    TCP, ``wait`` is time to the response headers (server think time) and
+    ``receive`` the body transfer.
+    """
+
+    def __init__(self, method: str, path: str) -> None:
+        self.method = method
+        self.path = path
+        self.created = time.monotonic()
+        self.started = self.created
+        self.phases: dict = {}
+        self.status: Optional[int] = None
+        self.error: Optional[str] = None
+        self.bytes = 0
+        self.reused: Optional[bool] = None
+        self.total: Optional[float] = None
+        self.timestamp = time.time()
+        self._first_event: Optional[float] = None
+        self._open: dict = {}
+
+    def slot_acquired(self) -> None:
+        self.started = time.monotonic()
+        self.phases["queue"] = self.started - self.created
+
+    async def on_event(self, name: str, info: dict) -> None:
+        now = time.monotonic()
+        if self._first_event is None:
+            self._first_event = now
+            self.phases["pool"] = now - self.started
+        step, _, state = name.rpartition(".")
+        if not step.startswith("connection."):
+            step = step.split(".", 1)[-1]
+        phase = _PHASES.get(step)
+        if phase is None:
+            return
+        if phase == "connect":
+            self.reused = False
+        if state == "started":
+            self._open[step] = now
+        elif state in ("complete", "failed") and step in self._open:
+            self.phases[phase] = self.phases.get(phase, 0.0) + now - self._open.pop(step)
+
+    def finish(self, status: Optional[int] = None, size: int = 0, error: Optional[str] = None) -> None:
+        self.total = time.monotonic() - self.created
+        self.status = status
+        self.bytes = size
+        self.error = error
+        if self.reused is None and self._first_event is not None:
+            self.reused = True
+
+    def to_dict(self) -> dict:
+        return {
+            "timestamp": self.timestamp,
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "error": self.error,
+            "bytes": self.bytes,
+            "connection_reused": self.reused,
+            "total_ms": round(self.total * 1000, 1) if self.total is not None else None,
+            "phases_ms": {p: round(self.phases[p] * 1000, 1) for p in PHASES if p in self.phases},
+        }
+
+
+def _percentile(values: list, q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class TraceRecorder:
+    """Ring buffer of the most recent ``capacity`` request traces."""
+
+    def __init__(self, capacity: int = 500) -> None:
+        self._traces: deque = deque(maxlen=capacity)
+
+    def record(self, trace: RequestTrace) -> None:
+        self._traces.append(trace)
+
+    def estimated_bytes(self) -> int:
+        return len(self._traces) * 800
+
+    def recent(self, limit: int = 20) -> list:
+        return [t.to_dict() for t in list(self._traces)[-limit:]][::-1]
+
+    def summary(self) -> dict:
+        """p50/p95 per phase, plus connection reuse and error counts."""
+        traces = [t for t in self._traces if t.total is not None]
+        phases = {}
+        for phase in PHASES + ("total",):
+            values = [t.total if phase == "total" else t.phases[phase] for t in traces
+                      if phase == "total" or phase in t.phases]
+            if values:
+                phases[phase] = {
+                    "p50_ms": round(_percentile(values, 0.5) * 1000, 1),
+                    "p95_ms": round(_percentile(values, 0.95) * 1000, 1),
+                }
+        known = [t.reused for t in traces if t.reused is not None]
+        return {
+            "requests": len(traces),
+            "errors": sum(1 for t in traces if t.error or (t.status or 0) >= 400),
+            "connection_reuse_ratio": round(sum(known) / len(known), 3) if known else None,
+            "bytes_received": sum(t.bytes for t in traces),
+            "phases": phases,
+        }
+
+    def dump(self, directory: str, max_files: int = 20) -> str:
+        """Write the summary and every buffered trace to a new JSON file in ``directory``.
+
+        Only the newest ``max_files`` dumps are kept. Returns the file's path.
+        """
+        directory = os.path.expanduser(directory)
+        os.makedirs(directory, exist_ok=True)
+        data = {"summary": self.summary(), "traces": self.recent(len(self._traces))}
+        # Dumps in the same millisecond get increasing suffixes, so names still sort by age.
+        prefix = f"{int(time.time() * 1000):013d}-"
+        same_ms = [n[len(prefix):-len("-traces.json")] for n in os.listdir(directory) if n.startswith(prefix)]
+        first = max((int(n) + 1 for n in same_ms if n.isdigit()), default=0)
+        for n in itertools.count(first):
+            path = os.path.join(directory, f"{prefix}{n:03d}-traces.json")
+            try:
+                f = open(path, "x", encoding="utf-8")
+            except FileExistsError:
+                continue
+            with f:
+                json.dump(data, f, indent=2)
+            break
+        dumps = sorted((n for n in os.listdir(directory) if n.endswith("-traces.json")), reverse=True)
+        for old in dumps[max_files:]:
+            os.remove(os.path.join(directory, old))
+        return path
@@ -1,78 +1,352 @@
 #!/usr/bin/env python3
 """
 MCP Client to connect to the Modal-deployed MCP server and make tool calls.
+
+Run without arguments for an interactive menu, or use the ``load`` command
+to drive concurrent sessions against a deployment:
+
+    python mcp_client.py load --url https://your-app--modal-domain.modal.run --mix fan-out --rate 20
 """
 
+import argparse
 import asyncio
 import json
-from typing import Dict, Any
+import math
+import random
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
 import httpx
 from fastmcp import Client
 
 
 class MCPClient:
-    """Client for connecting to MCP server over HTTP."""
+    """Client for connecting to an MCP server over streamable HTTP.
+
+    Pass a shared ``httpx.AsyncClient`` to run many sessions over one
+    connection pool; otherwise the client creates and owns its own.
+    """
     
-    def __init__(self, server_url: str):
-        self.server_url = server_url.rstrip('/')
+    def __init__(self, server_url: str, http: Optional[httpx.AsyncClient] = None):
+        self.server_url = server_url.rstrip('/') + '/'
         self.session_id = None
+        self._http = http
+        self._owns_http = http is None
+        self._next_id = 0
+
+    async def __aenter__(self) -> "MCPClient":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        if self._owns_http and self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None:
+            self._http = httpx.AsyncClient(timeout=60, follow_redirects=True)
+        return self._http
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {"Accept": "application/json, text/event-stream"}
+        if self.session_id:
+            headers['mcp-session-id'] = self.session_id
+        return headers
+
+    async def _rpc(self, method: str, params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Send a JSON-RPC request and return its result."""
+        self._next_id += 1
+        request_id = self._next_id
+        response = await self._client().post(
+            self.server_url,
+            json={"jsonrpc": "2.0", "id": request_id, "method": method, "params": params or {}},
+            headers=self._headers(),
+        )
+        response.raise_for_status()
+        if 'mcp-session-id' in response.headers:
+            self.session_id = response.headers['mcp-session-id']
+
+        if response.headers.get('content-type', '').startswith('text/event-stream'):
+            messages = [
+                json.loads(line[5:])
+                for line in response.text.splitlines()
+                if line.startswith('data:')
+            ]
+        else:
+            messages = [response.json()]
+        for message in messages:
+            if message.get('id') == request_id:
+                if 'error' in message:
+                    raise RuntimeError(f"{method} failed: {message['error'].get('message')}")
+                return message.get('result', {})
+        raise RuntimeError(f"No response to {method}")
     
     async def initialize(self) -> Dict[str, Any]:
         """Initialize the MCP session."""
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                f"{self.server_url}/initialize",
-                json={
-                    "protocolVersion": "2024-11-05",
-                    "capabilities": {
-                        "tools": {}
-                    },
-                    "clientInfo": {
-                        "name": "mcp-client",
-                        "version": "1.0.0"
-                    }
+        result = await self._rpc(
+            "initialize",
+            {
+                "protocolVersion": "2025-03-26",
+                "capabilities": {},
+                "clientInfo": {
+                    "name": "mcp-client",
+                    "version": "1.0.0"
                 }
-            )
-            response.raise_for_status()
-            result = response.json()
-            self.session_id = response.headers.get('x-session-id')
-            return result
+            },
+        )
+        await self._client().post(
+            self.server_url,
+            json={"jsonrpc": "2.0", "method": "notifications/initialized"},
+            headers=self._headers(),
+        )
+        return result
     
     async def list_tools(self) -> Dict[str, Any]:
         """List available tools from the server."""
-        async with httpx.AsyncClient() as client:
-            headers = {}
-            if self.session_id:
-                headers['x-session-id'] = self.session_id
-                
-            response = await client.post(
-                f"{self.server_url}/tools/list",
-                json={},
-                headers=headers
-            )
-            response.raise_for_status()
-            return response.json()
+        return await self._rpc("tools/list")
     
     async def call_tool(self, tool_name: str, arguments: Dict[str, Any] = None) -> Dict[str, Any]:
         """Call a specific tool with given arguments."""
-        if arguments is None:
-            arguments = {}
-            
-        async with httpx.AsyncClient() as client:
-            headers = {}
-            if self.session_id:
-                headers['x-session-id'] = self.session_id
-                
-            response = await client.post(
-                f"{self.server_url}/tools/call",
-                json={
-                    "name": tool_name,
-                    "arguments": arguments
-                },
-                headers=headers
+        return await self._rpc("tools/call", {"name": tool_name, "arguments": arguments or {}})
+
+
+def tool_result_json(result: Dict[str, Any]) -> Any:
+    """Decode the JSON text content of a tools/call result."""
+    if result.get("isError"):
+        raise RuntimeError(result.get("content", [{}])[0].get("text", "tool error"))
+    content = result.get("content") or [{}]
+    return json.loads(content[0].get("text") or "null")
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[rank]
+
+
+class LoadGenerator:
+    """Open-loop load generator for an MCP server deployment.
+
+    Operations arrive as a Poisson process at ``rate`` per second regardless
+    of how quickly earlier ones complete, so server slowdowns show up as
+    queueing latency instead of silently lowering the offered load. All
+    sessions share one pooled ``httpx.AsyncClient``.
+    """
+
+    MIXES = ("read-heavy", "write-heavy", "fan-out")
+
+    def __init__(
+        self,
+        server_url: str,
+        mix: str = "read-heavy",
+        rate: float = 10.0,
+        duration: float = 30.0,
+        sessions: int = 10,
+        max_connections: int = 100,
+        max_in_flight: int = 1000,
+        seed: Optional[int] = None,
+    ):
+        if mix not in self.MIXES:
+            raise ValueError(f"Unknown mix '{mix}', expected one of {', '.join(self.MIXES)}")
+        self.server_url = server_url
+        self.mix = mix
+        self.rate = rate
+        self.duration = duration
+        self.sessions = sessions
+        self.max_in_flight = max_in_flight
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self.random = random.Random(seed)
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.error_samples: List[str] = []
+        self.dropped = 0
+        self.shelves: List[int] = []
+        self.books: List[Tuple[int, int, str]] = []
+        self.goals: List[Tuple[int, int, Optional[int]]] = []
+
+    async def _timed(self, name: str, coro) -> Any:
+        start = time.perf_counter()
+        try:
+            result = await coro
+        except Exception as e:
+            self.errors[name] += 1
+            if len(self.error_samples) < 10:
+                self.error_samples.append(f"{name}: {e}")
+            raise
+        finally:
+            self.latencies[name].append(time.perf_counter() - start)
+        return result
+
+    async def _call(self, client: MCPClient, tool: str, arguments: Dict[str, Any] = None) -> Any:
+        return await self._timed(tool, self._call_json(client, tool, arguments))
+
+    async def _call_json(self, client: MCPClient, tool: str, arguments: Dict[str, Any] = None) -> Any:
+        return tool_result_json(await client.call_tool(tool, arguments))
+
+    async def discover(self, client: MCPClient) -> None:
+        """Learn shelf, book and goal ids to build realistic tool arguments."""
+        shelves = await self._call_json(client, "get_bookshelves")
+        self.shelves = [item["id"] for item in shelves.get("items", [])]
+        for bookshelf_id in self.shelves[:5]:
+            books = await self._call_json(client, "get_bookshelf_books", {"bookshelf_id": bookshelf_id})
+            for item in books.get("items", [])[:20]:
+                self.books.append((bookshelf_id, item["id"], item.get("image") or ""))
+        goals = await self._call_json(client, "get_reading_goals")
+        for item in goals.get("items", []):
+            microblog = item.get("_microblog", {})
+            if "value" in microblog:
+                self.goals.append((item["id"], microblog["value"], microblog.get("progress")))
+
+    async def _read_op(self, client: MCPClient) -> None:
+        roll = self.random.random()
+        if roll < 0.6 and self.shelves:
+            await self._call(client, "get_bookshelf_books", {"bookshelf_id": self.random.choice(self.shelves)})
+        elif roll < 0.9:
+            await self._call(client, "get_bookshelves")
+        else:
+            await self._call(client, "get_reading_goals")
+
+    async def _write_op(self, client: MCPClient) -> None:
+        # Writes re-apply the current state (same shelf, cover or goal) so a
+        # load test never changes the library it runs against.
+        roll = self.random.random()
+        if roll < 0.3:
+            await self._read_op(client)
+        elif roll < 0.6 and self.books:
+            bookshelf_id, book_id, _ = self.random.choice(self.books)
+            await self._call(client, "move_book", {"book_id": book_id, "bookshelf_id": bookshelf_id})
+        elif roll < 0.85 and self.books and any(cover for _, _, cover in self.books):
+            bookshelf_id, book_id, cover = self.random.choice([b for b in self.books if b[2]])
+            await self._call(client, "change_book_cover", {"bookshelf_id": bookshelf_id, "book_id": book_id, "cover_url": cover})
+        elif self.goals:
+            goal_id, value, progress = self.random.choice(self.goals)
+            arguments = {"goal_id": goal_id, "value": value}
+            if progress is not None:
+                arguments["progress"] = progress
+            await self._call(client, "update_reading_goal", arguments)
+        else:
+            await self._read_op(client)
+
+    async def _fan_out_op(self, client: MCPClient) -> None:
+        async def fan_out():
+            shelves = await self._call(client, "get_bookshelves")
+            ids = [item["id"] for item in shelves.get("items", [])]
+            await asyncio.gather(
+                *(self._call(client, "get_bookshelf_books", {"bookshelf_id": i}) for i in ids)
             )
-            response.raise_for_status()
-            return response.json()
+
+        await self._timed("fan-out (total)", fan_out())
+
+    async def _operation(self, client: MCPClient) -> None:
+        op = {"read-heavy": self._read_op, "write-heavy": self._write_op, "fan-out": self._fan_out_op}[self.mix]
+        try:
+            await op(client)
+        except Exception:
+            pass  # Already counted by _timed
+
+    async def run(self) -> Dict[str, Any]:
+        """Run the load test and return a latency and error report."""
+        async with httpx.AsyncClient(limits=self.limits, timeout=60, follow_redirects=True) as http:
+            clients = [MCPClient(self.server_url, http) for _ in range(self.sessions)]
+            await asyncio.gather(*(c.initialize() for c in clients))
+            await self.discover(clients[0])
+
+            in_flight: set = set()
+            started = 0
+            start = time.perf_counter()
+            next_arrival = start
+            while True:
+                next_arrival += self.random.expovariate(self.rate)
+                if next_arrival - start >= self.duration:
+                    break
+                await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+                if len(in_flight) >= self.max_in_flight:
+                    self.dropped += 1
+                    continue
+                task = asyncio.create_task(self._operation(clients[started % len(clients)]))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+                started += 1
+            if in_flight:
+                await asyncio.wait(in_flight)
+            elapsed = time.perf_counter() - start
+        return self.report(started, elapsed)
+
+    def report(self, started: int, elapsed: float) -> Dict[str, Any]:
+        operations = {}
+        for name in sorted(set(self.latencies) | set(self.errors)):
+            values = sorted(self.latencies.get(name, []))
+            operations[name] = {
+                "count": len(values),
+                "errors": self.errors.get(name, 0),
+                "error_rate": round(self.errors.get(name, 0) / len(values), 4) if values else 0.0,
+                "p50_ms": round(percentile(values, 50) * 1000, 1),
+                "p90_ms": round(percentile(values, 90) * 1000, 1),
+                "p99_ms": round(percentile(values, 99) * 1000, 1),
+                "max_ms": round((values[-1] if values else 0.0) * 1000, 1),
+            }
+        total_calls = sum(len(v) for k, v in self.latencies.items() if not k.endswith("(total)"))
+        total_errors = sum(v for k, v in self.errors.items() if not k.endswith("(total)"))
+        return {
+            "url": self.server_url,
+            "mix": self.mix,
+            "offered_rate": self.rate,
+            "operations_started": started,
+            "dropped": self.dropped,
+            "elapsed_seconds": round(elapsed, 2),
+            "achieved_rate": round(started / self.duration, 2) if self.duration else 0.0,
+            "tool_calls": total_calls,
+            "error_rate": round(total_errors / total_calls, 4) if total_calls else 0.0,
+            "operations": operations,
+            "error_samples": self.error_samples,
+        }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"Mix: {report['mix']}  offered: {report['offered_rate']}/s  "
+          f"achieved: {report['achieved_rate']}/s  dropped: {report['dropped']}")
+    print(f"Tool calls: {report['tool_calls']}  error rate: {report['error_rate']:.2%}\n")
+    print(f"{'operation':<24}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, stats in report["operations"].items():
+        print(f"{name:<24}{stats['count']:>8}{stats['errors']:>8}{stats['p50_ms']:>10}"
+              f"{stats['p90_ms']:>10}{stats['p99_ms']:>10}{stats['max_ms']:>10}")
+    for sample in report["error_samples"]:
+        print(f"✗ {sample}")
+
+
+def normalize_server_url(server_url: str) -> str:
+    """Ensure the URL ends with /mcp/ for FastMCP."""
+    if not server_url.endswith('/mcp/'):
+        if server_url.endswith('/'):
+            server_url += 'mcp/'
+        else:
+            server_url += '/mcp/'
+    return server_url
+
+
+async def run_load(args: argparse.Namespace) -> None:
+    if args.mix == "write-heavy" and not args.allow_writes:
+        print("✗ Error: the write-heavy mix calls mutating tools; pass --allow-writes to confirm")
+        return
+    generator = LoadGenerator(
+        normalize_server_url(args.url),
+        mix=args.mix,
+        rate=args.rate,
+        duration=args.duration,
+        sessions=args.sessions,
+        max_connections=args.max_connections,
+        seed=args.seed,
+    )
+    report = await generator.run()
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
 
 
 async def main():
@@ -84,12 +358,7 @@ async def main():
         print("Error: Please provide a valid server URL")
         return
     
-    # Ensure URL ends with /mcp/ for FastMCP
-    if not server_url.endswith('/mcp/'):
-        if server_url.endswith('/'):
-            server_url += 'mcp/'
-        else:
-            server_url += '/mcp/'
+    server_url = normalize_server_url(server_url)
     
     def extract_content(result):
         """Extract text content from MCP response."""
@@ -314,6 +583,23 @@ async def main():
 
 
 if __name__ == "__main__":
-    print("MCP Client for Modal-deployed MCP Server")
-    print("=" * 40)
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="MCP Client for Modal-deployed MCP Server")
+    subparsers = parser.add_subparsers(dest="command")
+    load = subparsers.add_parser("load", help="Run a non-interactive load test")
+    load.add_argument("--url", required=True, help="Server URL (Modal app or local copy, e.g. http://localhost:8000)")
+    load.add_argument("--mix", choices=LoadGenerator.MIXES, default="read-heavy", help="Scripted tool-call mix")
+    load.add_argument("--rate", type=float, default=10.0, help="Operation arrivals per second (open loop)")
+    load.add_argument("--duration", type=float, default=30.0, help="Seconds to generate arrivals for")
+    load.add_argument("--sessions", type=int, default=10, help="Concurrent MCP sessions")
+    load.add_argument("--max-connections", type=int, default=100, help="Size of the shared connection pool")
+    load.add_argument("--seed", type=int, default=None, help="Random seed for reproducible arrivals")
+    load.add_argument("--allow-writes", action="store_true", help="Permit the write-heavy mix")
+    load.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    if args.command == "load":
+        asyncio.run(run_load(args))
+    else:
+        print("MCP Client for Modal-deployed MCP Server")
+        print("=" * 40)
+        asyncio.run(main())
\ No newline at end of file
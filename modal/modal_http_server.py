@@ -1,9 +1,22 @@
 import modal
 import json
+import os
+import sys
 import httpx
 from typing import Optional
 from urllib.parse import urljoin
 
+try:
+	from micro_mcp_server.idempotency import IdempotencyStore
+	from micro_mcp_server.logging_setup import ToolLoggingMiddleware, configure_logging, upstream_event_hooks
+	from micro_mcp_server.shutdown import DrainMiddleware, graceful_lifespan, http_app_with_lifespan
+except ImportError:
+	# Deploying or serving from inside modal/ rather than the repository root.
+	sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+	from micro_mcp_server.idempotency import IdempotencyStore
+	from micro_mcp_server.logging_setup import ToolLoggingMiddleware, configure_logging, upstream_event_hooks
+	from micro_mcp_server.shutdown import DrainMiddleware, graceful_lifespan, http_app_with_lifespan
+
 BASE_URL = "https://micro.blog"
 
 
@@ -20,7 +33,7 @@ class MicroBooksClient:
 
     async def get_bookshelves(self) -> dict:
         """Get all bookshelves."""
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_event_hooks()) as client:
             response = await client.get(
                 urljoin(BASE_URL, "/books/bookshelves"),
                 headers=self.headers,
@@ -30,7 +43,7 @@ class MicroBooksClient:
 
     async def get_bookshelf_books(self, bookshelf_id: int) -> dict:
         """Get books in a specific bookshelf."""
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_event_hooks()) as client:
             response = await client.get(
                 urljoin(BASE_URL, f"/books/bookshelves/{bookshelf_id}"),
                 headers=self.headers,
@@ -40,7 +53,7 @@ class MicroBooksClient:
 
     async def add_bookshelf(self, name: str) -> dict:
         """Add a new bookshelf."""
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_event_hooks()) as client:
             response = await client.post(
                 urljoin(BASE_URL, "/books/bookshelves"),
                 headers=self.headers,
@@ -51,7 +64,7 @@ class MicroBooksClient:
 
     async def rename_bookshelf(self, bookshelf_id: int, name: str) -> dict:
         """Rename a bookshelf."""
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_event_hooks()) as client:
             response = await client.post(
                 urljoin(BASE_URL, f"/books/bookshelves/{bookshelf_id}"),
                 headers=self.headers,
@@ -79,7 +92,7 @@ class MicroBooksClient:
         if cover_url:
             data["cover_url"] = cover_url
 
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_event_hooks()) as client:
             response = await client.post(
                 urljoin(BASE_URL, "/books"),
                 headers=self.headers,
@@ -90,7 +103,7 @@ class MicroBooksClient:
 
     async def move_book(self, book_id: int, bookshelf_id: int) -> dict:
         """Move a book to a different bookshelf."""
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_event_hooks()) as client:
             response = await client.post(
                 urljoin(BASE_URL, f"/books/bookshelves/{bookshelf_id}/assign"),
                 headers=self.headers,
@@ -101,7 +114,7 @@ class MicroBooksClient:
 
     async def remove_book(self, bookshelf_id: int, book_id: int) -> dict:
         """Remove a book from a bookshelf."""
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_event_hooks()) as client:
             response = await client.delete(
                 urljoin(BASE_URL, f"/books/bookshelves/{bookshelf_id}/remove/{book_id}"),
                 headers=self.headers,
@@ -111,7 +124,7 @@ class MicroBooksClient:
 
     async def change_book_cover(self, bookshelf_id: int, book_id: int, cover_url: str) -> dict:
         """Change the cover for a book."""
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_event_hooks()) as client:
             response = await client.post(
                 urljoin(BASE_URL, f"/books/bookshelves/{bookshelf_id}/cover/{book_id}"),
                 headers=self.headers,
@@ -122,7 +135,7 @@ class MicroBooksClient:
 
     async def get_reading_goals(self) -> dict:
         """Get reading goals."""
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_event_hooks()) as client:
             response = await client.get(
                 urljoin(BASE_URL, "/books/goals"),
                 headers=self.headers,
@@ -132,7 +145,7 @@ class MicroBooksClient:
 
     async def get_goal_progress(self, goal_id: int) -> dict:
         """Get books list progress toward a goal."""
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_event_hooks()) as client:
             response = await client.get(
                 urljoin(BASE_URL, f"/books/goals/{goal_id}"),
                 headers=self.headers,
@@ -146,7 +159,7 @@ class MicroBooksClient:
         if progress is not None:
             data["progress"] = str(progress)
 
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_event_hooks()) as client:
             response = await client.post(
                 urljoin(BASE_URL, f"/books/goals/{goal_id}"),
                 headers=self.headers,
@@ -155,7 +168,7 @@ class MicroBooksClient:
             response.raise_for_status()
             return {"success": True, "message": "Reading goal updated successfully"}
 
-image = modal.Image.debian_slim().pip_install("fastmcp")
+image = modal.Image.debian_slim().pip_install("fastmcp").add_local_python_source("micro_mcp_server")
 
 app = modal.App(image=image)
 
@@ -166,13 +179,25 @@ def fastmcp_app():
 	import os
 	from fastmcp import FastMCP
 
-	mcp = FastMCP()
+	configure_logging()
+	drain = DrainMiddleware()
+	mcp = FastMCP(middleware=[drain, ToolLoggingMiddleware()])
 	bearer_token = os.environ.get("MICRO_BLOG_BEARER_TOKEN")
 	
 	if not bearer_token:
 		raise ValueError("MICRO_BLOG_BEARER_TOKEN environment variable not found")
 	
 	client = MicroBooksClient(bearer_token)
+	# Container-local: a retry routed to another container is not recognized.
+	idempotency = IdempotencyStore(
+		os.path.join(os.environ.get("MICRO_BOOKS_STATE_DIR", "/tmp/micro-mcp-server"), "idempotency.sqlite3")
+	)
+
+	async def on_shutdown() -> None:
+		idempotency.close()
+
+	async def mutate(kind: str, idempotency_key: Optional[str] = None, **payload) -> dict:
+		return await idempotency.run(kind, payload, lambda: getattr(client, kind)(**payload), idempotency_key)
 
 	@mcp.tool()
 	async def get_bookshelves() -> str:
@@ -197,28 +222,30 @@ def fastmcp_app():
 			raise
 
 	@mcp.tool()
-	async def add_bookshelf(name: str) -> str:
+	async def add_bookshelf(name: str, idempotency_key: Optional[str] = None) -> str:
 		"""Add a new bookshelf.
 		
 		Args:
 			name: The name of the new bookshelf
+			idempotency_key: Send the same key when retrying so the change is applied only once (optional)
 		"""
 		try:
-			result = await client.add_bookshelf(name)
+			result = await mutate("add_bookshelf", idempotency_key, name=name)
 			return json.dumps(result, indent=2)
 		except Exception:
 			raise
 
 	@mcp.tool()
-	async def rename_bookshelf(bookshelf_id: int, name: str) -> str:
+	async def rename_bookshelf(bookshelf_id: int, name: str, idempotency_key: Optional[str] = None) -> str:
 		"""Rename a bookshelf.
 		
 		Args:
 			bookshelf_id: The ID of the bookshelf to rename
 			name: The new name for the bookshelf
+			idempotency_key: Send the same key when retrying so the change is applied only once (optional)
 		"""
 		try:
-			result = await client.rename_bookshelf(bookshelf_id, name)
+			result = await mutate("rename_bookshelf", idempotency_key, bookshelf_id=bookshelf_id, name=name)
 			return json.dumps(result, indent=2)
 		except Exception:
 			raise
@@ -230,6 +257,7 @@ def fastmcp_app():
 		bookshelf_id: int,
 		isbn: Optional[str] = None,
 		cover_url: Optional[str] = None,
+		idempotency_key: Optional[str] = None,
 	) -> str:
 		"""Add a new book.
 		
@@ -239,52 +267,68 @@ def fastmcp_app():
 			bookshelf_id: The ID of the bookshelf to add the book to
 			isbn: The ISBN of the book (optional)
 			cover_url: URL to the book cover image (optional)
+			idempotency_key: Send the same key when retrying so the change is applied only once (optional)
 		"""
 		try:
-			result = await client.add_book(title, author, bookshelf_id, isbn, cover_url)
+			result = await mutate(
+				"add_book",
+				idempotency_key,
+				title=title,
+				author=author,
+				bookshelf_id=bookshelf_id,
+				isbn=isbn,
+				cover_url=cover_url,
+			)
 			return json.dumps(result, indent=2)
 		except Exception:
 			raise
 
 	@mcp.tool()
-	async def move_book(book_id: int, bookshelf_id: int) -> str:
+	async def move_book(book_id: int, bookshelf_id: int, idempotency_key: Optional[str] = None) -> str:
 		"""Move a book to a different bookshelf.
 		
 		Args:
 			book_id: The ID of the book to move
 			bookshelf_id: The ID of the target bookshelf
+			idempotency_key: Send the same key when retrying so the change is applied only once (optional)
 		"""
 		try:
-			result = await client.move_book(book_id, bookshelf_id)
+			result = await mutate("move_book", idempotency_key, book_id=book_id, bookshelf_id=bookshelf_id)
 			return json.dumps(result, indent=2)
 		except Exception:
 			raise
 
 	@mcp.tool()
-	async def remove_book(bookshelf_id: int, book_id: int) -> str:
+	async def remove_book(bookshelf_id: int, book_id: int, idempotency_key: Optional[str] = None) -> str:
 		"""Remove a book from a bookshelf.
 		
 		Args:
 			bookshelf_id: The ID of the bookshelf
 			book_id: The ID of the book to remove
+			idempotency_key: Send the same key when retrying so the change is applied only once (optional)
 		"""
 		try:
-			result = await client.remove_book(bookshelf_id, book_id)
+			result = await mutate("remove_book", idempotency_key, bookshelf_id=bookshelf_id, book_id=book_id)
 			return json.dumps(result, indent=2)
 		except Exception:
 			raise
 
 	@mcp.tool()
-	async def change_book_cover(bookshelf_id: int, book_id: int, cover_url: str) -> str:
+	async def change_book_cover(
+		bookshelf_id: int, book_id: int, cover_url: str, idempotency_key: Optional[str] = None
+	) -> str:
 		"""Change the cover for a book.
 		
 		Args:
 			bookshelf_id: The ID of the bookshelf
 			book_id: The ID of the book
 			cover_url: URL to the new cover image
+			idempotency_key: Send the same key when retrying so the change is applied only once (optional)
 		"""
 		try:
-			result = await client.change_book_cover(bookshelf_id, book_id, cover_url)
+			result = await mutate(
+				"change_book_cover", idempotency_key, bookshelf_id=bookshelf_id, book_id=book_id, cover_url=cover_url
+			)
 			return json.dumps(result, indent=2)
 		except Exception:
 			raise
@@ -312,18 +356,34 @@ def fastmcp_app():
 			raise
 
 	@mcp.tool()
-	async def update_reading_goal(goal_id: int, value: int, progress: Optional[int] = None) -> str:
+	async def update_reading_goal(
+		goal_id: int, value: int, progress: Optional[int] = None, idempotency_key: Optional[str] = None
+	) -> str:
 		"""Update reading goal.
 		
 		Args:
 			goal_id: The ID of the reading goal
 			value: The target number of books for the goal
 			progress: The current progress (number of books read, optional)
+			idempotency_key: Send the same key when retrying so the change is applied only once (optional)
 		"""
 		try:
-			result = await client.update_reading_goal(goal_id, value, progress)
+			result = await mutate(
+				"update_reading_goal", idempotency_key, goal_id=goal_id, value=value, progress=progress
+			)
 			return json.dumps(result, indent=2)
 		except Exception:
 			raise
 
-	return mcp.http_app()
+	# Modal stops a container by ending the ASGI lifespan, and owns its signals.
+	return http_app_with_lifespan(mcp, graceful_lifespan(drain, on_shutdown, signals=()))
+
+
+if __name__ == "__main__":
+	# Serve a local copy of the app, e.g. as a load-test target:
+	#   MICRO_BLOG_BEARER_TOKEN=... python modal_http_server.py 8000
+	import sys
+
+	import uvicorn
+
+	uvicorn.run(fastmcp_app.local(), port=int(sys.argv[1]) if len(sys.argv) > 1 else 8000)
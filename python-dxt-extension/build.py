@@ -1,124 +1,286 @@
 #!/usr/bin/env python3
 """
 Build script to package the Python DXT extension with bundled dependencies.
+
+The bundle is optimized for cold start: dependencies are installed once,
+stripped of tests, build leftovers and modules a stdio server never imports,
+and precompiled to hash-based .pyc files so Claude Desktop does not compile
+them on every launch. Entries are written in sorted order with fixed
+timestamps and permissions, so the same inputs produce the same .dxt.
+
+After packaging, the script measures how long server/main.py takes to
+import from the bundled tree and writes a size and import-time report.
 """
 
+import argparse
+import ast
+import compileall
+import fnmatch
+import json
 import os
+import py_compile
 import shutil
+import statistics
 import subprocess
 import sys
 import tempfile
 import zipfile
 from pathlib import Path
 
+# Paths under lib/ that are dropped from the bundle (glob patterns, matched
+# against the path relative to lib/ and against each file or directory name).
+PRUNE_PATHS = [
+    "bin",
+    "pip", "pip-*",
+    "setuptools", "setuptools-*",
+    "wheel", "wheel-*",
+    "_distutils_hack", "pkg_resources",
+    "*.pth",
+    # Only used by the `fastmcp` command-line tool, never by a server.
+    "fastmcp/cli",
+    "cyclopts", "cyclopts-*",
+]
+PRUNE_NAMES = ["__pycache__", "tests", "test", "*.pyc", "*.pyi", "py.typed", "*.pyx", "*.pxd", "*.c", "*.h"]
+# Files in *.dist-info that nothing reads at runtime. METADATA (used by
+# importlib.metadata.version), entry points and licenses are kept.
+PRUNE_DIST_INFO = ["RECORD", "INSTALLER", "REQUESTED", "direct_url.json", "WHEEL"]
+# pygments is pulled in by rich; tracebacks only ever highlight Python.
+PYGMENTS_LEXERS_KEPT = {"__init__.py", "_mapping.py", "python.py", "special.py"}
+
+EXTENSION_FILES = ["manifest.json", "requirements.txt", "README.md", "icon.svg", "check_compatibility.py"]
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+# micro_mcp_server modules server/main.py imports; the modules they import
+# from the package are bundled too.
+SHARED_MODULES = ["logging_setup", "idempotency", "shutdown"]
+
+
+def install_dependencies(current_dir: Path, lib_path: Path) -> None:
+    print("Installing Python packages...")
+    subprocess.run([
+        sys.executable, "-m", "pip", "install",
+        "-r", str(current_dir / "requirements.txt"),
+        "--target", str(lib_path),
+        "--no-compile",
+        "--disable-pip-version-check",
+    ], check=True)
+
+
+def shared_modules(package: Path, entries: list) -> list:
+    """``entries`` plus every module of ``package`` they import relatively, and ``__init__``."""
+    found = {"__init__"}
+    pending = list(entries)
+    while pending:
+        name = pending.pop()
+        if name in found:
+            continue
+        found.add(name)
+        tree = ast.parse((package / f"{name}.py").read_text(encoding="utf-8"))
+        for node in ast.walk(tree):
+            if isinstance(node, ast.ImportFrom) and node.level == 1:
+                if node.module:
+                    pending.append(node.module.split(".")[0])
+                else:  # from . import a, b
+                    pending.extend(alias.name for alias in node.names)
+    return sorted(found)
+
+
+def _tree_size(path: Path) -> int:
+    if path.is_file():
+        return path.stat().st_size
+    return sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+
+
+def _remove(path: Path) -> int:
+    size = _tree_size(path)
+    if path.is_dir():
+        shutil.rmtree(path)
+    else:
+        path.unlink()
+    return size
+
+
+def prune(lib_path: Path) -> int:
+    """Remove files the server never needs. Returns the number of bytes removed."""
+    removed = 0
+    for path in sorted(lib_path.rglob("*"), key=lambda p: len(p.parts)):
+        if not path.exists() and not path.is_symlink():
+            continue
+        rel = path.relative_to(lib_path).as_posix()
+        if any(fnmatch.fnmatch(rel, pattern) for pattern in PRUNE_PATHS):
+            removed += _remove(path)
+        elif any(fnmatch.fnmatch(path.name, pattern) for pattern in PRUNE_NAMES):
+            removed += _remove(path)
+        elif path.parent.name.endswith(".dist-info") and path.name in PRUNE_DIST_INFO:
+            removed += _remove(path)
+        elif rel.startswith("pygments/lexers/") and path.name not in PYGMENTS_LEXERS_KEPT:
+            removed += _remove(path)
+    return removed
+
+
+def precompile(stage: Path) -> int:
+    """Compile every module to an unchecked hash-based .pyc. Returns the number compiled."""
+    ok = compileall.compile_dir(
+        str(stage),
+        quiet=1,
+        stripdir=str(stage),  # keep the build directory out of co_filename
+        workers=1,
+        invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+    )
+    if not ok:
+        raise SystemExit("Bytecode compilation failed")
+    return sum(1 for _ in stage.rglob("*.pyc"))
+
+
+def write_bundle(stage: Path, output_path: Path, store: bool) -> None:
+    compression = zipfile.ZIP_STORED if store else zipfile.ZIP_DEFLATED
+    files = sorted(p for p in stage.rglob("*") if p.is_file())
+    with zipfile.ZipFile(output_path, "w") as zf:
+        for path in files:
+            info = zipfile.ZipInfo(path.relative_to(stage).as_posix(), date_time=ZIP_EPOCH)
+            info.compress_type = compression
+            info.external_attr = 0o644 << 16
+            with open(path, "rb") as f:
+                zf.writestr(info, f.read(), compress_type=compression, compresslevel=None if store else 9)
+
+
+def measure_import(stage: Path, runs: int) -> list:
+    """Time importing server/main.py from the staged bundle in fresh interpreters."""
+    probe = (
+        "import importlib.util, time\n"
+        "start = time.perf_counter()\n"
+        "spec = importlib.util.spec_from_file_location('main', 'server/main.py')\n"
+        "spec.loader.exec_module(importlib.util.module_from_spec(spec))\n"
+        "print(time.perf_counter() - start)\n"
+    )
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join([str(stage / "lib"), str(stage)]),
+        "PYTHONDONTWRITEBYTECODE": "1",
+        "MICRO_BLOG_BEARER_TOKEN": "build-report",
+    }
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", probe], cwd=stage, env=env, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            print(result.stderr, file=sys.stderr)
+            raise SystemExit("server/main.py failed to import from the bundle; check PRUNE_PATHS")
+        timings.append(float(result.stdout.strip().splitlines()[-1]) * 1000)
+    return timings
+
+
+def build_report(stage: Path, output_path: Path, pruned: int, pyc_count: int, store: bool, timings: list) -> dict:
+    lib_path = stage / "lib"
+    packages = {}
+    for item in lib_path.iterdir():
+        if not item.name.endswith(".dist-info"):
+            packages[item.name] = _tree_size(item)
+    largest = sorted(packages.items(), key=lambda kv: kv[1], reverse=True)[:10]
+    return {
+        "bundle": output_path.name,
+        "bundle_bytes": output_path.stat().st_size,
+        "uncompressed_bytes": _tree_size(stage),
+        "pruned_bytes": pruned,
+        "files": sum(1 for p in stage.rglob("*") if p.is_file()),
+        "pyc_files": pyc_count,
+        "bytecode_tag": sys.implementation.cache_tag,
+        "compression": "stored" if store else "deflated",
+        "import_ms": {
+            "median": round(statistics.median(timings), 1),
+            "min": round(min(timings), 1),
+            "runs": len(timings),
+        },
+        "largest_packages": [{"name": name, "bytes": size} for name, size in largest],
+    }
+
+
 def main():
     """Build the Python DXT extension."""
+    parser = argparse.ArgumentParser(description="Build the Python DXT extension")
+    parser.add_argument("--store", action="store_true",
+                        help="Write uncompressed entries: a larger file that extracts faster")
+    parser.add_argument("--lib", type=Path,
+                        help="Bundle this already-installed dependency directory instead of running pip")
+    parser.add_argument("--import-runs", type=int, default=5, help="Fresh interpreters used to time the import")
+    parser.add_argument("--max-import-ms", type=float, help="Fail if the median import time exceeds this")
+    parser.add_argument("--max-size-mb", type=float, help="Fail if the .dxt file exceeds this size")
+    args = parser.parse_args()
+
     print("Building Python DXT extension...")
-    
+
     # Get current directory
-    current_dir = Path(__file__).parent
+    current_dir = Path(__file__).parent.resolve()
     output_path = current_dir / "micro-blog-books-python.dxt"
-    
+    report_path = current_dir / "build-report.json"
+
     # Remove existing package
     if output_path.exists():
         output_path.unlink()
-    
-    print("Installing dependencies to temporary directory...")
-    
-    # Create a temporary directory for the build
+
     with tempfile.TemporaryDirectory() as temp_dir:
-        temp_path = Path(temp_dir)
-        lib_path = temp_path / "lib"
-        
-        # Install dependencies directly to lib directory
-        print("Installing Python packages...")
-        subprocess.run([
-            sys.executable, "-m", "pip", "install", 
-            "-r", str(current_dir / "requirements.txt"),
-            "--target", str(lib_path),
-            "--no-deps"  # Install without dependencies to avoid conflicts
-        ], check=True)
-        
-        # Then install with dependencies
-        subprocess.run([
-            sys.executable, "-m", "pip", "install", 
-            "-r", str(current_dir / "requirements.txt"),
-            "--target", str(lib_path)
-        ], check=True)
-        
-        # Create the DXT package
+        stage = Path(temp_dir)
+        lib_path = stage / "lib"
+
+        if args.lib:
+            print(f"Copying dependencies from {args.lib}...")
+            shutil.copytree(args.lib, lib_path)
+        else:
+            install_dependencies(current_dir, lib_path)
+
+        # Shared with the stdio and Modal servers (structured logging, idempotency keys, graceful shutdown).
+        package = current_dir.parent / "micro_mcp_server"
+        (lib_path / "micro_mcp_server").mkdir()
+        for name in shared_modules(package, SHARED_MODULES):
+            shutil.copy2(package / f"{name}.py", lib_path / "micro_mcp_server" / f"{name}.py")
+
+        pruned = prune(lib_path)
+        print(f"  ✓ Pruned {pruned:,} bytes of tests, build leftovers and unused modules")
+
+        for name in EXTENSION_FILES:
+            if (current_dir / name).exists():
+                shutil.copy2(current_dir / name, stage / name)
+        (stage / "server").mkdir()
+        shutil.copy2(current_dir / "server" / "main.py", stage / "server" / "main.py")
+
+        pyc_count = precompile(stage)
+        print(f"  ✓ Precompiled {pyc_count:,} modules for {sys.implementation.cache_tag}")
+
         print("Creating DXT package...")
-        with zipfile.ZipFile(output_path, 'w', zipfile.ZIP_DEFLATED, compresslevel=6) as zf:
-            # Add manifest.json
-            zf.write(current_dir / "manifest.json", "manifest.json")
-            print("  Added: manifest.json")
-            
-            # Add requirements.txt
-            zf.write(current_dir / "requirements.txt", "requirements.txt")
-            print("  Added: requirements.txt")
-            
-            # Add server files
-            zf.write(current_dir / "server" / "main.py", "server/main.py")
-            print("  Added: server/main.py")
-            
-            # Add README if it exists
-            readme_path = current_dir / "README.md"
-            if readme_path.exists():
-                zf.write(readme_path, "README.md")
-                print("  Added: README.md")
-            
-            # Add icon if it exists
-            icon_path = current_dir / "icon.svg"
-            if icon_path.exists():
-                zf.write(icon_path, "icon.svg")
-                print("  Added: icon.svg")
-            
-            # Add compatibility checker
-            compat_path = current_dir / "check_compatibility.py"
-            if compat_path.exists():
-                zf.write(compat_path, "check_compatibility.py")
-                print("  Added: check_compatibility.py")
-            
-            # Bundle the dependencies from lib directory
-            if lib_path.exists():
-                print("  Bundling Python dependencies...")
-                for item in lib_path.iterdir():
-                    # Skip unnecessary files
-                    if item.name in ['pip', 'setuptools', 'wheel', '_distutils_hack', 'distutils-precedence.pth']:
-                        continue
-                    if item.name.startswith('pip-') or item.name.startswith('setuptools-'):
-                        continue
-                    if item.suffix in ['.pth', '.pyc']:
-                        continue
-                    
-                    if item.is_file():
-                        zf.write(item, f"lib/{item.name}")
-                    elif item.is_dir():
-                        for root, dirs, files in os.walk(item):
-                            # Skip __pycache__ directories
-                            dirs[:] = [d for d in dirs if d != '__pycache__']
-                            
-                            for file in files:
-                                # Skip .pyc files
-                                if file.endswith('.pyc'):
-                                    continue
-                                
-                                file_path = Path(root) / file
-                                arcname = f"lib/{file_path.relative_to(lib_path)}"
-                                zf.write(file_path, arcname)
-                
-                print("  ✓ Bundled all Python dependencies")
-            else:
-                print("  ⚠ Warning: Could not find lib directory")
-    
+        write_bundle(stage, output_path, args.store)
+
+        print("Measuring server/main.py import time...")
+        timings = measure_import(stage, args.import_runs)
+        report = build_report(stage, output_path, pruned, pyc_count, args.store, timings)
+
+    report_path.write_text(json.dumps(report, indent=2) + "\n")
+
     print(f"✓ Extension packaged: {output_path.name}")
-    print(f"  Total size: {output_path.stat().st_size:,} bytes")
+    print(f"  Total size: {report['bundle_bytes']:,} bytes ({report['compression']}, "
+          f"{report['uncompressed_bytes']:,} bytes unpacked, {report['files']:,} files)")
+    print(f"  Import time: {report['import_ms']['median']} ms median over {len(timings)} runs")
+    print("  Largest packages:")
+    for package in report["largest_packages"][:5]:
+        print(f"    {package['name']:<28}{package['bytes']:>12,} bytes")
+    print(f"  Report: {report_path}")
     print(f"  Location: {output_path}")
+
+    failures = []
+    if args.max_import_ms is not None and report["import_ms"]["median"] > args.max_import_ms:
+        failures.append(f"import time {report['import_ms']['median']} ms exceeds {args.max_import_ms} ms")
+    if args.max_size_mb is not None and report["bundle_bytes"] > args.max_size_mb * 1024 * 1024:
+        failures.append(f"bundle size exceeds {args.max_size_mb} MB")
+    if failures:
+        for failure in failures:
+            print(f"✗ Budget exceeded: {failure}", file=sys.stderr)
+        sys.exit(1)
+
     print("\nTo install:")
     print("1. Open Claude Desktop")
     print("2. Go to Settings → Extensions")
     print("3. Click 'Install Extension'")
     print(f"4. Select: {output_path}")
 
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -22,11 +22,23 @@ if sys.version_info < (3, 10):
 import httpx
 from fastmcp import FastMCP
 
+try:
+    from micro_mcp_server.idempotency import IdempotencyStore
+    from micro_mcp_server.logging_setup import ToolLoggingMiddleware, configure_logging, upstream_event_hooks
+    from micro_mcp_server.shutdown import DrainMiddleware, graceful_lifespan
+except ImportError:
+    # Running from a source checkout rather than a built bundle.
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+    from micro_mcp_server.idempotency import IdempotencyStore
+    from micro_mcp_server.logging_setup import ToolLoggingMiddleware, configure_logging, upstream_event_hooks
+    from micro_mcp_server.shutdown import DrainMiddleware, graceful_lifespan
+
 # Set up logging
-logging.basicConfig(level=logging.INFO)
+configure_logging()
 logger = logging.getLogger(__name__)
 
 BASE_URL = "https://micro.blog"
+STATE_DIR = os.environ.get("MICRO_BOOKS_STATE_DIR", "~/.micro-mcp-server")
 
 
 class MicroBooksClient:
@@ -42,7 +54,7 @@ class MicroBooksClient:
 
     async def get_bookshelves(self) -> dict:
         """Get all bookshelves."""
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_event_hooks()) as client:
             response = await client.get(
                 urljoin(BASE_URL, "/books/bookshelves"),
                 headers=self.headers,
@@ -52,7 +64,7 @@ class MicroBooksClient:
 
     async def get_bookshelf_books(self, bookshelf_id: int) -> dict:
         """Get books in a specific bookshelf."""
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_event_hooks()) as client:
             response = await client.get(
                 urljoin(BASE_URL, f"/books/bookshelves/{bookshelf_id}"),
                 headers=self.headers,
@@ -62,7 +74,7 @@ class MicroBooksClient:
 
     async def add_bookshelf(self, name: str) -> dict:
         """Add a new bookshelf."""
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_event_hooks()) as client:
             response = await client.post(
                 urljoin(BASE_URL, "/books/bookshelves"),
                 headers=self.headers,
@@ -73,7 +85,7 @@ class MicroBooksClient:
 
     async def rename_bookshelf(self, bookshelf_id: int, name: str) -> dict:
         """Rename a bookshelf."""
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_event_hooks()) as client:
             response = await client.post(
                 urljoin(BASE_URL, f"/books/bookshelves/{bookshelf_id}"),
                 headers=self.headers,
@@ -101,7 +113,7 @@ class MicroBooksClient:
         if cover_url:
             data["cover_url"] = cover_url
 
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_event_hooks()) as client:
             response = await client.post(
                 urljoin(BASE_URL, "/books"),
                 headers=self.headers,
@@ -112,7 +124,7 @@ class MicroBooksClient:
 
     async def move_book(self, book_id: int, bookshelf_id: int) -> dict:
         """Move a book to a different bookshelf."""
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_event_hooks()) as client:
             response = await client.post(
                 urljoin(BASE_URL, f"/books/bookshelves/{bookshelf_id}/assign"),
                 headers=self.headers,
@@ -123,7 +135,7 @@ class MicroBooksClient:
 
     async def remove_book(self, bookshelf_id: int, book_id: int) -> dict:
         """Remove a book from a bookshelf."""
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_event_hooks()) as client:
             response = await client.delete(
                 urljoin(BASE_URL, f"/books/bookshelves/{bookshelf_id}/remove/{book_id}"),
                 headers=self.headers,
@@ -133,7 +145,7 @@ class MicroBooksClient:
 
     async def change_book_cover(self, bookshelf_id: int, book_id: int, cover_url: str) -> dict:
         """Change the cover for a book."""
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_event_hooks()) as client:
             response = await client.post(
                 urljoin(BASE_URL, f"/books/bookshelves/{bookshelf_id}/cover/{book_id}"),
                 headers=self.headers,
@@ -144,7 +156,7 @@ class MicroBooksClient:
 
     async def get_reading_goals(self) -> dict:
         """Get reading goals."""
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_event_hooks()) as client:
             response = await client.get(
                 urljoin(BASE_URL, "/books/goals"),
                 headers=self.headers,
@@ -154,7 +166,7 @@ class MicroBooksClient:
 
     async def get_goal_progress(self, goal_id: int) -> dict:
         """Get books list progress toward a goal."""
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_event_hooks()) as client:
             response = await client.get(
                 urljoin(BASE_URL, f"/books/goals/{goal_id}"),
                 headers=self.headers,
@@ -168,7 +180,7 @@ class MicroBooksClient:
         if progress is not None:
             data["progress"] = str(progress)
 
-        async with httpx.AsyncClient() as client:
+        async with httpx.AsyncClient(event_hooks=upstream_event_hooks()) as client:
             response = await client.post(
                 urljoin(BASE_URL, f"/books/goals/{goal_id}"),
                 headers=self.headers,
@@ -180,8 +192,23 @@ class MicroBooksClient:
 
 def create_server(bearer_token: str) -> FastMCP:
     """Create the FastMCP server."""
-    mcp = FastMCP("Micro Books API")
     client = MicroBooksClient(bearer_token)
+    # Shared with the stdio server, so a retry is recognized by either.
+    idempotency = IdempotencyStore(os.path.join(os.path.expanduser(STATE_DIR), "idempotency.sqlite3"))
+
+    async def on_shutdown() -> None:
+        idempotency.close()
+
+    # Calls still running when Claude Desktop restarts the server get a few seconds to finish.
+    drain = DrainMiddleware()
+    mcp = FastMCP(
+        "Micro Books API",
+        middleware=[drain, ToolLoggingMiddleware()],
+        lifespan=graceful_lifespan(drain, on_shutdown),
+    )
+
+    async def mutate(kind: str, idempotency_key: Optional[str] = None, **payload) -> dict:
+        return await idempotency.run(kind, payload, lambda: getattr(client, kind)(**payload), idempotency_key)
 
     @mcp.tool()
     async def get_bookshelves() -> str:
@@ -208,29 +235,31 @@ def create_server(bearer_token: str) -> FastMCP:
             raise
 
     @mcp.tool()
-    async def add_bookshelf(name: str) -> str:
+    async def add_bookshelf(name: str, idempotency_key: Optional[str] = None) -> str:
         """Add a new bookshelf.
         
         Args:
             name: The name of the new bookshelf
+            idempotency_key: Send the same key when retrying so the change is applied only once (optional)
         """
         try:
-            result = await client.add_bookshelf(name)
+            result = await mutate("add_bookshelf", idempotency_key, name=name)
             return json.dumps(result, indent=2)
         except Exception:
             logger.exception("Failed to add bookshelf")
             raise
 
     @mcp.tool()
-    async def rename_bookshelf(bookshelf_id: int, name: str) -> str:
+    async def rename_bookshelf(bookshelf_id: int, name: str, idempotency_key: Optional[str] = None) -> str:
         """Rename a bookshelf.
         
         Args:
             bookshelf_id: The ID of the bookshelf to rename
             name: The new name for the bookshelf
+            idempotency_key: Send the same key when retrying so the change is applied only once (optional)
         """
         try:
-            result = await client.rename_bookshelf(bookshelf_id, name)
+            result = await mutate("rename_bookshelf", idempotency_key, bookshelf_id=bookshelf_id, name=name)
             return json.dumps(result, indent=2)
         except Exception:
             logger.exception("Failed to rename bookshelf")
@@ -243,6 +272,7 @@ def create_server(bearer_token: str) -> FastMCP:
         bookshelf_id: int,
         isbn: Optional[str] = None,
         cover_url: Optional[str] = None,
+        idempotency_key: Optional[str] = None,
     ) -> str:
         """Add a new book.
         
@@ -252,55 +282,71 @@ def create_server(bearer_token: str) -> FastMCP:
             bookshelf_id: The ID of the bookshelf to add the book to
             isbn: The ISBN of the book (optional)
             cover_url: URL to the book cover image (optional)
+            idempotency_key: Send the same key when retrying so the change is applied only once (optional)
         """
         try:
-            result = await client.add_book(title, author, bookshelf_id, isbn, cover_url)
+            result = await mutate(
+                "add_book",
+                idempotency_key,
+                title=title,
+                author=author,
+                bookshelf_id=bookshelf_id,
+                isbn=isbn,
+                cover_url=cover_url,
+            )
             return json.dumps(result, indent=2)
         except Exception:
             logger.exception("Failed to add book")
             raise
 
     @mcp.tool()
-    async def move_book(book_id: int, bookshelf_id: int) -> str:
+    async def move_book(book_id: int, bookshelf_id: int, idempotency_key: Optional[str] = None) -> str:
         """Move a book to a different bookshelf.
         
         Args:
             book_id: The ID of the book to move
             bookshelf_id: The ID of the target bookshelf
+            idempotency_key: Send the same key when retrying so the change is applied only once (optional)
         """
         try:
-            result = await client.move_book(book_id, bookshelf_id)
+            result = await mutate("move_book", idempotency_key, book_id=book_id, bookshelf_id=bookshelf_id)
             return json.dumps(result, indent=2)
         except Exception:
             logger.exception("Failed to move book")
             raise
 
     @mcp.tool()
-    async def remove_book(bookshelf_id: int, book_id: int) -> str:
+    async def remove_book(bookshelf_id: int, book_id: int, idempotency_key: Optional[str] = None) -> str:
         """Remove a book from a bookshelf.
         
         Args:
             bookshelf_id: The ID of the bookshelf
             book_id: The ID of the book to remove
+            idempotency_key: Send the same key when retrying so the change is applied only once (optional)
         """
         try:
-            result = await client.remove_book(bookshelf_id, book_id)
+            result = await mutate("remove_book", idempotency_key, bookshelf_id=bookshelf_id, book_id=book_id)
             return json.dumps(result, indent=2)
         except Exception:
             logger.exception("Failed to remove book")
             raise
 
     @mcp.tool()
-    async def change_book_cover(bookshelf_id: int, book_id: int, cover_url: str) -> str:
+    async def change_book_cover(
+        bookshelf_id: int, book_id: int, cover_url: str, idempotency_key: Optional[str] = None
+    ) -> str:
         """Change the cover for a book.
         
         Args:
             bookshelf_id: The ID of the bookshelf
             book_id: The ID of the book
             cover_url: URL to the new cover image
+            idempotency_key: Send the same key when retrying so the change is applied only once (optional)
         """
         try:
-            result = await client.change_book_cover(bookshelf_id, book_id, cover_url)
+            result = await mutate(
+                "change_book_cover", idempotency_key, bookshelf_id=bookshelf_id, book_id=book_id, cover_url=cover_url
+            )
             return json.dumps(result, indent=2)
         except Exception:
             logger.exception("Failed to change book cover")
@@ -331,16 +377,21 @@ def create_server(bearer_token: str) -> FastMCP:
             raise
 
     @mcp.tool()
-    async def update_reading_goal(goal_id: int, value: int, progress: Optional[int] = None) -> str:
+    async def update_reading_goal(
+        goal_id: int, value: int, progress: Optional[int] = None, idempotency_key: Optional[str] = None
+    ) -> str:
         """Update reading goal.
         
         Args:
             goal_id: The ID of the reading goal
             value: The target number of books for the goal
             progress: The current progress (number of books read, optional)
+            idempotency_key: Send the same key when retrying so the change is applied only once (optional)
         """
         try:
-            result = await client.update_reading_goal(goal_id, value, progress)
+            result = await mutate(
+                "update_reading_goal", idempotency_key, goal_id=goal_id, value=value, progress=progress
+            )
             return json.dumps(result, indent=2)
         except Exception:
             logger.exception("Failed to update reading goal")
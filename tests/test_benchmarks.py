@@ -0,0 +1,60 @@
+"""Assertions on the simulated servers in ``benchmarks/``, scaled down to run in a few seconds."""
+
+import argparse
+import asyncio
+
+from benchmarks.aimd_knee import run as run_knee
+from benchmarks.hedging_tail import run as run_hedging
+from benchmarks.mutation_locks_stress import NoLocks
+from benchmarks.mutation_locks_stress import run as run_mutations
+from micro_mcp_server.hedging import Hedger
+from micro_mcp_server.limiter import AdaptiveLimiter
+from micro_mcp_server.locks import KeyedLocks
+
+
+def test_adaptive_limit_settles_near_the_knee_without_sustained_429s():
+    args = argparse.Namespace(requests=200, knee=8, latency=0.01)
+    limiter = AdaptiveLimiter()
+    samples = []
+
+    async def simulate() -> dict:
+        task = asyncio.ensure_future(run_knee(limiter, args))
+        while not task.done():
+            samples.append(limiter.limit)
+            await asyncio.sleep(args.latency / 2)
+        return task.result()
+
+    result = asyncio.run(simulate())
+
+    # The stub answers 429 only beyond twice the knee.
+    assert result["429s"] <= args.requests // 50
+    assert result["server_peak"] <= 2 * args.knee
+    # AIMD saws around the knee; average over the second half of the run.
+    steady = samples[len(samples) // 2:]
+    assert 0.75 * args.knee <= sum(steady) / len(steady) <= 1.25 * args.knee
+    assert 1 <= result["final_limit"] <= 2 * args.knee
+
+
+def test_hedging_cuts_the_tail_within_its_budget():
+    args = argparse.Namespace(
+        requests=400, concurrency=20, latency=0.01, tail_latency=0.2, tail_rate=0.02, seed=2
+    )
+    plain = asyncio.run(run_hedging(None, args))
+    hedged = asyncio.run(run_hedging(Hedger(0.95, 0.1), args))
+
+    assert plain["extra_load"] == 0
+    assert hedged["extra_load"] <= 0.1
+    assert plain["p99"] >= args.tail_latency
+    assert hedged["p99"] < args.tail_latency / 2
+
+
+def test_keyed_locks_keep_the_cache_consistent_with_upstream():
+    args = argparse.Namespace(ops=400, books=20, shelves=5, concurrency=32, batch=100, latency=0.005, seed=2)
+
+    locked = asyncio.run(run_mutations(KeyedLocks(), args))
+    unlocked = asyncio.run(run_mutations(NoLocks(), args))
+
+    assert locked["inconsistent_shelves"] == 0
+    assert locked["contended"] > 0
+    # Without locks the same workload diverges, so the check above can fail.
+    assert unlocked["inconsistent_shelves"] > 0
@@ -0,0 +1,137 @@
+"""Write patches, their reconcile, and fetches racing a patch."""
+
+import asyncio
+from typing import Optional
+
+import httpx
+import pytest
+
+from micro_mcp_server.cache import ShelfCache
+from micro_mcp_server.server import MicroBooksClient
+
+
+def book(book_id: int) -> dict:
+    return {"id": book_id, "title": f"Book {book_id}", "authors": [{"name": "Ann Leckie"}]}
+
+
+class Upstream:
+    """Shelf 1 holds ``books``; removals apply to it. Reads wait for ``gate`` while it is set."""
+
+    def __init__(self, *books: int) -> None:
+        self.books = [book(b) for b in books]
+        self.gate: Optional[asyncio.Event] = None
+        self.reads = 0
+        self.fail_reads = False
+        self.fail_writes = False
+        self.transport = httpx.MockTransport(self.handle)
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "DELETE":
+            if self.fail_writes:
+                return httpx.Response(500)
+            book_id = int(request.url.path.rsplit("/", 1)[1])
+            self.books = [b for b in self.books if b["id"] != book_id]
+            return httpx.Response(200, json={})
+        self.reads += 1
+        if self.fail_reads:
+            return httpx.Response(503)
+        payload = {"items": list(self.books)}  # Read now, answered once the gate opens.
+        if self.gate is not None:
+            await self.gate.wait()
+        return httpx.Response(200, json=payload)
+
+
+def client(upstream: Upstream, ttl: float = 60.0) -> tuple:
+    cache = ShelfCache(ttl=ttl, reconcile_delay=0.01)
+    return MicroBooksClient("token", cache=cache, transport=upstream.transport), cache
+
+
+def ids(payload: dict) -> list:
+    return [item["id"] for item in payload["items"]]
+
+
+def test_patch_is_served_until_the_reconcile_confirms_it():
+    upstream = Upstream(1, 2)
+
+    async def scenario() -> None:
+        api, cache = client(upstream)
+        await api.get_bookshelf_books(1)
+        await api.remove_book(1, 1)
+        assert ids(await api.get_bookshelf_books(1)) == [2]
+        assert cache.peek(1).patches == ["remove_book:1"]
+        for _ in range(100):
+            if cache.peek(1).patched_at is None:
+                break
+            await asyncio.sleep(0.01)
+        assert cache.peek(1).patched_at is None
+        assert ids(cache.peek(1).payload) == [2]
+
+    asyncio.run(scenario())
+    assert upstream.reads == 2
+
+
+def test_fetch_that_started_before_a_patch_does_not_overwrite_it():
+    upstream = Upstream(1, 2)
+
+    async def scenario() -> None:
+        # A zero TTL makes every read a miss that refetches the shelf.
+        api, cache = client(upstream, ttl=0.0)
+        await api.get_bookshelf_books(1)
+        upstream.gate = asyncio.Event()
+        read = asyncio.create_task(api.get_bookshelf_books(1))
+        while upstream.reads < 2:
+            await asyncio.sleep(0.01)
+        await api.remove_book(1, 1)
+        upstream.gate.set()
+        # The read still returns book 1 from upstream, but the cache keeps the patch.
+        assert ids(await read) == [2]
+        assert ids(cache.peek(1).payload) == [2]
+        assert cache.peek(1).patches == ["remove_book:1"]
+
+    asyncio.run(scenario())
+
+
+def test_failed_reconcile_drops_the_patched_entry():
+    upstream = Upstream(1, 2)
+
+    async def scenario() -> None:
+        api, cache = client(upstream)
+        await api.get_bookshelf_books(1)
+        upstream.fail_reads = True
+        await api.remove_book(1, 1)
+        for _ in range(100):
+            if cache.peek(1) is None:
+                break
+            await asyncio.sleep(0.01)
+        assert cache.peek(1) is None
+        upstream.fail_reads = False
+        assert ids(await api.get_bookshelf_books(1)) == [2]
+
+    asyncio.run(scenario())
+
+
+def test_failed_write_leaves_the_cache_unpatched():
+    upstream = Upstream(1, 2)
+
+    async def scenario() -> None:
+        api, cache = client(upstream)
+        await api.get_bookshelf_books(1)
+        upstream.fail_writes = True
+        with pytest.raises(httpx.HTTPStatusError):
+            await api.remove_book(1, 1)
+        assert ids(cache.peek(1).payload) == [1, 2]
+        assert cache.peek(1).patched_at is None
+
+    asyncio.run(scenario())
+
+
+def test_offer_leaves_patched_entries_to_their_reconcile():
+    async def scenario() -> None:
+        cache = ShelfCache()
+        cache.put(1, {"items": [book(1), book(2)]})
+        cache.patch_remove_book(1, 1)
+        assert not cache.offer(1, {"items": [book(1), book(2)]})
+        assert ids(cache.peek(1).payload) == [2]
+        assert cache.offer(2, {"items": [book(3)]})
+
+    asyncio.run(scenario())
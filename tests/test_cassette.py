@@ -0,0 +1,85 @@
+"""Cassettes: what is recorded, what is redacted, and how replay matches requests."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from micro_mcp_server.cassette import REDACTED, CassetteMiss, RecordingTransport, ReplayTransport
+
+SECRET = "s3cret-token"
+
+
+def upstream(request: httpx.Request) -> httpx.Response:
+    if request.url.path == "/books/bookshelves":
+        return httpx.Response(200, json={"items": [{"id": 1}]}, headers={"set-cookie": f"session={SECRET}"})
+    if request.method == "POST":
+        return httpx.Response(201, json={"posted": request.content.decode()})
+    return httpx.Response(200, content=b"\x89PNG\x00\xff", headers={"content-type": "image/png"})
+
+
+async def exchange(transport: httpx.AsyncBaseTransport) -> list:
+    async with httpx.AsyncClient(
+        transport=transport, base_url="https://micro.blog", headers={"Authorization": f"Bearer {SECRET}"}
+    ) as client:
+        responses = [
+            await client.get("/books/bookshelves", params={"token": SECRET, "page": 2}),
+            await client.post("/books/bookshelves", data={"name": "Next", "app_token": SECRET}),
+            await client.get("/covers/1.png"),
+        ]
+    return [(r.status_code, r.headers.get("content-type"), r.content) for r in responses]
+
+
+def record(path, append: bool = False) -> list:
+    return asyncio.run(exchange(RecordingTransport(str(path), httpx.MockTransport(upstream), append=append)))
+
+
+def test_tokens_never_reach_the_cassette(tmp_path):
+    path = tmp_path / "session.ndjson"
+    record(path)
+    text = path.read_text()
+    assert SECRET not in text
+    shelves, posted, cover = [json.loads(line) for line in text.splitlines()]
+    assert shelves["target"] == "/books/bookshelves?token=%3Credacted%3E&page=2"
+    assert shelves["request_headers"]["authorization"] == REDACTED
+    assert shelves["headers"]["set-cookie"] == REDACTED
+    assert "app_token=%3Credacted%3E" in posted["request_body"]
+    assert "body_base64" in cover
+
+
+def test_replay_serves_what_was_recorded(tmp_path):
+    path = tmp_path / "session.ndjson"
+    recorded = record(path)
+    replay = ReplayTransport(str(path), latency="zero", strict=True)
+    assert len(replay) == 3
+    assert asyncio.run(exchange(replay)) == recorded
+    assert (replay.served, replay.misses) == (3, 0)
+    # Each recorded response is served once in strict mode, until rewound.
+    with pytest.raises(CassetteMiss, match="used up"):
+        asyncio.run(exchange(replay))
+    replay.rewind()
+    assert asyncio.run(exchange(replay)) == recorded
+
+
+def test_unrecorded_requests_miss(tmp_path):
+    path = tmp_path / "session.ndjson"
+    record(path)
+
+    async def other(transport) -> int:
+        async with httpx.AsyncClient(transport=transport, base_url="https://micro.blog") as client:
+            return (await client.get("/books/bookshelves", params={"page": 3})).status_code
+
+    lenient = ReplayTransport(str(path), latency="zero")
+    assert asyncio.run(other(lenient)) == 404 and lenient.misses == 1
+    with pytest.raises(CassetteMiss, match="No recorded response"):
+        asyncio.run(other(ReplayTransport(str(path), latency="zero", strict=True)))
+
+
+def test_recording_replaces_the_cassette_unless_appending(tmp_path):
+    path = tmp_path / "session.ndjson"
+    record(path)
+    record(path)
+    assert len(ReplayTransport(str(path))) == 3
+    record(path, append=True)
+    assert len(ReplayTransport(str(path))) == 6
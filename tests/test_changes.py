@@ -0,0 +1,106 @@
+"""get_changes_since: change types, cursors, paging and snapshots."""
+
+import asyncio
+import json
+
+from micro_mcp_server.changes import ChangeFeed
+
+
+def book(book_id: int, title: str = "", cover: str = "") -> dict:
+    return {"id": book_id, "title": title or f"Book {book_id}", "image": cover, "authors": [{"name": "Ann Leckie"}]}
+
+
+class Library:
+    """Shelves served with an ETag per shelf version, so unchanged shelves answer 304."""
+
+    def __init__(self, shelves: dict) -> None:
+        self.shelves = shelves
+
+    async def get_bookshelves(self) -> dict:
+        return {"items": [{"id": s} for s in self.shelves]}
+
+    async def get_conditional(self, path: str, etag=None, last_modified=None) -> tuple:
+        items = self.shelves[int(path.rsplit("/", 1)[1])]
+        current = str(hash(repr(items)))
+        if etag == current:
+            return None, etag, None
+        return {"items": list(items)}, current, None
+
+
+def refreshed(feed: ChangeFeed, library: Library) -> dict:
+    return asyncio.run(feed.refresh(library))
+
+
+def test_first_refresh_is_a_baseline_and_later_changes_are_reported():
+    library = Library({1: [book(1), book(2), book(3)], 2: [book(4)]})
+    feed = ChangeFeed()
+    refreshed(feed, library)
+    first = feed.changes_since(None)
+    assert first["reset"] and first["reason"] == "no cursor" and first["changes"] == []
+
+    library.shelves[1] = [book(2, cover="new.jpg"), book(3, title="Renamed"), book(5)]
+    library.shelves[2] = [book(1)]  # Book 4 removed, book 1 moved here from shelf 1.
+    stats = refreshed(feed, library)
+    assert stats == {"checked": 2, "not_modified": 0, "unchanged": 0, "changed": 2}
+
+    changes = feed.changes_since(first["cursor"])
+    assert not changes["reset"]
+    assert sorted((c["type"], c["book_id"]) for c in changes["changes"]) == [
+        ("added", 5), ("cover_changed", 2), ("moved", 1), ("removed", 4), ("updated", 3),
+    ]
+    moved = next(c for c in changes["changes"] if c["type"] == "moved")
+    assert (moved["from_bookshelf_id"], moved["to_bookshelf_id"]) == (1, 2)
+    assert feed.changes_since(changes["cursor"])["changes"] == []
+
+
+def test_unchanged_shelves_cost_a_304():
+    library = Library({1: [book(1)], 2: [book(2)]})
+    feed = ChangeFeed()
+    refreshed(feed, library)
+    library.shelves[2] = [book(2), book(3)]
+    assert refreshed(feed, library) == {"checked": 2, "not_modified": 1, "unchanged": 0, "changed": 1}
+
+
+def test_changes_are_paged_with_has_more():
+    library = Library({1: []})
+    feed = ChangeFeed()
+    refreshed(feed, library)
+    cursor = feed.changes_since(None)["cursor"]
+    library.shelves[1] = [book(i) for i in range(1, 6)]
+    refreshed(feed, library)
+    seen = []
+    while True:
+        page = feed.changes_since(cursor, limit=2)
+        seen += [c["book_id"] for c in page["changes"]]
+        cursor = page["cursor"]
+        if not page["has_more"]:
+            break
+    assert sorted(seen) == [1, 2, 3, 4, 5]
+
+
+def test_cursors_expire_with_the_log_or_another_epoch():
+    library = Library({1: []})
+    feed = ChangeFeed(max_log=2)
+    refreshed(feed, library)
+    cursor = feed.changes_since(None)["cursor"]
+    library.shelves[1] = [book(1), book(2), book(3)]
+    refreshed(feed, library)
+    assert feed.changes_since(cursor)["reason"] == "cursor expired"
+    assert ChangeFeed().changes_since(feed.cursor())["reset"]
+    assert feed.changes_since("not a cursor")["reset"]
+
+
+def test_cursors_stay_valid_across_a_snapshot():
+    library = Library({1: [book(1)]})
+    feed = ChangeFeed()
+    refreshed(feed, library)
+    cursor = feed.changes_since(None)["cursor"]
+    library.shelves[1] = [book(1), book(2)]
+    refreshed(feed, library)
+
+    restored = ChangeFeed()
+    restored.restore(json.loads(json.dumps(feed.snapshot())))
+    assert [c["book_id"] for c in restored.changes_since(cursor)["changes"]] == [2]
+    # The restored validators still match, so the first refresh is all 304s.
+    assert refreshed(restored, library)["not_modified"] == 1
+    assert restored.library_hash == feed.library_hash
@@ -0,0 +1,45 @@
+"""A caller's deadline running out is not an upstream error."""
+
+import asyncio
+
+import httpx
+import pytest
+
+from micro_mcp_server import deadlines
+from micro_mcp_server.limiter import AdaptiveLimiter
+from micro_mcp_server.server import MicroBooksClient
+
+
+def client_timing_out_after(seconds: float):
+    async def handle(request: httpx.Request) -> httpx.Response:
+        # MockTransport does not enforce timeouts; raise what httpx would.
+        await asyncio.sleep(seconds)
+        raise httpx.ReadTimeout("timed out", request=request)
+
+    limiter = AdaptiveLimiter(initial_limit=8)
+    return MicroBooksClient("token", limiter=limiter, transport=httpx.MockTransport(handle)), limiter
+
+
+def test_timeout_from_expired_deadline_releases_as_dropped():
+    client, limiter = client_timing_out_after(0.05)
+
+    async def call() -> None:
+        with deadlines.deadline(0.01):
+            await client.get_bookshelves()
+
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(call())
+    assert (limiter.requests, limiter.errors, limiter.decreases, limiter.limit) == (1, 0, 0, 8)
+
+
+def test_timeout_without_deadline_is_an_error():
+    client, limiter = client_timing_out_after(0)
+
+    with pytest.raises(httpx.ReadTimeout):
+        asyncio.run(client.get_bookshelves())
+    assert (limiter.errors, limiter.decreases, limiter.limit) == (1, 1, 4)
+
+
+def test_library_wide_tools_get_longer_deadlines():
+    for name in ("similar_books", "library_stats"):
+        assert deadlines.DEFAULT_TOOL_DEADLINES[name] == 120.0
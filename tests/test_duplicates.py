@@ -0,0 +1,75 @@
+"""Duplicate clusters: numbered volumes stay apart, similar titles are only flagged for review."""
+
+from micro_mcp_server.duplicates import DuplicateFinder
+
+
+def record(book_id, title, author="James S. A. Corey", isbn="", shelf=1, added="2024-01-01"):
+    return {
+        "id": book_id,
+        "title": title,
+        "author": author,
+        "isbn": isbn,
+        "cover_url": "",
+        "bookshelf_id": shelf,
+        "date_added": added,
+    }
+
+
+def test_titles_that_differ_only_in_numbering_are_not_linked():
+    records = [
+        record(1, "The Expanse Book 1"),
+        record(2, "The Expanse Book 2"),
+        record(3, "Book 101 of things", author="Ann Other"),
+        record(4, "Book 105 of things", author="Ann Other"),
+        record(5, "The Expanse Part One"),
+        record(6, "The Expanse Part Two"),
+        record(7, "Dune Messiah Volume II", author="Frank Herbert"),
+        record(8, "Dune Messiah Volume III", author="Frank Herbert"),
+    ]
+    assert DuplicateFinder().find(records, threshold=0.5)["clusters"] == []
+
+
+def test_similar_title_alone_is_never_suggested_for_removal():
+    records = [
+        record(1, "Leviathan Wakes", isbn="9780316129084", shelf=1, added="2024-01-01"),
+        record(2, "Leviathan Wakes", isbn="978-0-316-12908-4", shelf=2, added="2024-03-01"),
+        record(3, "Leviathan Wake", shelf=1),
+    ]
+    (cluster,) = DuplicateFinder().find(records, threshold=0.5)["clusters"]
+    removed = [a["arguments"]["book_id"] for a in cluster["suggested_actions"] if a["tool"] == "remove_book"]
+    assert len(removed) == 1 and removed[0] in (1, 2)
+    assert cluster["review_book_ids"] == [3]
+    assert {m["reason"] for m in cluster["matches"]} >= {"similar_title"}
+
+
+def removals(cluster: dict) -> list:
+    return sorted(a["arguments"]["book_id"] for a in cluster["suggested_actions"] if a["tool"] == "remove_book")
+
+
+def test_series_volumes_with_subtitles_are_only_flagged_for_review():
+    records = [
+        record(1, "The Lord of the Rings: The Fellowship of the Ring", author="J. R. R. Tolkien"),
+        record(2, "The Lord of the Rings: The Two Towers", author="J. R. R. Tolkien"),
+        record(3, "Dune (Dune Chronicles, Book 1)", author="Frank Herbert"),
+        record(4, "Dune (Book 3)", author="Frank Herbert"),
+    ]
+    clusters = DuplicateFinder().find(records)["clusters"]
+
+    assert sorted(sorted(b["id"] for b in c["books"]) for c in clusters) == [[1, 2], [3, 4]]
+    for cluster in clusters:
+        assert removals(cluster) == []
+        assert {m["reason"] for m in cluster["matches"]} == {"main_title"}
+        assert len(cluster["review_book_ids"]) == 1
+
+
+def test_same_title_and_subtitle_is_still_a_duplicate():
+    records = [
+        record(1, "Dune (Dune Chronicles, Book 1)", author="Frank Herbert", isbn="9780441013593"),
+        record(2, "Dune: (Dune Chronicles, Book 1)", author="Herbert, Frank"),
+        record(3, "Dune (Book 3)", author="Frank Herbert"),
+    ]
+    (cluster,) = DuplicateFinder().find(records)["clusters"]
+
+    assert cluster["keep"] == 1
+    assert removals(cluster) == [2]
+    assert cluster["review_book_ids"] == [3]
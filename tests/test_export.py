@@ -0,0 +1,120 @@
+"""Export files stay inside the exports directory; exports write what changed."""
+
+import asyncio
+import csv
+import json
+from typing import Optional
+
+import pytest
+
+from micro_mcp_server.export import export_library, export_target
+from micro_mcp_server.records import RECORD_FIELDS
+
+
+def test_names_resolve_inside_the_directory(tmp_path):
+    assert export_target(str(tmp_path), "library.csv", "csv") == (tmp_path / "library.csv").resolve()
+    assert export_target(str(tmp_path), "2026/library.csv", "csv").parent == (tmp_path / "2026").resolve()
+
+
+def test_generated_names_keep_full_and_incremental_exports_apart(tmp_path):
+    full = export_target(str(tmp_path), None, "ndjson")
+    changes = export_target(str(tmp_path), None, "ndjson", incremental=True)
+    assert full.name.startswith("library-") and full.suffix == ".ndjson"
+    assert changes.name.startswith("library-changes-")
+
+
+@pytest.mark.parametrize("name", ["../library.csv", "/tmp/library.csv", ".", "a/../../library.csv"])
+def test_names_outside_the_directory_are_refused(tmp_path, name):
+    with pytest.raises(ValueError, match="inside the exports directory"):
+        export_target(str(tmp_path / "exports"), name, "csv")
+
+
+class Library:
+    """Serves bookshelves from a dict, optionally failing on one shelf."""
+
+    def __init__(self, shelves: dict, broken: Optional[int] = None) -> None:
+        self.shelves = shelves
+        self.broken = broken
+
+    async def get_bookshelves(self) -> dict:
+        return {"items": [{"id": shelf_id, "title": f"Shelf {shelf_id}"} for shelf_id in self.shelves]}
+
+    async def get_bookshelf_books(self, shelf_id: int) -> dict:
+        await asyncio.sleep(0)
+        if shelf_id == self.broken:
+            raise ConnectionError("shelf unavailable")
+        return {"items": list(self.shelves[shelf_id])}
+
+
+def book(book_id: int, title: str = "") -> dict:
+    return {"id": book_id, "title": title or f"Book {book_id}", "authors": [{"name": "Ann Leckie"}]}
+
+
+def export(library: Library, path, fmt: str = "ndjson", incremental: bool = False, **kwargs) -> dict:
+    return asyncio.run(export_library(library, str(path), fmt, incremental, concurrency=2, **kwargs))
+
+
+def ndjson_ids(path) -> list:
+    return sorted(json.loads(line)["id"] for line in path.read_text().splitlines())
+
+
+def test_a_full_export_writes_every_book_once(tmp_path):
+    library = Library({1: [book(1), book(2)], 2: [book(3)], 3: []})
+    calls: list = []
+    summary = export(library, tmp_path / "library.ndjson", progress=lambda done, total: calls.append((done, total)))
+    assert ndjson_ids(tmp_path / "library.ndjson") == [1, 2, 3]
+    assert (summary["bookshelves"], summary["books_seen"], summary["books_written"]) == (3, 3, 3)
+    assert calls == [(1, 3), (2, 3), (3, 3)]
+    manifest = json.loads((tmp_path / "library.ndjson.manifest.json").read_text())
+    assert sorted(manifest["books"]) == ["1", "2", "3"]
+
+    first = json.loads((tmp_path / "library.ndjson").read_text().splitlines()[0])
+    assert tuple(first) == RECORD_FIELDS
+    assert first["author"] == "Ann Leckie" and first["bookshelf_name"].startswith("Shelf ")
+
+
+def test_csv_export_has_a_header_and_one_row_per_book(tmp_path):
+    export(Library({1: [book(1), book(2, "Ancillary, Justice")]}), tmp_path / "library.csv", "csv")
+    with open(tmp_path / "library.csv", newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["title"] for row in rows] == ["Book 1", "Ancillary, Justice"]
+    assert rows[0]["bookshelf_id"] == "1"
+
+
+def test_incremental_exports_write_only_changes_and_report_removals(tmp_path):
+    library = Library({1: [book(1), book(2)], 2: [book(3)]})
+    manifest = tmp_path / "library.manifest.json"
+    export(library, tmp_path / "full.ndjson", manifest_path=str(manifest))
+
+    library.shelves = {1: [book(1), book(2, "Renamed")], 2: [book(4)]}
+    summary = export(library, tmp_path / "changes.ndjson", incremental=True, manifest_path=str(manifest))
+    assert ndjson_ids(tmp_path / "changes.ndjson") == [2, 4]
+    assert (summary["books_seen"], summary["books_written"], summary["removed_book_ids"]) == (3, 2, ["3"])
+
+    # Nothing changed since: the next incremental export is empty.
+    summary = export(library, tmp_path / "none.ndjson", incremental=True, manifest_path=str(manifest))
+    assert summary["books_written"] == 0 and (tmp_path / "none.ndjson").read_text() == ""
+
+
+def test_a_failed_shelf_fails_the_export_and_keeps_the_manifest(tmp_path):
+    library = Library({1: [book(1)]})
+    export(library, tmp_path / "library.ndjson")
+    manifest = (tmp_path / "library.ndjson.manifest.json").read_text()
+
+    library.shelves[2], library.broken = [book(2)], 2
+    with pytest.raises(ConnectionError, match="shelf unavailable"):
+        export(library, tmp_path / "library.ndjson")
+    assert (tmp_path / "library.ndjson.manifest.json").read_text() == manifest
+
+
+def test_parquet_export_writes_one_row_group_per_shelf(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    export(Library({1: [book(1), book(2)], 2: [book(3)], 3: []}), tmp_path / "library.parquet", "parquet")
+    table = pq.ParquetFile(tmp_path / "library.parquet")
+    assert table.metadata.num_row_groups == 2
+    assert sorted(table.read().column("id").to_pylist()) == [1, 2, 3]
+
+
+def test_unknown_formats_are_refused(tmp_path):
+    with pytest.raises(ValueError, match="Unsupported export format"):
+        export(Library({}), tmp_path / "library.xml", "xml")
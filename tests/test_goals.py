@@ -0,0 +1,77 @@
+"""Reading-goal history: what is snapshotted, and the pace forecast built from it."""
+
+import asyncio
+from datetime import date, datetime
+
+import httpx
+
+from micro_mcp_server.goals import GoalHistory, parse_goal
+from micro_mcp_server.server import MicroBooksClient
+
+
+def ts(day: date) -> float:
+    return datetime.combine(day, datetime.min.time()).timestamp()
+
+
+def test_parse_goal_reads_microblog_fields_and_the_year_in_the_title():
+    goal = parse_goal({"id": "7", "title": "2026 Reading Goal", "_microblog": {"value": 52, "progress": "10"}})
+    assert goal == {"goal_id": 7, "year": 2026, "target": 52, "progress": 10}
+    assert parse_goal({"id": 8, "title": "Books"})["year"] is None
+
+
+def test_unchanged_snapshots_are_stored_at_most_once_a_day(tmp_path):
+    history = GoalHistory(str(tmp_path / "goals.sqlite3"))
+    start = ts(date(2026, 3, 1))
+    assert history.record(7, 52, 10, 2026, ts=start)
+    assert not history.record(7, None, 10, ts=start + 3600)
+    assert history.record(7, None, 11, ts=start + 7200)
+    assert history.record(7, None, None, ts=start + 2 * 86400)
+    rows = history.history(7)
+    assert [(r["target"], r["progress"], r["year"]) for r in rows] == [(52, 10, 2026), (52, 11, 2026), (52, 11, 2026)]
+    history.close()
+
+
+def test_forecast_reports_year_to_date_and_recent_pace(tmp_path):
+    history = GoalHistory(str(tmp_path / "goals.sqlite3"))
+    history.record(7, 52, 0, 2026, ts=ts(date(2026, 1, 1)))
+    history.record(7, 52, 4, ts=ts(date(2026, 2, 1)))
+    history.record(7, 52, 10, ts=ts(date(2026, 3, 1)))
+
+    forecast = history.forecast(7, window_days=28, today=date(2026, 3, 1))
+    assert (forecast["progress"], forecast["remaining"], forecast["snapshots"]) == (10, 42, 3)
+    # 60 days into the year: 10 books is 1.17 a week, ahead of the 8.5 a steady pace would give.
+    assert forecast["year_to_date"]["books_per_week"] == 1.17
+    assert (forecast["expected_progress_today"], forecast["ahead_by"]) == (8.5, 1.5)
+    assert forecast["year_to_date"]["projected_completion"] == "2026-11-08"
+    # Since February 1: 6 books in 28 days, enough to finish by mid-September.
+    assert forecast["recent"]["window_days"] == 28.0
+    assert forecast["recent"]["books_per_week"] == 1.5
+    assert forecast["recent"]["projected_completion"] == "2026-09-13"
+    assert forecast["recent"]["on_track"] is True
+    assert forecast["books_per_week_needed"] == round(42 / (305 / 7), 2)
+    assert history.forecast(99)["snapshots"] == 0
+    history.close()
+
+
+def test_client_snapshots_reads_and_updates(tmp_path):
+    def handle(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/books/goals":
+            return httpx.Response(200, json={"items": [{"id": 7, "title": "2026", "_microblog": {"value": 52}}]})
+        if request.method == "GET":
+            return httpx.Response(200, json={"items": [{"id": 1}, {"id": 2}, {"id": 3}]})
+        return httpx.Response(200, json={})
+
+    history = GoalHistory(str(tmp_path / "goals.sqlite3"))
+    client = MicroBooksClient("token", transport=httpx.MockTransport(handle), goals=history)
+
+    async def scenario() -> None:
+        await client.get_reading_goals()
+        await client.get_goal_progress(7)  # No progress field: the books listed are counted.
+        await client.update_reading_goal(7, 60)
+        await client.aclose()
+
+    asyncio.run(scenario())
+    rows = history.history(7)
+    assert [(r["target"], r["progress"]) for r in rows] == [(52, None), (52, 3), (60, 3)]
+    assert history.goal_ids() == [7]
+    history.close()
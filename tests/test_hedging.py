@@ -0,0 +1,66 @@
+"""Hedged reads stay within their budget and only fire past the latency percentile."""
+
+import asyncio
+
+from micro_mcp_server.hedging import Hedger
+
+
+class Upstream:
+    def __init__(self) -> None:
+        self.sends = 0
+
+    def request(self, latency: float):
+        async def send() -> float:
+            self.sends += 1
+            await asyncio.sleep(latency)
+            return latency
+
+        return send
+
+
+async def warm_up(hedger: Hedger, upstream: Upstream, latency: float) -> None:
+    await asyncio.gather(*(hedger.run(upstream.request(latency)) for _ in range(hedger.min_samples)))
+
+
+def test_no_hedges_below_the_percentile():
+    hedger, upstream = Hedger(percentile=0.95, budget=0.5), Upstream()
+
+    async def scenario() -> None:
+        await warm_up(hedger, upstream, 0.05)
+        await asyncio.gather(*(hedger.run(upstream.request(0.005)) for _ in range(50)))
+        assert hedger.hedges == 0
+        await hedger.run(upstream.request(0.2))
+
+    asyncio.run(scenario())
+    assert hedger.hedges == 1
+    assert upstream.sends == hedger.requests + 1
+
+
+def test_hedges_stay_within_budget_when_everything_is_slow():
+    hedger, upstream = Hedger(percentile=0.5, budget=0.05), Upstream()
+
+    async def scenario() -> None:
+        await warm_up(hedger, upstream, 0.005)
+        await asyncio.gather(*(hedger.run(upstream.request(0.05)) for _ in range(200)))
+
+    asyncio.run(scenario())
+    assert 0 < hedger.hedges <= hedger.budget * hedger.requests
+    assert hedger.skipped_budget == 200 - hedger.hedges
+    assert upstream.sends == hedger.requests + hedger.hedges
+
+
+def test_only_completed_attempts_are_timed():
+    hedger, upstream = Hedger(percentile=0.5, budget=1.0), Upstream()
+
+    async def scenario() -> None:
+        await warm_up(hedger, upstream, 0.1)
+        calls = iter([1.0, 0.01])
+        # The primary stalls, the hedge answers quickly and the primary is cancelled.
+        assert await hedger.run(lambda: upstream.request(next(calls))()) == 0.01
+
+    asyncio.run(scenario())
+    assert hedger.hedges == hedger.hedge_wins == 1
+    samples = sorted(hedger.latencies._samples)
+    # The hedge's own latency is recorded; the cancelled primary's is not.
+    assert len(samples) == hedger.min_samples + 1
+    assert samples[0] < 0.05 <= samples[1]
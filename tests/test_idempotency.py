@@ -0,0 +1,161 @@
+"""Idempotency keys: replayed results, conflicting reuse, expiry and in-flight joins."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastmcp import Client
+from fastmcp.exceptions import ToolError
+
+from micro_mcp_server import idempotency
+from micro_mcp_server.idempotency import IdempotencyConflict, IdempotencyStore, fingerprint
+from micro_mcp_server.server import create_server
+
+
+class Upstream:
+    """Counts calls and returns a new id for each."""
+
+    def __init__(self, fail: bool = False, delay: float = 0.0) -> None:
+        self.calls = 0
+        self.fail = fail
+        self.delay = delay
+
+    async def __call__(self) -> dict:
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("upstream went away")
+        return {"id": self.calls}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = IdempotencyStore(str(tmp_path / "idempotency.sqlite3"), window=60)
+    yield store
+    store.close()
+
+
+def test_same_key_and_payload_returns_the_stored_result(store):
+    upstream = Upstream()
+
+    async def scenario() -> list:
+        return [
+            await store.run("move_book", {"book_id": 1, "bookshelf_id": 2}, upstream, key="k1"),
+            await store.run("move_book", {"book_id": 1, "bookshelf_id": 2}, upstream, key="k1"),
+        ]
+
+    first, again = asyncio.run(scenario())
+    assert first == {"id": 1}
+    assert again == {"id": 1, "idempotent_replay": True}
+    assert upstream.calls == 1
+    assert store.stats() == {"stored": 1, "replayed": 1, "joined_in_flight": 0}
+
+
+def test_a_different_payload_under_the_same_key_is_rejected(store):
+    upstream = Upstream()
+
+    async def scenario() -> None:
+        await store.run("move_book", {"book_id": 1, "bookshelf_id": 2}, upstream, key="k1")
+        await store.run("move_book", {"book_id": 1, "bookshelf_id": 3}, upstream, key="k1")
+
+    with pytest.raises(IdempotencyConflict, match="different arguments"):
+        asyncio.run(scenario())
+    assert upstream.calls == 1
+
+
+def test_stored_results_expire(store, monkeypatch):
+    upstream = Upstream()
+    now = [1_000_000.0]
+    monkeypatch.setattr(idempotency.time, "time", lambda: now[0])
+
+    def add(name: str) -> dict:
+        return asyncio.run(store.run("add_bookshelf", {"name": name}, upstream))
+
+    add("To Read")
+    now[0] += 59
+    assert add("  to read ")["idempotent_replay"]  # Derived keys ignore case and whitespace.
+    now[0] += 2
+    assert add("To Read") == {"id": 2}
+
+    asyncio.run(store.run("move_book", {"book_id": 1}, upstream, key="k1"))
+    now[0] += idempotency.EXPLICIT_KEY_TTL - 1
+    assert asyncio.run(store.run("move_book", {"book_id": 1}, upstream, key="k1"))["idempotent_replay"]
+    now[0] += 2
+    assert asyncio.run(store.run("move_book", {"book_id": 1}, upstream, key="k1")) == {"id": 4}
+
+
+def test_only_creating_tools_are_deduplicated_without_a_key(store):
+    upstream = Upstream()
+
+    async def scenario() -> None:
+        for _ in range(2):
+            await store.run("move_book", {"book_id": 1, "bookshelf_id": 2}, upstream)
+
+    asyncio.run(scenario())
+    assert upstream.calls == 2
+
+
+def test_failed_calls_are_not_stored(store):
+    upstream = Upstream(fail=True)
+    with pytest.raises(ConnectionError):
+        asyncio.run(store.run("add_bookshelf", {"name": "Next"}, upstream, key="k1"))
+    upstream.fail = False
+    assert asyncio.run(store.run("add_bookshelf", {"name": "Next"}, upstream, key="k1")) == {"id": 2}
+
+
+def test_concurrent_duplicates_join_the_call_in_flight(store):
+    upstream = Upstream(delay=0.02)
+
+    async def scenario() -> list:
+        return await asyncio.gather(*(store.run("add_book", {"title": "Dune"}, upstream) for _ in range(3)))
+
+    results = asyncio.run(scenario())
+    assert upstream.calls == 1
+    assert results[0] == {"id": 1}
+    assert results[1:] == [{"id": 1, "idempotent_replay": True}] * 2
+    assert store.stats()["joined_in_flight"] == 2
+
+
+def test_results_survive_a_restart(tmp_path):
+    path = str(tmp_path / "idempotency.sqlite3")
+    upstream = Upstream()
+    first = IdempotencyStore(path)
+    asyncio.run(first.run("add_bookshelf", {"name": "Next"}, upstream, key="k1"))
+    first.close()
+    second = IdempotencyStore(path)
+    assert asyncio.run(second.run("add_bookshelf", {"name": "Next"}, upstream, key="k1"))["idempotent_replay"]
+    second.close()
+    assert upstream.calls == 1
+
+
+def test_fingerprint_ignores_unset_options():
+    assert fingerprint("add_book", {"title": "Dune", "isbn": None}) == fingerprint("add_book", {"title": "dune"})
+    assert fingerprint("add_book", {"title": "Dune"}) != fingerprint("add_bookshelf", {"title": "Dune"})
+
+
+def test_retried_tool_calls_reach_micro_blog_once(tmp_path):
+    posts: list = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        if request.method == "POST":
+            posts.append(request.content)
+            return httpx.Response(200, json={"id": len(posts)})
+        return httpx.Response(200, json={"items": []})
+
+    async def scenario() -> list:
+        server = create_server(
+            "token", state_dir=str(tmp_path), transport=httpx.MockTransport(handle), snapshot=False
+        )
+        async with Client(server) as client:
+            calls = [
+                await client.call_tool("add_bookshelf", {"name": "Next", "idempotency_key": "k1"}),
+                await client.call_tool("add_bookshelf", {"name": "Next", "idempotency_key": "k1"}),
+            ]
+            with pytest.raises(ToolError, match="different arguments"):
+                await client.call_tool("add_bookshelf", {"name": "Later", "idempotency_key": "k1"})
+            return [json.loads(c.content[0].text) for c in calls]
+
+    first, again = asyncio.run(scenario())
+    assert len(posts) == 1
+    assert again == {**first, "idempotent_replay": True}
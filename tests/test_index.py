@@ -0,0 +1,81 @@
+"""query_books parsing and index lookups."""
+
+import pytest
+
+from micro_mcp_server.index import LibraryIndex, QueryError, parse_where
+
+
+def library() -> LibraryIndex:
+    index = LibraryIndex()
+    index.replace_shelf(1, {"items": [
+        {"id": 10, "title": "Ancillary Justice", "authors": [{"name": "Ann Leckie"}]},
+        {"id": 11, "title": "\U0001d4d0 Calligraphic Title", "authors": [{"name": "Ann Other"}]},
+        {"id": 12, "title": "\U0001d4d0\U0001d4d1 Longer", "authors": [{"name": "Ann Other"}]},
+    ]})
+    index.replace_shelf(2, {"items": [{"id": 20, "title": "Provenance", "authors": [{"name": "Ann Leckie"}]}]})
+    return index
+
+
+def ids(result: dict) -> list:
+    return sorted(book["id"] for book in result["books"])
+
+
+def test_integer_fields_are_converted_while_parsing():
+    assert parse_where("id = 10 and bookshelf_id in (1, '2')") == [("id", "=", 10), ("bookshelf_id", "in", [1, 2])]
+
+
+@pytest.mark.parametrize("where", ["id = abc", "bookshelf_id = x", "shelf in (1, two)", "id != 1.5"])
+def test_non_integer_ids_raise_query_error(where):
+    with pytest.raises(QueryError, match="expects integer values"):
+        parse_where(where)
+
+
+def test_id_and_shelf_lookups():
+    index = library()
+    assert ids(index.query("id in (10, 20, 99)")) == [10, 20]
+    assert ids(index.query("shelf = 2")) == [20]
+
+
+def test_title_prefix_includes_characters_outside_the_bmp():
+    index = library()
+    assert ids(index.query("title ^= '\U0001d4d0'")) == [11, 12]
+    assert ids(index.query("title ^= 'anc'")) == [10]
+
+
+def dated_library() -> LibraryIndex:
+    index = LibraryIndex()
+    index.replace_shelf(3, {"items": [
+        {"id": 30, "title": "1984", "date_published": "2024-12-31T10:00:00Z",
+         "_microblog": {"isbn": "9780451524935"}},
+        {"id": 31, "title": "Nineteen", "date_published": "2025-01-01T09:00:00Z"},
+        {"id": 32, "title": "Later", "date_published": "2025-06-15T09:00:00Z"},
+        {"id": 33, "title": "Undated"},
+    ]})
+    return index
+
+
+def test_unquoted_numbers_match_text_fields():
+    index = dated_library()
+    assert ids(index.query("isbn = 9780451524935")) == [30]
+    assert ids(index.query("title = 1984")) == [30]
+    assert ids(index.query("title in (1984, Later)")) == [30, 32]
+
+
+@pytest.mark.parametrize("where, expected", [
+    ("date >= 2025", [31, 32]),
+    ("date > 2024", [31, 32]),
+    ("date < 2025", [30]),
+    ("date <= 2025-01", [30, 31]),
+    ("date = 2025", [31, 32]),
+    ("date = 2025-06-15", [32]),
+    ("date in (2024, 2025-06)", [30, 32]),
+    ("date != 2025", [30, 33]),
+])
+def test_dates_compare_at_the_precision_given(where, expected):
+    assert ids(dated_library().query(where)) == expected
+
+
+@pytest.mark.parametrize("where", ["date >= 25", "date > yesterday", "date in (2025, soon)"])
+def test_bad_dates_raise_query_error(where):
+    with pytest.raises(QueryError, match="expects dates"):
+        parse_where(where)
@@ -0,0 +1,134 @@
+"""Background jobs: progress, results, cancellation and what a restart leaves behind."""
+
+import asyncio
+
+import pytest
+
+from micro_mcp_server.jobs import JobError, JobRunner
+
+
+async def count(job, to: int = 3, pause: float = 0.0) -> dict:
+    for i in range(to):
+        await asyncio.sleep(pause)
+        job.progress(i + 1, to, f"step {i + 1}")
+    return {"counted": to}
+
+
+async def fail(job) -> dict:
+    raise RuntimeError("shelf vanished")
+
+
+def runner(tmp_path, **kwargs) -> JobRunner:
+    jobs = JobRunner(str(tmp_path / "jobs.sqlite3"), **kwargs)
+    jobs.register("count", count, "Count (to, pause)")
+    jobs.register("fail", fail, "Always fails")
+    return jobs
+
+
+async def until(jobs: JobRunner, job_id: str, status: str) -> None:
+    while jobs.status(job_id)["status"] != status:
+        await asyncio.sleep(0.001)
+
+
+def test_a_job_reports_progress_and_keeps_its_result(tmp_path):
+    seen: list = []
+
+    async def scenario() -> dict:
+        jobs = runner(tmp_path)
+        job_id = jobs.start("count", {"to": 3, "pause": 0.005})["job_id"]
+        with pytest.raises(JobError, match="still"):
+            jobs.result(job_id)
+
+        async def report(job) -> None:
+            seen.append((job.status, job.done))
+
+        status = await jobs.wait(job_id, 5, report)
+        assert status["status"] == "succeeded"
+        result = jobs.result(job_id)
+        await jobs.close()
+        return result
+
+    result = asyncio.run(scenario())
+    assert result["result"] == {"counted": 3}
+    assert result["progress"] == {"done": 3, "total": 3, "message": "step 3"}
+    assert ("running", 1) in seen and seen[-1] == ("succeeded", 3)
+
+
+def test_failures_are_recorded(tmp_path):
+    async def scenario() -> dict:
+        jobs = runner(tmp_path)
+        status = await jobs.wait(jobs.start("fail")["job_id"], 5)
+        await jobs.close()
+        return status
+
+    status = asyncio.run(scenario())
+    assert (status["status"], status["error"]) == ("failed", "RuntimeError: shelf vanished")
+
+
+def test_unknown_kinds_bad_arguments_and_a_full_queue_are_rejected(tmp_path):
+    async def scenario() -> None:
+        jobs = runner(tmp_path, workers=1, max_queued=1)
+        with pytest.raises(JobError, match="Unknown job kind"):
+            jobs.start("export")
+        with pytest.raises(JobError, match="Invalid arguments"):
+            jobs.start("count", {"shelf": 1})
+        await until(jobs, jobs.start("count", {"pause": 1})["job_id"], "running")
+        jobs.start("count")
+        with pytest.raises(JobError, match="Too many jobs"):
+            jobs.start("count")
+        await jobs.close()
+
+    asyncio.run(scenario())
+
+
+def test_cancel_stops_running_and_queued_jobs(tmp_path):
+    async def scenario() -> tuple:
+        jobs = runner(tmp_path, workers=1)
+        running = jobs.start("count", {"to": 1000, "pause": 0.01})["job_id"]
+        queued = jobs.start("count")["job_id"]
+        await until(jobs, running, "running")
+        cancelled_queued = await jobs.cancel(queued)
+        cancelled_running = await jobs.cancel(running)
+        after = jobs.status(queued)
+        assert jobs.stats() == {"queued": 0, "running": 0, "workers": 1}
+        await jobs.close()
+        return cancelled_running, cancelled_queued, after
+
+    running, queued, after = asyncio.run(scenario())
+    assert running["status"] == "cancelled" and running["progress"]["done"] < 1000
+    assert queued["status"] == "cancelled" and queued["started_at"] is None
+    assert after["started_at"] is None  # The worker skipped it.
+
+
+def test_close_marks_unfinished_jobs_interrupted(tmp_path):
+    async def scenario() -> list:
+        jobs = runner(tmp_path, workers=1)
+        ids = [jobs.start("count", {"to": 1000, "pause": 0.01})["job_id"], jobs.start("count")["job_id"]]
+        await until(jobs, ids[0], "running")
+        await jobs.close()
+        return ids
+
+    ids = asyncio.run(scenario())
+    reopened = runner(tmp_path)
+    assert [reopened.status(job_id)["status"] for job_id in ids] == ["interrupted", "interrupted"]
+    asyncio.run(reopened.close())
+
+
+def test_a_restart_after_a_crash_marks_leftover_jobs_interrupted(tmp_path):
+    async def scenario() -> tuple:
+        jobs = runner(tmp_path, workers=1)
+        running = jobs.start("count", {"to": 1000, "pause": 0.01})["job_id"]
+        queued = jobs.start("count")["job_id"]
+        await until(jobs, running, "running")
+        # A second runner on the same file is what the next process sees if this one dies now.
+        restarted = runner(tmp_path)
+        statuses = [restarted.status(job_id) for job_id in (running, queued)]
+        done = await restarted.wait(restarted.start("count")["job_id"], 5)
+        await restarted.close()
+        await jobs.close()
+        return statuses, done
+
+    statuses, done = asyncio.run(scenario())
+    assert [s["status"] for s in statuses] == ["interrupted", "interrupted"]
+    assert statuses[0]["error"] == "The server stopped before the job finished"
+    assert done["status"] == "succeeded"
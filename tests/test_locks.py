@@ -0,0 +1,105 @@
+"""KeyedLocks: writers are not starved, cancelled waiters leave no trace, idle keys are dropped."""
+
+import asyncio
+
+import pytest
+
+from micro_mcp_server.locks import KeyedLocks, book_key, shelf_key
+
+
+async def settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_waiting_writer_goes_before_later_readers():
+    locks = KeyedLocks()
+    order = []
+
+    async def reader(name: str, hold: asyncio.Event) -> None:
+        async with locks.hold(shared=[shelf_key(1)]):
+            order.append(name)
+            await hold.wait()
+
+    async def writer(hold: asyncio.Event) -> None:
+        async with locks.hold(shelf_key(1)):
+            order.append("writer")
+            await hold.wait()
+
+    async def scenario() -> None:
+        first, done = asyncio.Event(), asyncio.Event()
+        tasks = [asyncio.create_task(reader("first reader", first))]
+        await settle()
+        tasks.append(asyncio.create_task(writer(done)))
+        await settle()
+        tasks.append(asyncio.create_task(reader("later reader", done)))
+        await settle()
+        assert order == ["first reader"]
+        first.set()
+        await settle()
+        assert order == ["first reader", "writer"]
+        done.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(scenario())
+    assert order == ["first reader", "writer", "later reader"]
+
+
+def test_cancelled_writer_releases_readers_it_held_back():
+    locks = KeyedLocks()
+
+    async def scenario() -> None:
+        release = asyncio.Event()
+
+        async def holder() -> None:
+            async with locks.hold(shared=[shelf_key(1)]):
+                await release.wait()
+
+        async def writer() -> None:
+            async with locks.hold(shelf_key(1)):
+                pytest.fail("cancelled writer acquired the lock")
+
+        async def reader() -> str:
+            async with locks.hold(shared=[shelf_key(1)]):
+                return "read"
+
+        holding = asyncio.create_task(holder())
+        await settle()
+        waiting_writer = asyncio.create_task(writer())
+        await settle()
+        waiting_reader = asyncio.create_task(reader())
+        await settle()
+        assert not waiting_reader.done()
+
+        waiting_writer.cancel()
+        # The reader only waited for the writer, not for the shared holder.
+        assert await asyncio.wait_for(waiting_reader, 1) == "read"
+        with pytest.raises(asyncio.CancelledError):
+            await waiting_writer
+        release.set()
+        await holding
+
+    asyncio.run(scenario())
+    assert locks.stats()["active_keys"] == 0
+
+
+def test_idle_keys_are_dropped():
+    locks = KeyedLocks()
+
+    async def scenario() -> None:
+        async with locks.hold(book_key(1), shared=[shelf_key(1), shelf_key(2)]):
+            assert locks.stats()["active_keys"] == 3
+        with pytest.raises(RuntimeError):
+            async with locks.hold(book_key(2)):
+                raise RuntimeError("mutation failed")
+        await asyncio.gather(*(hold_briefly(locks, book_key(3)) for _ in range(10)))
+
+    asyncio.run(scenario())
+    stats = locks.stats()
+    assert (stats["active_keys"], stats["held"]) == (0, 0)
+    assert (stats["acquisitions"], stats["contended"]) == (14, 9)
+
+
+async def hold_briefly(locks: KeyedLocks, key) -> None:
+    async with locks.hold(key):
+        await asyncio.sleep(0)
@@ -0,0 +1,119 @@
+"""Queue-based logging: correlation ids, sampling with error flush, and a slow sink."""
+
+import asyncio
+import atexit
+import json
+import logging
+import sys
+import time
+
+import pytest
+from fastmcp import Client, FastMCP
+from fastmcp.exceptions import ToolError
+
+from micro_mcp_server import logging_setup
+from micro_mcp_server.logging_setup import JsonFormatter, ToolLoggingMiddleware, parse_sample_rates
+
+
+class Lines(logging.Handler):
+    """Collects formatted records, filtered like the queue handler."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.lines: list = []
+        self.setFormatter(JsonFormatter())
+        self.addFilter(logging_setup._CorrelationFilter())
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.name in ("tests.tool", "micro_books.calls"):
+            self.lines.append(json.loads(self.format(record)))
+
+
+@pytest.fixture
+def lines(monkeypatch):
+    handler = Lines()
+    monkeypatch.setattr(logging_setup, "_queue_handler", handler)
+    root = logging.getLogger()
+    level = root.level
+    root.addHandler(handler)
+    # setLevel, unlike assigning the attribute, clears loggers' cached isEnabledFor answers.
+    root.setLevel(logging.INFO)
+    yield handler.lines
+    root.removeHandler(handler)
+    root.setLevel(level)
+
+
+def run(sample_rate: float, *calls: str) -> None:
+    mcp = FastMCP(middleware=[ToolLoggingMiddleware(sample_rate, {})])
+    log = logging.getLogger("tests.tool")
+
+    @mcp.tool()
+    async def work(fail: bool = False) -> str:
+        log.info("step one", extra={"shelf": 3})
+        if fail:
+            raise ValueError("upstream said no")
+        return "ok"
+
+    async def scenario() -> None:
+        async with Client(mcp) as client:
+            for call in calls:
+                try:
+                    await client.call_tool("work", {"fail": call == "fail"})
+                except ToolError:
+                    pass
+
+    asyncio.run(scenario())
+
+
+def test_sampled_calls_share_a_correlation_id(lines):
+    run(1.0, "ok")
+    assert [line["message"] for line in lines] == ["step one", "Tool call finished"]
+    assert len({line["call_id"] for line in lines}) == 1
+    assert lines[0]["tool"] == "work" and lines[0]["shelf"] == 3
+    assert lines[1]["duration_ms"] >= 0
+
+
+def test_unsampled_calls_are_logged_in_full_only_when_they_fail(lines):
+    run(0.0, "ok", "fail")
+    assert [line["message"] for line in lines] == ["step one", "Tool call failed"]
+    assert lines[1]["error"].endswith("upstream said no")
+    assert lines[0]["call_id"] == lines[1]["call_id"]
+
+
+def test_parse_sample_rates():
+    assert parse_sample_rates("query_books=0.1, get_metrics=0") == {"query_books": 0.1, "get_metrics": 0.0}
+    assert parse_sample_rates("") == {}
+
+
+def test_a_slow_sink_does_not_block_callers(monkeypatch):
+    class SlowStderr:
+        def __init__(self) -> None:
+            self.lines: list = []
+
+        def write(self, text: str) -> None:
+            time.sleep(0.01)
+            self.lines.append(text)
+
+        def flush(self) -> None:
+            pass
+
+    stderr = SlowStderr()
+    monkeypatch.setattr(sys, "stderr", stderr)
+    monkeypatch.setattr(logging_setup, "_listener", None)
+    monkeypatch.setattr(logging_setup, "_queue_handler", None)
+    root = logging.getLogger()
+    monkeypatch.setattr(root, "handlers", list(root.handlers))
+    level = root.level
+    logging_setup.configure_logging("INFO", "json")
+    try:
+        started = time.monotonic()
+        for i in range(50):
+            logging.getLogger("tests.sink").info("line %d", i)
+        assert time.monotonic() - started < 0.25
+        logging_setup.flush_logging()
+        messages = [json.loads(line)["message"] for line in "".join(stderr.lines).splitlines()]
+        assert messages == [f"line {i}" for i in range(50)]
+    finally:
+        atexit.unregister(logging_setup._listener.stop)
+        logging_setup._listener.stop()
+        root.setLevel(level)
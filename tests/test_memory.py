@@ -0,0 +1,98 @@
+"""GDSF eviction order, budget enforcement, trimming and deregistering caches."""
+
+import asyncio
+import json
+
+from fastmcp import Client
+
+from micro_mcp_server.memory import MemoryAccountant, shared_accountant
+from micro_mcp_server.metrics import snapshot
+from micro_mcp_server.server import create_server
+
+
+def pool(accountant: MemoryAccountant, name: str = "cache") -> tuple:
+    evicted: list = []
+    return accountant.pool(name, evicted.append), evicted
+
+
+def test_large_rarely_used_cheap_entries_go_first():
+    accountant = MemoryAccountant(budget=10_000)
+    cache, evicted = pool(accountant)
+    cache.charge("index", 6_000, cost=1.0)
+    for key in ("a", "b", "c"):
+        cache.charge(key, 1_000, cost=1.0)
+        cache.touch(key)
+    cache.charge("expensive", 1_000, cost=50.0)
+    cache.charge("new", 2_000, cost=1.0)
+    assert evicted == ["index"]
+    assert accountant.total <= accountant.budget
+
+
+def test_budget_is_enforced_without_evicting_the_charged_or_pinned_entries():
+    accountant = MemoryAccountant(budget=5_000)
+    cache, evicted = pool(accountant)
+    cache.charge("pinned", 2_000, cost=None)
+    for i in range(10):
+        cache.charge(i, 1_000)
+        assert accountant.total <= accountant.budget
+    assert evicted == list(range(7))
+    assert set(cache.entries) == {"pinned", 7, 8, 9}
+    # Too big to fit: it stays, since its caller is using it, and everything else evictable goes.
+    cache.charge("huge", 8_000)
+    assert set(cache.entries) == {"pinned", "huge"}
+
+
+def test_evicted_priorities_age_out_entries_that_stop_being_used():
+    accountant = MemoryAccountant(budget=3_000)
+    cache, evicted = pool(accountant)
+    cache.charge("old", 1_000)
+    for _ in range(3):
+        cache.touch("old")
+    # Each eviction raises the floor, so fresh entries soon outrank the once-busy one.
+    for i in range(20):
+        cache.charge(i, 1_000)
+    assert "old" in evicted
+    assert evicted.index("old") < len(evicted) - 1
+
+
+def test_trim_evicts_down_to_the_target():
+    accountant = MemoryAccountant(budget=10_000)
+    cache, evicted = pool(accountant)
+    for i in range(8):
+        cache.charge(i, 1_000)
+    result = accountant.trim()
+    assert result == {"before_bytes": 8_000, "freed_bytes": 3_000, "after_bytes": 5_000}
+    assert accountant.trim(0)["after_bytes"] == 0
+    assert len(evicted) == 8
+
+
+def test_removed_pools_leave_the_budget():
+    accountant = MemoryAccountant(budget=10_000)
+    cache, evicted = pool(accountant, "shelves")
+    other, evicted_other = pool(accountant, "other")
+    cache.charge("a", 4_000)
+    other.charge("b", 1_000)
+    accountant.track("index", lambda: 500)
+    accountant.remove("shelves")
+    accountant.remove("index")
+    assert accountant.total == 1_000
+    assert "memory_bytes.shelves" not in snapshot()
+    # A new pool may reuse the name; the old pool's cheaper heap entry must not evict from it.
+    again, evicted_again = pool(accountant, "shelves")
+    again.charge("a", 1_000)
+    accountant.trim(1_000)
+    assert (evicted, evicted_again, evicted_other) == ([], [], ["b"])
+
+
+def test_server_caches_leave_the_shared_budget_on_shutdown(tmp_path):
+    accountant = shared_accountant()
+    before = accountant.names()
+
+    async def scenario() -> dict:
+        async with Client(create_server("token", state_dir=str(tmp_path), snapshot=False)) as client:
+            assert len(accountant.names() - before) >= 4
+            return json.loads((await client.call_tool("trim_memory", {"target_mb": 0})).data)
+
+    trimmed = asyncio.run(scenario())
+    assert trimmed["after_bytes"] >= 0 and "freed_bytes" in trimmed
+    assert accountant.names() == before
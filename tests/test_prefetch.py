@@ -0,0 +1,41 @@
+"""Opening a shelf while its prefetch is in flight reuses the prefetch."""
+
+import asyncio
+
+import httpx
+
+from micro_mcp_server.cache import ShelfCache
+from micro_mcp_server.limiter import AdaptiveLimiter
+from micro_mcp_server.prefetch import ShelfPrefetcher
+from micro_mcp_server.server import MicroBooksClient
+
+
+def test_open_during_prefetch_waits_for_it_instead_of_refetching():
+    gets = []
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        gets.append(request.url.path)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={"items": [{"id": 10, "title": "Provenance"}]})
+
+    cache = ShelfCache(ttl=60)
+    client = MicroBooksClient(
+        "token", cache=cache, limiter=AdaptiveLimiter(initial_limit=8), transport=httpx.MockTransport(handle)
+    )
+    prefetcher = ShelfPrefetcher(client, cache)
+
+    async def scenario() -> None:
+        prefetcher.record_open("session", 1, 100, served_from_cache=False)
+        prefetcher.after_listing("session", {"items": [{"id": 1}]})
+        await asyncio.sleep(0.01)  # The prefetch request is now in flight.
+
+        warm = await prefetcher.wait_for(1)
+        result = await client.get_bookshelf_books(1)
+        prefetcher.record_open("session", 1, 100, served_from_cache=warm)
+        assert warm and result["items"][0]["id"] == 10
+        assert not await prefetcher.wait_for(1)
+        await client.aclose()
+
+    asyncio.run(scenario())
+    assert gets == ["/books/bookshelves/1"]
+    assert (prefetcher.issued, prefetcher.hits, prefetcher.wasted) == (1, 1, 0)
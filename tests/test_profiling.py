@@ -0,0 +1,68 @@
+"""Tool-call profiling: which calls are profiled, which profiles are kept."""
+
+import asyncio
+
+from fastmcp import Client, FastMCP
+
+from micro_mcp_server.profiling import ToolProfiler
+
+
+def busy_work(n: int) -> int:
+    return sum(i * i for i in range(n))
+
+
+def server(profiler: ToolProfiler) -> FastMCP:
+    mcp = FastMCP(middleware=[profiler])
+
+    @mcp.tool()
+    async def slow() -> int:
+        await asyncio.sleep(0.02)
+        return busy_work(200_000)
+
+    @mcp.tool()
+    async def fast() -> int:
+        return 1
+
+    return mcp
+
+
+def call(profiler: ToolProfiler, *tools: str) -> None:
+    async def scenario() -> None:
+        async with Client(server(profiler)) as client:
+            for tool in tools:
+                await client.call_tool(tool)
+
+    asyncio.run(scenario())
+
+
+def test_listed_tools_are_profiled_and_summarized(tmp_path):
+    profiler = ToolProfiler(str(tmp_path), tools={"slow"})
+    call(profiler, "slow", "fast", "fast")
+    assert (profiler.profiled, profiler.kept) == (1, 1)
+    summary = profiler.summary("slow")
+    assert [p["tool"] for p in summary["profiles"]] == ["slow"]
+    assert summary["profiles"][0]["duration_ms"] >= 20
+    assert any(f["function"].startswith("busy_work") or "genexpr" in f["function"] for f in summary["hot_frames"])
+    assert profiler.summary("fast")["profiles"] == []
+
+
+def test_min_duration_keeps_only_slow_calls(tmp_path):
+    profiler = ToolProfiler(str(tmp_path), min_duration=0.015)
+    call(profiler, "fast", "slow", "fast")
+    assert profiler.profiled == 3
+    assert [n.split("-")[1] for n in profiler.files()] == ["slow"]
+
+
+def test_sampling_selects_unlisted_calls(tmp_path, monkeypatch):
+    draws = iter([0.9, 0.05, 0.5])
+    monkeypatch.setattr("micro_mcp_server.profiling.random.random", lambda: next(draws))
+    profiler = ToolProfiler(str(tmp_path), sample_rate=0.1)
+    call(profiler, "slow", "slow", "slow")
+    assert profiler.profiled == 1
+
+
+def test_only_the_newest_profiles_are_kept(tmp_path):
+    profiler = ToolProfiler(str(tmp_path), max_files=2)
+    call(profiler, "slow", "slow", "slow", "slow")
+    assert profiler.kept == 4
+    assert len(profiler.files()) == 2
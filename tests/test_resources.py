@@ -0,0 +1,89 @@
+"""Resource URIs, content hashes, and change notifications from polling."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastmcp import Client
+
+from micro_mcp_server.resources import ResourcePublisher, content_hash, upstream_path
+from micro_mcp_server.server import create_server
+
+
+class Conditional:
+    """Answers get_conditional from ``data``, with a 304 while the ETag still matches."""
+
+    def __init__(self, data: dict) -> None:
+        self.data = data
+        self.etag = "v1"
+        self.requests: list = []
+
+    async def get_conditional(self, path: str, etag=None, last_modified=None) -> tuple:
+        self.requests.append((path, etag))
+        if etag == self.etag:
+            return None, etag, last_modified
+        return self.data, self.etag, None
+
+
+class Session:
+    def __init__(self, fail: bool = False) -> None:
+        self.fail = fail
+        self.updated: list = []
+
+    async def send_resource_updated(self, uri: str) -> None:
+        if self.fail:
+            raise ConnectionError("session closed")
+        self.updated.append(uri)
+
+
+def test_uris_map_to_upstream_paths():
+    assert upstream_path("books://bookshelves") == "/books/bookshelves"
+    assert upstream_path("books://bookshelf/12") == "/books/bookshelves/12"
+    assert upstream_path("books://goals/3") == "/books/goals/3"
+    with pytest.raises(ValueError, match="Unknown resource"):
+        upstream_path("books://bookshelf/twelve")
+
+
+def test_content_hash_ignores_key_order():
+    assert content_hash({"a": 1, "b": [1, 2]}) == content_hash({"b": [1, 2], "a": 1})
+    assert content_hash({"a": 1}) != content_hash({"a": 2})
+
+
+def test_poll_notifies_subscribers_only_when_content_changes():
+    uri = "books://bookshelf/1"
+    upstream = Conditional({"items": [{"id": 1}]})
+    changed: list = []
+    publisher = ResourcePublisher(upstream, on_change=lambda u, data: changed.append((u, data)))
+    session, closed = Session(), Session(fail=True)
+
+    async def scenario() -> list:
+        publisher.subscribe(uri, session)
+        publisher.subscribe(uri, closed)
+        publisher.render(uri, upstream.data)  # What the subscribers last read.
+        results = [await publisher.poll(uri), await publisher.poll(uri)]
+        upstream.data, upstream.etag = {"items": [{"id": 1}, {"id": 2}]}, "v2"
+        results.append(await publisher.poll(uri))
+        publisher.unsubscribe(uri, session)
+        return results
+
+    assert asyncio.run(scenario()) == [False, False, True]
+    # The second poll sent the ETag from the first and got a 304.
+    assert upstream.requests[1] == ("/books/bookshelves/1", "v1")
+    assert publisher.not_modified == 1
+    assert session.updated == [uri]
+    assert changed == [(uri, upstream.data)]
+    assert publisher.stats()["subscriptions"] == {}
+
+
+def test_read_returns_an_envelope_with_the_content_hash(tmp_path):
+    shelf = {"items": [{"id": 5, "title": "Dune"}]}
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, json=shelf))
+
+    async def scenario():
+        server = create_server("token", state_dir=str(tmp_path), transport=transport, snapshot=False)
+        async with Client(server) as client:
+            return await client.read_resource("books://bookshelf/5")
+
+    envelope = json.loads(asyncio.run(scenario())[0].text)
+    assert envelope == {"uri": "books://bookshelf/5", "content_hash": content_hash(shelf), "data": shelf}
@@ -0,0 +1,121 @@
+"""Shutdown drains running calls, and the snapshot it saves warms the next start."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastmcp import Client, FastMCP
+from fastmcp.exceptions import ToolError
+
+from micro_mcp_server.server import create_server
+from micro_mcp_server.shutdown import DrainMiddleware, graceful_lifespan, http_app_with_lifespan
+
+
+class Library:
+    """One shelf holding one book; records every request."""
+
+    def __init__(self) -> None:
+        self.requests: list = []
+        self.transport = httpx.MockTransport(self.handle)
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request.url.path)
+        if request.url.path == "/books/bookshelves":
+            return httpx.Response(200, json={"items": [{"id": 1, "title": "Reading"}]})
+        return httpx.Response(200, json={"items": [{"id": 7, "title": "Dune", "authors": [{"name": "Frank Herbert"}]}]})
+
+
+def slow_server() -> tuple:
+    drain = DrainMiddleware()
+    release = asyncio.Event()
+    mcp = FastMCP(middleware=[drain])
+
+    @mcp.tool()
+    async def slow() -> str:
+        await release.wait()
+        return "finished"
+
+    @mcp.tool()
+    async def quick() -> str:
+        return "quick"
+
+    return mcp, drain, release
+
+
+def test_drain_waits_for_running_calls_and_refuses_new_ones():
+    async def scenario() -> None:
+        mcp, drain, release = slow_server()
+        async with Client(mcp) as client:
+            call = asyncio.create_task(client.call_tool("slow"))
+            while not drain.inflight:
+                await asyncio.sleep(0.01)
+            draining = asyncio.create_task(drain.drain(5.0))
+            await asyncio.sleep(0.05)
+            assert not draining.done()
+            with pytest.raises(ToolError, match="shutting down"):
+                await client.call_tool("quick")
+            release.set()
+            assert await draining == 0
+            assert (await call).data == "finished"
+        assert drain.refused == 1
+
+    asyncio.run(scenario())
+
+
+def test_drain_gives_up_after_its_timeout():
+    async def scenario() -> None:
+        mcp, drain, release = slow_server()
+        async with Client(mcp) as client:
+            call = asyncio.create_task(client.call_tool("slow"))
+            while not drain.inflight:
+                await asyncio.sleep(0.01)
+            assert await drain.drain(0.05) == 1
+            release.set()
+            await call
+
+    asyncio.run(scenario())
+
+
+def test_http_app_runs_the_lifespan_once_around_the_app():
+    events: list = []
+
+    async def on_startup() -> None:
+        events.append("startup")
+
+    async def on_shutdown() -> None:
+        events.append("shutdown")
+
+    async def scenario() -> None:
+        mcp, drain, _ = slow_server()
+        app = http_app_with_lifespan(mcp, graceful_lifespan(drain, on_shutdown, signals=(), on_startup=on_startup))
+        async with app.router.lifespan_context(app):
+            assert events == ["startup"]
+        assert events == ["startup", "shutdown"]
+        assert drain.draining
+
+    asyncio.run(scenario())
+
+
+def test_snapshot_restores_the_library_and_change_cursors(tmp_path):
+    first, second = Library(), Library()
+
+    def server(library: Library):
+        return create_server("token", state_dir=str(tmp_path), transport=library.transport, prefetch_concurrency=0)
+
+    async def scenario() -> None:
+        async with Client(server(first)) as client:
+            await client.call_tool("query_books", {"where": "title = Dune"})
+            cursor = json.loads((await client.call_tool("get_changes_since")).data)["cursor"]
+        assert (tmp_path / "snapshot.json.gz").exists()
+
+        async with Client(server(second)) as client:
+            assert not (tmp_path / "snapshot.json.gz").exists()
+            found = json.loads((await client.call_tool("query_books", {"where": "title = Dune"})).data)
+            since = await client.call_tool("get_changes_since", {"cursor": cursor, "refresh": False})
+            changes = json.loads(since.data)
+        assert [book["id"] for book in found["books"]] == [7]
+        assert not changes["reset"] and changes["changes"] == []
+        assert second.requests == []
+
+    asyncio.run(scenario())
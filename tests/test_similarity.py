@@ -0,0 +1,85 @@
+"""similar_books ranking, and the matrix staying current as shelves change."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastmcp import Client
+
+pytest.importorskip("numpy")
+
+from micro_mcp_server.index import LibraryIndex  # noqa: E402
+from micro_mcp_server.server import create_server  # noqa: E402
+from micro_mcp_server.similarity import SimilarityIndex  # noqa: E402
+
+
+def book(book_id: int, title: str, author: str) -> dict:
+    return {"id": book_id, "title": title, "authors": [{"name": author}]}
+
+
+def shelves() -> dict:
+    return {
+        1: [
+            book(1, "Ancillary Justice", "Ann Leckie"),
+            book(2, "Ancillary Sword", "Ann Leckie"),
+            book(3, "The Fifth Season", "N. K. Jemisin"),
+        ],
+        2: [book(4, "Ancillary Mercy", "Ann Leckie"), book(5, "All Systems Red", "Martha Wells")],
+    }
+
+
+def loaded(library: dict) -> tuple:
+    index, similarity = LibraryIndex(), SimilarityIndex()
+    index.add_listener(similarity.on_shelf_change)
+    for shelf, items in library.items():
+        index.replace_shelf(shelf, {"items": items})
+    similarity.load(index.records.values())
+    return index, similarity
+
+
+def ranked(similarity: SimilarityIndex, book_id: int) -> list:
+    return [b["id"] for b in similarity.similar(book_id, limit=10)["similar"]]
+
+
+def test_same_author_and_title_words_rank_first():
+    _, similarity = loaded(shelves())
+    result = similarity.similar(1, limit=2)
+    assert [b["id"] for b in result["similar"]] == [2, 4]
+    assert all(b["same_author"] for b in result["similar"])
+    assert result["library_size"] == 5
+    with pytest.raises(ValueError, match="not in the library"):
+        similarity.similar(99)
+
+
+def test_shelf_changes_reach_the_loaded_matrix():
+    library = shelves()
+    index, similarity = loaded(library)
+    library[1] = [b for b in library[1] if b["id"] != 2] + [book(6, "Ancillary Justice", "Ann Leckie")]
+    index.replace_shelf(1, {"items": library[1]})
+    assert 2 not in similarity.records
+    assert ranked(similarity, 1)[0] == 6
+    # Moved to shelf 1: its vector now carries the new shelf.
+    index.replace_shelf(1, {"items": library[1] + [library[2][1]]})
+    assert similarity.records[5]["bookshelf_id"] == 1
+
+
+def test_similar_books_sees_books_added_after_loading(tmp_path):
+    library = shelves()
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/books/bookshelves":
+            return httpx.Response(200, json={"items": [{"id": s, "title": f"Shelf {s}"} for s in library]})
+        return httpx.Response(200, json={"items": library[int(request.url.path.rsplit("/", 1)[1])]})
+
+    async def scenario() -> list:
+        server = create_server(
+            "token", cache_ttl=0, state_dir=str(tmp_path), transport=httpx.MockTransport(handle), snapshot=False
+        )
+        async with Client(server) as mcp:
+            await mcp.call_tool("similar_books", {"book_id": 1})
+            library[3] = [book(7, "Ancillary Justice", "Ann Leckie")]
+            result = await mcp.call_tool("similar_books", {"book_id": 1, "limit": 1})
+        return json.loads(result.data)["similar"]
+
+    assert [b["id"] for b in asyncio.run(scenario())] == [7]
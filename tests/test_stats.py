@@ -0,0 +1,125 @@
+"""library_stats columns: group-by counts, and staying current as shelves change."""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+from fastmcp import Client
+
+pytest.importorskip("numpy")
+
+from micro_mcp_server.index import LibraryIndex  # noqa: E402
+from micro_mcp_server.memory import MemoryAccountant  # noqa: E402
+from micro_mcp_server.server import create_server  # noqa: E402
+from micro_mcp_server.stats import LibraryColumns  # noqa: E402
+
+
+class Shelves:
+    """A client serving bookshelves from a dict that tests edit in place."""
+
+    def __init__(self, shelves: dict) -> None:
+        self.shelves = shelves
+
+    async def get_bookshelves(self) -> dict:
+        return {"items": [{"id": s, "title": f"Shelf {s}"} for s in self.shelves]}
+
+    async def get_bookshelf_books(self, bookshelf_id: int) -> dict:
+        return {"items": list(self.shelves[bookshelf_id])}
+
+
+def book(book_id: int, author: str, date: str = "") -> dict:
+    return {"id": book_id, "title": f"Book {book_id}", "authors": [{"name": author}], "date_published": date}
+
+
+def library() -> Shelves:
+    return Shelves({
+        1: [book(1, "Ann Leckie", "2024-03-02"), book(2, "Ann Leckie", "2025-01-10"), book(3, "N. K. Jemisin")],
+        2: [book(4, "Martha Wells", "2025-01-20")],
+    })
+
+
+def loaded(client: Shelves, max_age: float = 300.0) -> tuple:
+    index, columns = LibraryIndex(max_age=max_age), LibraryColumns()
+    index.add_listener(columns.on_shelf_change)
+    asyncio.run(index.refresh(client))
+    columns.load(index.records.values())
+    return index, columns
+
+
+def test_summary_counts_shelves_authors_and_dates():
+    index, columns = loaded(library())
+    summary = columns.stats(shelf_names=index.shelf_names)
+    assert summary["books"] == 4
+    assert summary["shelves"] == [
+        {"bookshelf_id": 1, "bookshelf_name": "Shelf 1", "books": 3},
+        {"bookshelf_id": 2, "bookshelf_name": "Shelf 2", "books": 1},
+    ]
+    assert summary["top_authors"][0] == {"author": "Ann Leckie", "books": 2}
+    assert summary["distinct_authors"] == 3
+    assert summary["books_without_date"] == 1
+    assert (summary["first_added"], summary["last_added"]) == ("2024-03", "2025-01")
+    assert summary["added_per_year"] == {"2024": 1, "2025": 2}
+
+
+def test_group_by_month_shelf_and_one_shelf():
+    _, columns = loaded(library())
+    assert columns.stats("month")["added"] == {"2024-03": 1, "2025-01": 2}
+    assert columns.stats("author", top=1)["top_authors"] == [{"author": "Ann Leckie", "books": 2}]
+    assert columns.stats("shelf_month")["shelf_sizes"] == {"1": {"2024-03": 1, "2025-01": 2}, "2": {"2025-01": 1}}
+    assert columns.stats("author", bookshelf_id=2)["top_authors"] == [{"author": "Martha Wells", "books": 1}]
+    with pytest.raises(ValueError, match="group_by"):
+        columns.stats("colour")
+
+
+def test_refreshed_shelves_reach_loaded_columns():
+    client = library()
+    index, columns = loaded(client, max_age=0)
+    # Changed on Micro.blog: one book moved, one removed, one added.
+    client.shelves[2].append(client.shelves[1].pop(0))
+    client.shelves[1].pop()
+    client.shelves[1].append(book(5, "Becky Chambers", "2025-02-01"))
+    asyncio.run(index.refresh(client))
+    shelves = {s["bookshelf_id"]: s["books"] for s in columns.stats("shelf")["shelves"]}
+    assert shelves == {1: 2, 2: 2}
+    assert columns.stats("month")["added"] == {"2024-03": 1, "2025-01": 2, "2025-02": 1}
+    assert "N. K. Jemisin" not in [a["author"] for a in columns.stats("author")["top_authors"]]
+
+
+def test_evicted_columns_are_unloaded_and_ignore_changes():
+    accountant = MemoryAccountant(budget=10**9)
+    columns = LibraryColumns(accountant=accountant)
+    index = LibraryIndex()
+    index.add_listener(columns.on_shelf_change)
+    asyncio.run(index.refresh(library()))
+    columns.load(index.records.values())
+    accountant.trim(0)
+    assert not columns.loaded
+    index.replace_shelf(2, {"items": [book(6, "Ada Palmer")]})
+    columns.load(index.records.values())
+    assert columns.stats()["books"] == 4
+
+
+def test_library_stats_sees_a_shelf_added_after_loading(tmp_path):
+    client = library()
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/books/bookshelves":
+            return httpx.Response(200, json={"items": [{"id": s, "title": f"Shelf {s}"} for s in client.shelves]})
+        shelf = int(request.url.path.rsplit("/", 1)[1])
+        return httpx.Response(200, json={"items": client.shelves[shelf]})
+
+    async def scenario() -> tuple:
+        server = create_server(
+            "token", cache_ttl=0, state_dir=str(tmp_path), transport=httpx.MockTransport(handle), snapshot=False
+        )
+        async with Client(server) as mcp:
+            before = json.loads((await mcp.call_tool("library_stats", {"group_by": "shelf"})).data)
+            client.shelves[3] = [book(7, "Ada Palmer")]
+            cached = json.loads((await mcp.call_tool("library_stats", {"refresh": False})).data)
+            after = json.loads((await mcp.call_tool("library_stats", {"group_by": "shelf"})).data)
+        return before, cached, after
+
+    before, cached, after = asyncio.run(scenario())
+    assert (before["books"], cached["books"], after["books"]) == (4, 4, 5)
+    assert [s["bookshelf_id"] for s in after["shelves"]] == [1, 2, 3]
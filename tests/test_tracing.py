@@ -0,0 +1,30 @@
+"""Trace dumps go to generated files in the given directory."""
+
+import json
+import os
+
+from micro_mcp_server.tracing import TraceRecorder
+
+
+def test_dump_writes_new_files_and_keeps_the_newest(tmp_path, monkeypatch):
+    recorder = TraceRecorder()
+    clock = iter(range(1_000, 1_010))
+    monkeypatch.setattr("micro_mcp_server.tracing.time.time", lambda: next(clock))
+
+    paths = [recorder.dump(str(tmp_path / "traces"), max_files=3) for _ in range(5)]
+
+    assert len(set(paths)) == 5
+    assert all(os.path.dirname(p) == str(tmp_path / "traces") for p in paths)
+    assert sorted(os.listdir(tmp_path / "traces")) == sorted(os.path.basename(p) for p in paths[-3:])
+    with open(paths[-1], encoding="utf-8") as f:
+        assert set(json.load(f)) == {"summary", "traces"}
+
+
+def test_dumps_in_the_same_millisecond_get_separate_files(tmp_path, monkeypatch):
+    recorder = TraceRecorder()
+    monkeypatch.setattr("micro_mcp_server.tracing.time.time", lambda: 1_700_000_000.0)
+
+    paths = [recorder.dump(str(tmp_path), max_files=3) for _ in range(5)]
+
+    assert len(set(paths)) == 5
+    assert sorted(os.listdir(tmp_path)) == sorted(os.path.basename(p) for p in paths[-3:])
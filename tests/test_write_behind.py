@@ -0,0 +1,98 @@
+"""Write-behind mutations survive a restart and are sent once the server starts."""
+
+import asyncio
+import json
+import logging
+
+import httpx
+from fastmcp import Client
+
+from micro_mcp_server.journal import MutationJournal
+from micro_mcp_server.server import create_server
+
+
+class Upstream:
+    """Records rename requests; fails them with 503 while ``down``."""
+
+    def __init__(self, down: bool = False) -> None:
+        self.down = down
+        self.renames: list = []
+        self.transport = httpx.MockTransport(self.handle)
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "POST" and request.url.path.startswith("/books/bookshelves/"):
+            if self.down:
+                return httpx.Response(503)
+            self.renames.append((request.url.path, request.content.decode()))
+            return httpx.Response(200, json={})
+        return httpx.Response(200, json={"items": []})
+
+
+def server(state_dir, upstream: Upstream):
+    return create_server(
+        "token",
+        write_behind=True,
+        state_dir=str(state_dir),
+        transport=upstream.transport,
+        shutdown_timeout=0.2,
+        snapshot=False,
+    )
+
+
+async def started(state_dir, upstream: Upstream, wait: float = 2.0) -> None:
+    """Run the server without calling any tool until ``upstream`` sees a rename."""
+    async with Client(server(state_dir, upstream)):
+        for _ in range(int(wait / 0.05)):
+            if upstream.renames:
+                break
+            await asyncio.sleep(0.05)
+
+
+def pending(state_dir) -> int:
+    journal = MutationJournal(str(state_dir / "journal.sqlite3"))
+    try:
+        return journal.pending_count()
+    finally:
+        journal.close()
+
+
+def test_journal_left_by_crash_is_sent_at_startup(tmp_path):
+    journal = MutationJournal(str(tmp_path / "journal.sqlite3"))
+    journal.append("rename_bookshelf", {"bookshelf_id": 7, "name": "Read"})
+    journal.close()
+
+    upstream = Upstream()
+    asyncio.run(started(tmp_path, upstream))
+
+    assert upstream.renames == [("/books/bookshelves/7", "name=Read")]
+    assert pending(tmp_path) == 0
+
+
+def test_mutation_unflushed_at_shutdown_is_sent_on_next_start(tmp_path, caplog):
+    down = Upstream(down=True)
+
+    async def first_run() -> None:
+        async with Client(server(tmp_path, down)) as client:
+            await client.call_tool("rename_bookshelf", {"bookshelf_id": 7, "name": "Read"})
+
+    with caplog.at_level(logging.WARNING, logger="micro_mcp_server.server"):
+        asyncio.run(first_run())
+    assert "pending mutations are sent when the server next starts" in caplog.text
+    assert pending(tmp_path) == 1
+
+    upstream = Upstream()
+    asyncio.run(started(tmp_path, upstream))
+
+    assert upstream.renames == [("/books/bookshelves/7", "name=Read")]
+    assert pending(tmp_path) == 0
+
+
+def test_coalesced_goal_update_keeps_pending_progress(tmp_path):
+    journal = MutationJournal(str(tmp_path / "journal.sqlite3"))
+    first = journal.append("update_reading_goal", {"goal_id": 3, "value": 10, "progress": 5})
+    second = journal.append("update_reading_goal", {"goal_id": 3, "value": 12, "progress": None})
+    row = journal.next_pending()
+    journal.close()
+
+    assert first == second
+    assert json.loads(row["payload"]) == {"goal_id": 3, "value": 12, "progress": 5}